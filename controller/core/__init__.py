@@ -1,7 +1,13 @@
 # filepath: c:\Users\djalm\Desafios\ProjetoFractal\controller\core\__init__.py
 from __future__ import absolute_import, unicode_literals
 
-# Importar o Celery
-from .celery import app as celery_app
+__all__ = ('celery_app',)
 
-__all__ = ('celery_app',)
\ No newline at end of file
+
+def __getattr__(name):
+    # Celery é carregado sob demanda: workers web não pagam o import
+    # (`celery -A core` encontra o app em core.celery)
+    if name == 'celery_app':
+        from .celery import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,19 @@
+# api.py
+from ninja import NinjaAPI
+
+from exams.api import router as exams_router
+from users.api import router as auth_router
+from .diagnostics import router as diagnostics_router
+from .renderers import ORJSONRenderer
+
+api = NinjaAPI(
+    title="Exam Manager API",
+    version="1.0",
+    renderer=ORJSONRenderer(),
+    urls_namespace="api",
+)
+
+# Uma única instância: schema OpenAPI e tabela de rotas montados uma vez
+api.add_router("/auth/", auth_router)
+api.add_router("/diagnostics/", diagnostics_router)
+api.add_router("/", exams_router)
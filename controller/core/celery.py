@@ -14,6 +14,9 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Descobrir automaticamente tarefas definidas nos apps instalados
 app.autodiscover_tasks()
 
+# Métricas de espera na fila e duração das tarefas (conecta os sinais)
+from . import telemetry  # noqa: E402,F401
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
\ No newline at end of file
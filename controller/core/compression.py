@@ -0,0 +1,133 @@
+# compression.py
+"""
+Codificações de resposta negociadas pela API (br, zstd, gzip) e cache de
+corpos pré-compactados. brotli e zstandard são opcionais: sem eles só o
+gzip é oferecido.
+"""
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .localcache import two_tier_get
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depende da imagem
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depende da imagem
+    zstandard = None
+
+
+def _gzip():
+    obj = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = cabeçalho gzip
+    return obj.compress, obj.flush
+
+
+def _br():
+    compressor = brotli.Compressor(quality=5)
+    return compressor.process, compressor.finish
+
+
+def _zstd():
+    obj = zstandard.ZstdCompressor(level=3).compressobj()
+    return obj.compress, obj.flush
+
+
+ENCODERS = {'gzip': _gzip}
+if brotli is not None:
+    ENCODERS['br'] = _br
+if zstandard is not None:
+    ENCODERS['zstd'] = _zstd
+
+
+def encoding_settings():
+    return settings.RESPONSE_ENCODING
+
+
+def available_encodings():
+    """Codificações suportadas, na ordem de preferência do servidor"""
+    return [name for name in encoding_settings()['ENCODINGS'] if name in ENCODERS]
+
+
+def parse_quality(header):
+    """'br;q=1.0, gzip;q=0.5' -> {'br': 1.0, 'gzip': 0.5}"""
+    values = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        values[name.strip().lower()] = quality
+    return values
+
+
+def choose_encoding(accept_encoding):
+    """Melhor codificação aceita pelo cliente; empate decidido pelo servidor"""
+    accepted = parse_quality(accept_encoding)
+    wildcard = accepted.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for name in available_encodings():
+        quality = accepted.get(name, wildcard)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def compress(data, encoding):
+    compress_chunk, finish = ENCODERS[encoding]()
+    return compress_chunk(data) + finish()
+
+
+def compress_stream(chunks, encoding):
+    compress_chunk, finish = ENCODERS[encoding]()
+    for chunk in chunks:
+        data = compress_chunk(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def encode_variants(body):
+    """Corpo original e suas versões compactadas, no formato guardado em cache"""
+    variants = {'identity': body}
+    if len(body) >= encoding_settings()['MIN_SIZE']:
+        for encoding in available_encodings():
+            variants[encoding] = compress(body, encoding)
+    return variants
+
+
+def precompressed_response(cache_key, build, timeout=None, content_type='application/json; charset=utf-8',
+                           local=None):
+    """
+    Resposta com o corpo em cache junto das variantes já compactadas, para
+    que corpos muito lidos sejam compactados uma vez e não a cada requisição.
+    `build` gera o corpo (bytes) quando a chave não está no cache. Com
+    `local` (LocalTTLCache) as variantes também ficam na memória do processo;
+    use só para corpos imutáveis.
+    """
+    if timeout is None:
+        timeout = encoding_settings()['CACHE_TTL']
+    if local is not None:
+        variants = two_tier_get(local, cache, cache_key, lambda: encode_variants(build()), timeout)
+    else:
+        variants = cache.get(cache_key)
+        if variants is None:
+            variants = encode_variants(build())
+            cache.set(cache_key, variants, timeout)
+
+    response = HttpResponse(variants['identity'], content_type=content_type)
+    # Lido pelo ContentNegotiationMiddleware
+    response.precompressed = variants
+    return response
@@ -0,0 +1,64 @@
+# diagnostics.py
+from typing import List, Literal, Optional
+
+from ninja import Router, Schema
+
+from users.api import AuthBearer
+from users.schemas import ErrorResponse
+from . import profiling, slowqueries
+
+router = Router(tags=["Diagnostics"])
+
+
+class ProfileSummaryOut(Schema):
+    id: str
+    method: str
+    path: str
+    status: int
+    trigger: str
+    ms: float
+    queries: int
+    duplicate_queries: int
+    cache_calls: int
+    created_at: str
+
+
+class SlowQueryOut(Schema):
+    sql: str
+    count: int
+    total_ms: float
+    max_ms: float
+    origins: List[str]
+    call_sites: List[str]
+    last_seen: str
+    plan: Optional[str] = None
+
+
+@router.get('/profiles', response={200: List[ProfileSummaryOut], 403: ErrorResponse}, auth=AuthBearer())
+def list_profiles(request, path: Optional[str] = None):
+    """Perfis de requisição mais recentes (Admin only)"""
+    if request.auth.role != 'ADMIN':
+        return 403, {"detail": "Permissão negada"}
+    summaries = profiling.recent()
+    if path:
+        summaries = [s for s in summaries if s['path'].startswith(path)]
+    return summaries
+
+
+@router.get('/profiles/{profile_id}', response={200: dict, 403: ErrorResponse, 404: ErrorResponse}, auth=AuthBearer())
+def get_profile(request, profile_id: str):
+    """Perfil completo: funções (cProfile), SQL e chamadas ao cache (Admin only)"""
+    if request.auth.role != 'ADMIN':
+        return 403, {"detail": "Permissão negada"}
+    profile = profiling.get(profile_id)
+    if profile is None:
+        return 404, {"detail": "Perfil não encontrado ou expirado"}
+    return profile
+
+
+@router.get('/slow-queries', response={200: List[SlowQueryOut], 403: ErrorResponse}, auth=AuthBearer())
+def slow_queries(request, limit: int = 20, order: Literal['total_ms', 'max_ms', 'count'] = 'total_ms'):
+    """Consultas lentas agrupadas pelo SQL, piores primeiro (Admin only)"""
+    if request.auth.role != 'ADMIN':
+        return 403, {"detail": "Permissão negada"}
+    return slowqueries.top_offenders(limit=min(limit, 100), order=order)
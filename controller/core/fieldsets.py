@@ -0,0 +1,71 @@
+# fieldsets.py
+"""
+Sparse fieldsets: `?fields=id,title` nas rotas de leitura.
+
+A rota declara `sparse_schema(Schema)` como resposta (todos os campos
+opcionais) com `exclude_unset=True`, e a view usa `project()` para buscar
+só as colunas pedidas com `.values()`. Sem `fields`, a resposta é a completa.
+"""
+from functools import lru_cache
+from typing import Optional
+
+from django.db.models import F
+from ninja.errors import HttpError
+from pydantic import create_model
+
+
+@lru_cache(maxsize=None)
+def sparse_schema(schema):
+    """Subclasse de `schema` com todos os campos opcionais"""
+    overrides = {
+        name: (Optional[field.annotation], None)
+        for name, field in schema.model_fields.items()
+    }
+    return create_model(f"{schema.__name__}Fields", __base__=schema, **overrides)
+
+
+def parse_fields(fields, schema):
+    """'id,title' -> ['id', 'title']; None se `fields` não foi informado"""
+    if not fields:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(',') if name.strip()))
+    unknown = [name for name in names if name not in schema.model_fields]
+    if unknown:
+        raise HttpError(400, f"Campos inválidos: {', '.join(unknown)}")
+    return names or None
+
+
+def column_for(schema, name):
+    """Coluna do modelo para o campo do schema (respeita o alias, ex.: created_at -> date_joined)"""
+    alias = schema.model_fields[name].alias
+    if alias is None and schema.model_config.get('alias_generator'):
+        alias = schema.model_config['alias_generator'](name)
+    return alias or name
+
+
+def project(queryset, schema, fields):
+    """
+    Restringe o SELECT às colunas de `fields` (lista já validada) e
+    retorna dicionários com os nomes do schema. Sem `fields`, retorna o
+    queryset inalterado.
+    """
+    if not fields:
+        return queryset
+    columns, renamed = [], {}
+    for name in fields:
+        column = column_for(schema, name)
+        if column == name:
+            columns.append(name)
+        else:
+            renamed[name] = F(column)
+    return queryset.values(*columns, **renamed)
+
+
+def pick(rows, fields):
+    """Projeção em memória para fontes que não são querysets (ex.: arquivo)"""
+    return [{name: row.get(name) for name in fields} for row in rows]
+
+
+def rows(queryset, schema, fields=None):
+    """`.values()` com os campos pedidos ou, sem `fields`, com todos os do schema"""
+    return project(queryset, schema, fields or list(schema.model_fields))
@@ -0,0 +1,64 @@
+# localcache.py
+"""
+Cache em memória do processo, com TTL curto, na frente do cache compartilhado
+(Redis). Evita ida à rede em chaves muito lidas; cada processo mantém a sua
+cópia, então o TTL local limita por quanto tempo um valor pode ficar velho.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class LocalTTLCache:
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def two_tier_get(local, shared, key, load, timeout):
+    """
+    Busca `key` no cache local, depois no compartilhado e por fim em
+    `load()`, preenchendo os níveis acima. `load` retornando None não é
+    armazenado.
+    """
+    value = local.get(key, MISSING)
+    if value is not MISSING:
+        return value
+    value = shared.get(key)
+    if value is None:
+        value = load()
+        if value is None:
+            return None
+        shared.set(key, value, timeout)
+    local.set(key, value)
+    return value
@@ -0,0 +1,184 @@
+# middleware.py
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import patch_vary_headers
+
+from .compression import choose_encoding, compress, compress_stream, encoding_settings, parse_quality
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depende da imagem
+    msgpack = None
+
+IDEMPOTENT_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+MAX_KEY_LENGTH = 255
+# Erros do cliente que se repetiriam no reenvio; 401, 409 e 429 são transitórios
+DETERMINISTIC_CLIENT_ERRORS = {400, 403, 404, 422}
+
+
+def is_replayable(status_code):
+    """Respostas guardadas para reenvio: sucesso (2xx) e erros determinísticos do cliente"""
+    return 200 <= status_code < 300 or status_code in DETERMINISTIC_CLIENT_ERRORS
+
+
+class IdempotencyMiddleware:
+    """
+    Suporte ao cabeçalho `Idempotency-Key` em requisições mutáveis da API.
+
+    A primeira resposta (2xx ou 400/403/404/422) fica no cache pelo TTL
+    configurado e é reproduzida nos reenvios, sem executar a view nem
+    consultar o banco. Respostas transitórias (401, 409, 429, 5xx) só
+    liberam o lock: o reenvio executa a view de novo.
+    A chave é isolada por credencial (Authorization), método e caminho; o
+    reuso com outro corpo retorna 422 e reenvios simultâneos recebem 409.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = request.headers.get('Idempotency-Key')
+        config = settings.IDEMPOTENCY
+        if (
+            not key
+            or request.method not in IDEMPOTENT_METHODS
+            or not request.path.startswith(config['PATH_PREFIX'])
+        ):
+            return self.get_response(request)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({"detail": "Idempotency-Key inválida"}, status=400)
+
+        scope = hashlib.sha256(
+            "\n".join([
+                request.headers.get('Authorization', ''),
+                request.method,
+                request.path,
+                key,
+            ]).encode()
+        ).hexdigest()
+        cache_key = f"idempotency:{scope}"
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+
+        stored = cache.get(cache_key)
+        if stored is not None:
+            return self._replay(stored, fingerprint)
+
+        lock_key = f"{cache_key}:lock"
+        if not cache.add(lock_key, 1, timeout=config['LOCK_TTL']):
+            response = JsonResponse({"detail": "Requisição com esta Idempotency-Key em processamento"}, status=409)
+            response['Retry-After'] = '1'
+            return response
+
+        try:
+            response = self.get_response(request)
+            if is_replayable(response.status_code) and not response.streaming:
+                cache.set(cache_key, {
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'content': response.content,
+                    'content_type': response.get('Content-Type'),
+                }, timeout=config['TTL'])
+        finally:
+            cache.delete(lock_key)
+        return response
+
+    def _replay(self, stored, fingerprint):
+        if stored['fingerprint'] != fingerprint:
+            return JsonResponse(
+                {"detail": "Idempotency-Key já utilizada com outro corpo de requisição"},
+                status=422,
+            )
+        response = HttpResponse(
+            stored['content'],
+            status=stored['status'],
+            content_type=stored['content_type'],
+        )
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+
+def wants_msgpack(accept):
+    """True se o cliente prefere msgpack a JSON no cabeçalho Accept"""
+    if msgpack is None:
+        return False
+    accepted = parse_quality(accept)
+    quality = max(accepted.get(media_type, 0.0) for media_type in MSGPACK_TYPES)
+    return quality > 0 and quality >= accepted.get('application/json', 0.0)
+
+
+class ContentNegotiationMiddleware:
+    """
+    Negocia o formato e a codificação das respostas da API:
+
+    - `Accept: application/msgpack` converte respostas JSON para msgpack;
+    - `Accept-Encoding` escolhe br, zstd ou gzip (conforme instalados),
+      apenas acima de RESPONSE_ENCODING['MIN_SIZE']. Respostas em streaming
+      são compactadas por pedaço, e variantes pré-compactadas anexadas pela
+      view (`response.precompressed`) são usadas sem compactar de novo.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not request.path.startswith(encoding_settings()['PATH_PREFIX']):
+            return response
+
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        if response.has_header('Content-Encoding'):
+            return response
+
+        if (
+            not response.streaming
+            and response.get('Content-Type', '').startswith('application/json')
+            and wants_msgpack(request.headers.get('Accept'))
+        ):
+            response = self._to_msgpack(response)
+
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            precompressed = getattr(response, 'precompressed', None) or {}
+            if encoding in precompressed:
+                response.content = precompressed[encoding]
+            elif len(response.content) >= encoding_settings()['MIN_SIZE']:
+                response.content = compress(response.content, encoding)
+            else:
+                return response
+            response['Content-Length'] = str(len(response.content))
+
+        # Como o GZipMiddleware do Django: o corpo mudou, o ETag fica fraco
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+    def _to_msgpack(self, response):
+        try:
+            data = json.loads(response.content)
+        except ValueError:
+            return response
+        converted = HttpResponse(
+            msgpack.packb(data, use_bin_type=True),
+            status=response.status_code,
+            content_type='application/msgpack',
+        )
+        for header, value in response.items():
+            if header.lower() not in ('content-type', 'content-length'):
+                converted[header] = value
+        return converted
@@ -0,0 +1,246 @@
+# profiling.py
+"""
+Perfil de requisições sob demanda.
+
+Uma requisição é perfilada quando um ADMIN envia o cabeçalho `X-Profile`
+(token validado pelo AuthBearer) ou quando cai na amostragem
+(PROFILING['SAMPLE_RATE']). O perfil junta:
+
+- as funções mais caras segundo o cProfile;
+- os comandos SQL com duração, repetições exatas (mesmo SQL e parâmetros)
+  e consultas semelhantes (mesmo SQL, parâmetros diferentes: N+1). Os
+  valores dos parâmetros não são guardados (ex.: hash de senha no
+  cadastro), só a quantidade e um hash para comparar repetições;
+- as chamadas ao cache, com a duração.
+
+O perfil fica no cache por TTL e é lido em /api/diagnostics/profiles; a
+resposta leva `X-Profile-Id` e um resumo em `Server-Timing`. Fora desses
+casos o custo é uma leitura do META e, com amostragem, um sorteio.
+
+Os coletores só existem durante a requisição perfilada: o SQL passa por
+`connection.execute_wrapper` e o cache por atributos na instância do
+backend, ambos locais à thread (ou ao contexto, no ASGI).
+"""
+import cProfile
+import hashlib
+import pstats
+import random
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connections
+from django.utils import timezone
+
+PROFILE_KEY = "profile:{profile_id}"
+RECENT_KEY = "profile:recent"
+HEADER_META = 'HTTP_X_PROFILE'
+
+CACHE_METHODS = ('get', 'set', 'add', 'delete', 'get_many', 'set_many', 'delete_many',
+                 'incr', 'decr', 'touch', 'has_key', 'get_or_set')
+
+
+def profiling_settings():
+    return settings.PROFILING
+
+
+def profile_key(profile_id):
+    return PROFILE_KEY.format(profile_id=profile_id)
+
+
+def redact_params(params):
+    """Quantidade e hash dos parâmetros, sem os valores"""
+    try:
+        count = len(params) if params is not None else 0
+    except TypeError:  # executemany com gerador
+        count = None
+    return {
+        'param_count': count,
+        'params_digest': hashlib.sha1(repr(params).encode()).hexdigest()[:16],
+    }
+
+
+class QueryCollector:
+    """Wrapper de `connection.execute_wrapper`: registra cada comando e a duração"""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': self.alias,
+                'sql': sql,
+                **redact_params(params),
+                'many': many,
+                'ms': round((time.perf_counter() - start) * 1000, 3),
+            })
+
+
+class CacheCollector:
+    """Substitui os métodos da instância do backend (só na thread da requisição)"""
+
+    def __init__(self):
+        self.calls = []
+        self.depth = 0
+        self.patched = []
+
+    def install(self):
+        for alias in settings.CACHES:
+            backend = caches[alias]
+            for name in CACHE_METHODS:
+                setattr(backend, name, self._wrap(alias, name, getattr(backend, name)))
+            self.patched.append(backend)
+
+    def uninstall(self):
+        for backend in self.patched:
+            for name in CACHE_METHODS:
+                backend.__dict__.pop(name, None)
+        self.patched = []
+
+    def _wrap(self, alias, name, method):
+        def wrapper(*args, **kwargs):
+            # Só a chamada externa: get_many do BaseCache chama get por chave
+            self.depth += 1
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.depth -= 1
+                if self.depth == 0:
+                    key = args[0] if args else kwargs.get('key', kwargs.get('keys'))
+                    if isinstance(key, dict):
+                        key = list(key)
+                    self.calls.append({
+                        'alias': alias,
+                        'method': name,
+                        'key': repr(key)[:200],
+                        'ms': round((time.perf_counter() - start) * 1000, 3),
+                    })
+        return wrapper
+
+
+def summarize_queries(queries, top):
+    exact = Counter((q['sql'], q['params_digest']) for q in queries)
+    similar = Counter(q['sql'] for q in queries)
+    return {
+        'count': len(queries),
+        'ms': round(sum(q['ms'] for q in queries), 3),
+        'duplicates': [{'sql': sql, 'params_digest': digest, 'count': count}
+                       for (sql, digest), count in exact.most_common() if count > 1],
+        'similar': [{'sql': sql, 'count': count}
+                    for sql, count in similar.most_common() if count > 1],
+        'slowest': sorted(queries, key=lambda q: q['ms'], reverse=True)[:top],
+        'statements': queries,
+    }
+
+
+def summarize_functions(profiler, top):
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, function), (calls, _, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': f'{filename}:{line}({function})',
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3),
+        })
+    return sorted(rows, key=lambda row: row['cumtime_ms'], reverse=True)[:top]
+
+
+def is_admin_request(request):
+    # Import tardio: o middleware é carregado antes das rotas
+    from users.api import AuthBearer
+
+    user = AuthBearer()(request)
+    return getattr(user, 'role', None) == 'ADMIN'
+
+
+def store(profile):
+    config = profiling_settings()
+    cache.set(profile_key(profile['id']), profile, config['TTL'])
+    recent = [profile['summary']] + (cache.get(RECENT_KEY) or [])
+    cache.set(RECENT_KEY, recent[:config['KEEP']], config['TTL'])
+
+
+def recent():
+    """Resumos dos perfis mais recentes, do mais novo ao mais antigo"""
+    return cache.get(RECENT_KEY) or []
+
+
+def get(profile_id):
+    return cache.get(profile_key(profile_id))
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = profiling_settings()
+        requested = HEADER_META in request.META
+        sampled = not requested and config['SAMPLE_RATE'] > 0 and random.random() < config['SAMPLE_RATE']
+        if not (requested or sampled) or not request.path.startswith(config['PATH_PREFIX']):
+            return self.get_response(request)
+        if requested and not is_admin_request(request):
+            return self.get_response(request)
+        return self._profile(request, 'header' if requested else 'sample')
+
+    def _profile(self, request, trigger):
+        config = profiling_settings()
+        collectors = [QueryCollector(alias) for alias in connections]
+        cache_collector = CacheCollector()
+        profiler = cProfile.Profile()
+
+        with ExitStack() as stack:
+            for collector in collectors:
+                stack.enter_context(connections[collector.alias].execute_wrapper(collector))
+            cache_collector.install()
+            stack.callback(cache_collector.uninstall)
+            start = time.perf_counter()
+            try:
+                profiler.enable()
+                stack.callback(profiler.disable)
+            except ValueError:  # Outro profiler já ativo no processo: segue sem as funções
+                profiler = None
+            response = self.get_response(request)
+            duration = (time.perf_counter() - start) * 1000
+
+        queries = summarize_queries([q for c in collectors for q in c.queries], config['TOP_QUERIES'])
+        calls = cache_collector.calls
+        cache_ms = round(sum(c['ms'] for c in calls), 3)
+        profile_id = uuid.uuid4().hex
+        summary = {
+            'id': profile_id,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'trigger': trigger,
+            'ms': round(duration, 3),
+            'queries': queries['count'],
+            'duplicate_queries': sum(d['count'] - 1 for d in queries['duplicates']),
+            'cache_calls': len(calls),
+            'created_at': timezone.now().isoformat(),
+        }
+        store({
+            'id': profile_id,
+            'summary': summary,
+            'functions': summarize_functions(profiler, config['TOP_FUNCTIONS']) if profiler else [],
+            'sql': queries,
+            'cache': {'count': len(calls), 'ms': cache_ms, 'calls': calls},
+        })
+
+        response['X-Profile-Id'] = profile_id
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={duration:.1f}',
+            f'db;dur={queries["ms"]:.1f};desc="{queries["count"]} queries"',
+            f'cache;dur={cache_ms:.1f};desc="{len(calls)} calls"',
+        ])
+        return response
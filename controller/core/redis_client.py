@@ -0,0 +1,15 @@
+# redis_client.py
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def _client(url):
+    return redis.Redis.from_url(url, socket_connect_timeout=1, socket_timeout=1)
+
+
+def get_redis():
+    """Cliente Redis compartilhado pelo processo (settings.REDIS_URL)"""
+    return _client(settings.REDIS_URL)
@@ -0,0 +1,64 @@
+# renderers.py
+"""
+Serialização JSON com orjson.
+
+`ORJSONRenderer` substitui o JSONRenderer padrão das NinjaAPI e
+`fast_response` permite que rotas de listagem devolvam dicionários vindos
+de `.values()` já serializados, sem instanciar modelos nem validar linha a
+linha pelo schema de saída (que continua documentando a rota no OpenAPI).
+"""
+from functools import wraps
+
+from django.http import HttpResponse
+from ninja.renderers import BaseRenderer
+from ninja.responses import NinjaJSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson é instalado na imagem
+    orjson = None
+
+_fallback_encoder = NinjaJSONEncoder()
+
+
+def _default(obj):
+    # Tipos que o orjson não conhece (Decimal, lazy strings, modelos pydantic...)
+    return _fallback_encoder.default(obj)
+
+
+def dumps(data):
+    """Serializa para bytes JSON (datetimes UTC com sufixo Z, como o Django)"""
+    if orjson is None:
+        return _fallback_encoder.encode(data).encode('utf-8')
+    return orjson.dumps(
+        data,
+        default=_default,
+        option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS,
+    )
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = "application/json"
+
+    def render(self, request, data, *, response_status):
+        return dumps(data)
+
+
+def fast_response(func):
+    """
+    Serializa o retorno da view direto para um HttpResponse. Use por fora de
+    `@paginate` em views que retornam `.values()` com os campos do schema.
+    """
+    @wraps(func)
+    def wrapper(request, *args, **kwargs):
+        result = func(request, *args, **kwargs)
+        if isinstance(result, HttpResponse):
+            return result
+        if isinstance(result, dict):
+            if 'items' in result:
+                # Resultado paginado: {"items": [...], "count": ...}
+                result = {**result, 'items': list(result['items'])}
+        else:
+            result = list(result)
+        return HttpResponse(dumps(result), content_type='application/json; charset=utf-8')
+    return wrapper
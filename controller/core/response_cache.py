@@ -0,0 +1,130 @@
+# response_cache.py
+"""
+Cache de respostas das rotas do Ninja.
+
+`cached_route` guarda o corpo (com as variantes compactadas) por caminho,
+query string e papel do usuário. Cada entrada registra a versão das suas
+tags no momento do cálculo; `purge(tag)` troca a versão e invalida todas
+as entradas marcadas com ela, sem precisar conhecer as chaves.
+
+Proteção contra estouro (stampede): quando uma entrada expira, só quem
+obtém o lock recalcula; os demais continuam servindo a versão vencida
+durante STALE_TTL. Sem versão utilizável, esperam o recálculo em andamento
+por até LOCK_WAIT segundos.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .compression import encode_variants
+
+ENTRY_KEY = "route:{name}:{digest}"
+LOCK_KEY = ENTRY_KEY + ":lock"
+TAG_KEY = "route:tag:{tag}"
+
+
+def cache_settings():
+    return settings.RESPONSE_CACHE
+
+
+def purge(*tags):
+    """Invalida as respostas marcadas com qualquer uma das tags"""
+    cache.set_many({TAG_KEY.format(tag=tag): time.time_ns() for tag in tags}, None)
+
+
+def tag_versions(tags, create=False):
+    keys = {TAG_KEY.format(tag=tag): tag for tag in tags}
+    found = cache.get_many(list(keys))
+    if create:
+        for key in keys.keys() - found.keys():
+            # Tag nunca invalidada (ou expulsa do cache): fixa uma versão
+            cache.add(key, time.time_ns(), None)
+        found = cache.get_many(list(keys))
+    return {tag: found.get(key) for key, tag in keys.items()}
+
+
+def entry_key(name, request, vary_on_role):
+    parts = [request.path]
+    parts += [f'{key}={value}' for key, values in sorted(request.GET.lists()) for value in sorted(values)]
+    if vary_on_role:
+        # Rotas públicas (auth=None) não recebem request.auth
+        parts.append(getattr(getattr(request, 'auth', None), 'role', None) or 'anonymous')
+    digest = hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+    return ENTRY_KEY.format(name=name, digest=digest)
+
+
+def _state(entry, tags):
+    """'fresh', 'stale' (expirada, mas servível) ou None (ausente ou invalidada)"""
+    if entry is None or entry['tags'] != tag_versions(tags):
+        return None
+    return 'fresh' if entry['expires_at'] > time.time() else 'stale'
+
+
+def _serve(entry, status):
+    response = HttpResponse(entry['variants']['identity'], content_type=entry['content_type'])
+    response['X-Cache'] = status
+    # Lido pelo ContentNegotiationMiddleware
+    response.precompressed = entry['variants']
+    return response
+
+
+def cached_route(ttl, tags=None, vary_on_role=True):
+    """
+    Cacheia respostas 200 da rota por `ttl` segundos. `tags(request, **kwargs)`
+    retorna as tags da resposta. Use acima de `@fast_response` (a rota deve
+    devolver um HttpResponse); outras respostas passam sem cache.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__name__}"
+
+        @wraps(func)
+        def wrapper(request, *args, **kwargs):
+            config = cache_settings()
+            key = entry_key(name, request, vary_on_role)
+            route_tags = sorted(tags(request, **kwargs)) if tags else []
+
+            def compute():
+                # Versões lidas antes do cálculo: um purge durante ele invalida o resultado
+                versions = tag_versions(route_tags, create=True)
+                response = func(request, *args, **kwargs)
+                if (isinstance(response, HttpResponse) and response.status_code == 200
+                        and not response.streaming):
+                    variants = encode_variants(response.content)
+                    cache.set(key, {
+                        'variants': variants,
+                        'content_type': response['Content-Type'],
+                        'expires_at': time.time() + ttl,
+                        'tags': versions,
+                    }, ttl + config['STALE_TTL'])
+                    response['X-Cache'] = 'MISS'
+                    response.precompressed = variants
+                return response
+
+            entry = cache.get(key)
+            state = _state(entry, route_tags)
+            if state == 'fresh':
+                return _serve(entry, 'HIT')
+
+            lock_key = LOCK_KEY.format(name=name, digest=key.rsplit(':', 1)[-1])
+            if cache.add(lock_key, 1, config['LOCK_TIMEOUT']):
+                try:
+                    return compute()
+                finally:
+                    cache.delete(lock_key)
+            if state == 'stale':
+                # Outro processo já está recalculando
+                return _serve(entry, 'STALE')
+
+            deadline = time.monotonic() + config['LOCK_WAIT']
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                entry = cache.get(key)
+                if _state(entry, route_tags) == 'fresh':
+                    return _serve(entry, 'HIT')
+            return compute()
+        return wrapper
+    return decorator
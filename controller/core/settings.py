@@ -18,7 +18,6 @@ from dotenv import load_dotenv
 load_dotenv()
 
 SECRET_KEY = os.getenv('SECRET_KEY', 'fallback-secret-key')
-print(f"SECRET_KEY carregado: {SECRET_KEY}")
 DEBUG = os.getenv('DEBUG', 'False') == 'True'
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -36,11 +35,88 @@ DEBUG = True
 ALLOWED_HOSTS = []
 
 # Configurações do Celery (para tarefas assíncronas)
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+
 CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'  # Adicione esta linha
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 
+# Filas: 'grading' (latência crítica: correção e ingestão de respostas),
+# 'batch' (ranking e análises) e 'maintenance' (partições, tarefas de debug).
+# Em produção cada grupo tem seus workers (ver docker-compose.yml).
+CELERY_TASK_QUEUES = {
+    'grading': {'exchange': 'grading', 'routing_key': 'grading'},
+    'batch': {'exchange': 'batch', 'routing_key': 'batch'},
+    'maintenance': {'exchange': 'maintenance', 'routing_key': 'maintenance'},
+}
+CELERY_TASK_DEFAULT_QUEUE = 'batch'
+CELERY_TASK_ROUTES = {
+    'exams.tasks.grade_answers': {'queue': 'grading'},
+    'exams.tasks.flush_answer_buffer': {'queue': 'grading'},
+    'exams.tasks.grade_short_answers': {'queue': 'grading'},
+    'exams.tasks.update_ranking': {'queue': 'batch'},
+    'exams.tasks.regrade_question': {'queue': 'batch'},
+    'exams.tasks.ensure_answer_partitions': {'queue': 'maintenance'},
+    'exams.tasks.prewarm_exams': {'queue': 'maintenance'},
+    'exams.tasks.activate_exams': {'queue': 'maintenance'},
+    'exams.tasks.snapshot_search_index': {'queue': 'maintenance'},
+    'exams.tasks.purge_deleted': {'queue': 'maintenance'},
+    'exams.tasks.add': {'queue': 'maintenance'},
+    'users.tasks.provision_users_job': {'queue': 'batch'},
+    'core.celery.debug_task': {'queue': 'maintenance'},
+}
+# Worker que consome várias filas esvazia na ordem de -Q (grading primeiro)
+CELERY_BROKER_TRANSPORT_OPTIONS = {'queue_order_strategy': 'priority'}
+# Uma mensagem reservada por processo: tarefas curtas não esperam atrás de lotes longos
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.getenv('CELERY_WORKER_PREFETCH_MULTIPLIER', '1'))
+# acks_late só nas tarefas idempotentes (definido em cada tarefa)
+CELERY_TASK_ACKS_LATE = False
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_BEAT_SCHEDULE = {
+    # Cria com antecedência as partições mensais da tabela de respostas
+    'ensure-answer-partitions': {
+        'task': 'exams.tasks.ensure_answer_partitions',
+        'schedule': timedelta(hours=24),
+    },
+    # Liga/desliga provas nos limites da janela (a tarefa se reagenda para o limite exato)
+    'activate-exams': {
+        'task': 'exams.tasks.activate_exams',
+        'schedule': timedelta(minutes=1),
+    },
+    # Reconstrói o índice de limites a partir do banco (ex.: Redis reiniciado)
+    'rebuild-exam-schedule': {
+        'task': 'exams.tasks.activate_exams',
+        'schedule': timedelta(hours=1),
+        'kwargs': {'rebuild': True},
+    },
+    # Carrega conteúdo, gabarito, inscritos e usuários das provas prestes a começar
+    'prewarm-exams': {
+        'task': 'exams.tasks.prewarm_exams',
+        'schedule': timedelta(minutes=1),
+    },
+    # Snapshot do índice de busca em disco, para os processos iniciarem rápido
+    'snapshot-search-index': {
+        'task': 'exams.tasks.snapshot_search_index',
+        'schedule': timedelta(minutes=15),
+    },
+    # Descarrega o buffer de respostas (modo de ingestão 'buffered')
+    'flush-answer-buffer': {
+        'task': 'exams.tasks.flush_answer_buffer',
+        'schedule': timedelta(seconds=2),
+    },
+    # Varre respostas curtas (SA) pendentes esquecidas pelo disparo após a submissão
+    'grade-short-answers': {
+        'task': 'exams.tasks.grade_short_answers',
+        'schedule': timedelta(seconds=30),
+    },
+    # Remove exclusões lógicas cuja tarefa se perdeu
+    'purge-deleted': {
+        'task': 'exams.tasks.purge_deleted',
+        'schedule': timedelta(hours=1),
+    },
+}
+
 
 # Application definition
 
@@ -58,12 +134,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.profiling.ProfilingMiddleware',
+    'core.slowqueries.SlowQueryMiddleware',
+    'core.middleware.ContentNegotiationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.IdempotencyMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -106,6 +186,17 @@ DATABASES = {
     }
 }
 
+# Busca de provas: 'memory' (índice invertido no processo, BM25) ou 'elasticsearch'
+EXAM_SEARCH = {
+    'BACKEND': os.getenv('EXAM_SEARCH_BACKEND', 'memory'),
+    'SNAPSHOT_PATH': os.getenv('EXAM_SEARCH_SNAPSHOT', str(BASE_DIR / 'search_index' / 'exams.json')),
+    'K1': 1.2,
+    'B': 0.75,
+    'TITLE_BOOST': 2,
+    'MAX_RESULTS': 50,
+    'SYNC_OVERLAP': 5,  # Segundos relidos a cada sincronização incremental
+}
+
 ELASTICSEARCH_DSL = {
     'default': {
         'hosts': 'localhost:9200'  # URL do Elasticsearch
@@ -116,14 +207,154 @@ ELASTICSEARCH_DSL = {
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-        "LOCATION": "redis://127.0.0.1:6379/1",  # DB 1 para cache
-        "OPTIONS": {
-            "CLIENT_CLASS": "django_redis.client.DefaultClient",
-        },
+        # DB 1 para cache (o backend nativo do Django não aceita CLIENT_CLASS do django-redis)
+        "LOCATION": os.getenv('REDIS_CACHE_URL', 'redis://redis:6379/1'),
         "KEY_PREFIX": "exam_cache"
     }
 }
 
+# Idempotency-Key: respostas de requisições mutáveis guardadas no cache
+IDEMPOTENCY = {
+    'PATH_PREFIX': '/api/',
+    'TTL': 60 * 60 * 24,  # Janela de reenvio aceita
+    'LOCK_TTL': 30,  # Tempo máximo de processamento da primeira requisição
+}
+
+# Perfil de requisições: cabeçalho X-Profile (só ADMIN) ou amostragem
+PROFILING = {
+    'PATH_PREFIX': '/api/',
+    'SAMPLE_RATE': float(os.getenv('PROFILING_SAMPLE_RATE', '0')),  # Fração das requisições (0 = desligado)
+    'TTL': 60 * 60 * 24,  # Perfis guardados no cache
+    'KEEP': 100,  # Perfis listados em /api/diagnostics/profiles
+    'TOP_FUNCTIONS': 40,
+    'TOP_QUERIES': 10,
+}
+
+# Log de consultas lentas: acima do limite registra SQL, origem e ponto de chamada;
+# uma fração recebe o plano (EXPLAIN sem ANALYZE) numa thread à parte
+SLOW_QUERIES = {
+    'ENABLED': os.getenv('SLOW_QUERIES_ENABLED', 'true').lower() == 'true',
+    'THRESHOLD_MS': float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '200')),
+    'EXPLAIN_SAMPLE_RATE': float(os.getenv('SLOW_QUERY_EXPLAIN_RATE', '0.1')),
+    'BACKEND': os.getenv('SLOW_QUERIES_BACKEND', 'redis'),  # Buffer circular: 'redis' (compartilhado) ou 'local'
+    'BUFFER_SIZE': 500,
+    'LOG_FILE': os.getenv('SLOW_QUERY_LOG_FILE', str(BASE_DIR / 'logs' / 'slow_queries.log')),
+    'LOG_MAX_BYTES': 10 * 1024 * 1024,
+}
+
+# Negociação de formato (msgpack) e compressão das respostas da API
+RESPONSE_ENCODING = {
+    'PATH_PREFIX': '/api/',
+    'MIN_SIZE': 1024,  # Bytes; respostas menores seguem sem compressão
+    'ENCODINGS': ['br', 'zstd', 'gzip'],  # Preferência do servidor (br/zstd se instalados)
+    'CACHE_TTL': 60,  # Variantes pré-compactadas em cache
+}
+
+# Agenda de ativação das provas e conjunto de provas ativas em cache
+EXAM_SCHEDULE = {
+    'BACKEND': os.getenv('EXAM_SCHEDULE_BACKEND', 'redis'),  # 'redis' ou 'local'
+    'KEY': 'exams:schedule',
+    'ACTIVE_CACHE_TTL': 60 * 5,  # Limite de atraso se a agenda parar
+    'MAX_LIMIT': 100,
+    'ARM_WINDOW': 60,  # Segundos à frente em que a tarefa se agenda para o limite exato
+}
+
+# Cache de respostas das rotas (core/response_cache.py), em segundos
+RESPONSE_CACHE = {
+    'STALE_TTL': 60,  # Por quanto tempo a versão vencida ainda pode ser servida
+    'LOCK_TIMEOUT': 10,  # Recálculo que passar disso libera o lock
+    'LOCK_WAIT': 2,  # Espera pelo recálculo de outro processo quando não há versão vencida
+}
+
+# Limites das consultas de ranking (top-K e vizinhança do usuário)
+RANKING = {
+    'DEFAULT_TOP': 10,
+    'MAX_TOP': 100,
+    'DEFAULT_WINDOW': 5,
+    'MAX_WINDOW': 50,
+}
+
+# Resumo do resultado do participante: invalidado a cada resposta gravada;
+# o TTL limita a defasagem do percentil (que muda com as notas dos outros)
+PARTICIPANT_SUMMARY_CACHE_TTL = 60 * 10
+
+# Correção em lote das respostas curtas (SA)
+SHORT_ANSWER_GRADING = {
+    'PROCESSES': int(os.getenv('SHORT_ANSWER_GRADING_PROCESSES', os.cpu_count() or 1)),
+    'POOL_MIN_ANSWERS': 2000,  # Respostas distintas a avaliar para valer abrir o pool
+    'MATCH_CACHE_TTL': 60 * 60 * 24,  # Resultado por (regra, resposta normalizada)
+    'BATCH_SIZE': 5000,
+    'DEBOUNCE': 2,  # Segundos entre disparos da correção após submissões
+}
+
+# Edições do gabarito de uma questão dentro desta janela (s) viram uma única recorreção
+REGRADE_DEBOUNCE = 5
+
+# Remoção em segundo plano das provas, participantes e usuários excluídos
+PURGE = {
+    'CHUNK_SIZE': 5000,  # Linhas por DELETE (uma transação cada)
+    'CHUNK_PAUSE': 0.05,  # Segundos entre lotes
+    'PROGRESS_TTL': 60 * 60 * 24 * 7,
+}
+
+# Usuários autenticados em cache (Redis + memória do processo, em segundos)
+AUTH_PRINCIPAL_CACHE = {
+    'TTL': 60 * 10,
+    'LOCAL_TTL': 5,
+}
+
+# Pré-aquecimento dos caches antes do início das provas (minutos de antecedência)
+EXAM_PREWARM_MINUTES = int(os.getenv('EXAM_PREWARM_MINUTES', '10'))
+ROSTER_CACHE_TTL = 60 * 60 * 6
+
+# Snapshots publicados das provas são imutáveis: TTL longo no cache
+EXAM_SNAPSHOT_CACHE_TTL = 60 * 60 * 24 * 7
+
+# Arquivamento de respostas de provas encerradas
+ANSWER_ARCHIVE_DIR = os.getenv('ANSWER_ARCHIVE_DIR', str(BASE_DIR / 'archive'))
+ANSWER_ARCHIVE_AFTER_DAYS = int(os.getenv('ANSWER_ARCHIVE_AFTER_DAYS', '30'))
+
+# Ingestão de respostas: 'sync' grava direto no banco; 'buffered' anexa a um
+# buffer (Redis Stream ou log local) descarregado em lotes pelo consumidor
+ANSWER_INGESTION = {
+    'MODE': os.getenv('ANSWER_INGESTION_MODE', 'sync'),
+    'BACKEND': os.getenv('ANSWER_INGESTION_BACKEND', 'redis'),  # 'redis' ou 'local'
+    'STREAM': 'answers:ingest',
+    'GROUP': 'answer-writers',
+    'LOCAL_DIR': str(BASE_DIR / 'ingest'),
+    'BATCH_SIZE': 1000,
+    'DEDUPE_TTL': 60 * 60 * 24 * 7,
+    'CLAIM_IDLE_MS': 60 * 1000,  # Entregas paradas há mais que isso são assumidas por outro consumidor
+    'FLUSH_LOCK_TTL': 60,  # Validade do lock de gravação (lote mais lento esperado)
+    'FLUSH_LOCK_WAIT': 5,  # Espera pelo lock antes de desistir da rodada
+}
+
+# Rate limiting (token bucket por rota): 'rate' = fichas/período, 'burst' = capacidade
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'redis')  # 'redis' ou 'local'
+RATE_LIMITS = {
+    'login_ip': {'rate': '30/m', 'burst': 10},
+    'login_user': {'rate': '5/m', 'burst': 5},
+    'answers_user': {'rate': '120/m', 'burst': 30},
+}
+# Logins (hash de senha) simultâneos por processo antes de responder 503
+LOGIN_MAX_CONCURRENCY = int(os.getenv('LOGIN_MAX_CONCURRENCY', '4'))
+
+# Contagem nas listas paginadas: exata abaixo de EXACT_THRESHOLD; acima,
+# 'estimate' (planner do PostgreSQL) ou 'cached' (COUNT exato em cache por CACHE_TTL)
+PAGINATION_COUNT = {
+    'STRATEGY': os.getenv('PAGINATION_COUNT_STRATEGY', 'estimate'),  # 'exact', 'estimate' ou 'cached'
+    'EXACT_THRESHOLD': 100_000,
+    'CACHE_TTL': 60,
+}
+
+# Processos para hash de senha no cadastro em massa (padrão: núcleos da máquina)
+PROVISIONING_WORKERS = int(os.getenv('PROVISIONING_WORKERS', os.cpu_count() or 1))
+# Cadastro em massa pela API: arquivo e andamento ficam no cache até o worker processar
+PROVISIONING_JOBS = {
+    'TTL': 60 * 60 * 24,
+    'MAX_UPLOAD_BYTES': 20 * 1024 * 1024,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -144,7 +375,8 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 NINJA_JWT = {
-    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
+    # Access token curto; a renovação usa o refresh token (sem hash de senha)
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
@@ -0,0 +1,263 @@
+# slowqueries.py
+"""
+Log de consultas lentas.
+
+Um execute wrapper instalado em toda conexão (sinal `connection_created`)
+mede cada comando; acima de SLOW_QUERIES['THRESHOLD_MS'] registra o SQL, a
+origem (rota da requisição ou tarefa Celery) e o ponto de chamada no código
+do projeto. Uma fração (EXPLAIN_SAMPLE_RATE) ganha o plano, obtido com
+`EXPLAIN (ANALYZE off)` numa thread à parte, sem atrasar quem fez a consulta.
+
+Os registros vão para um buffer circular (lista no Redis compartilhada
+entre processos, ou memória do processo quando o Redis está fora) e para
+um arquivo de log local em JSON lines. /api/diagnostics/slow-queries
+agrupa o buffer pelos piores ofensores. Como no perfil de requisições, os
+valores dos parâmetros não são gravados: só a quantidade e um hash. O
+EXPLAIN recebe os valores em memória e as literais de texto que o plano
+repete (ex.: `Index Cond: (username = '...')`) são mascaradas.
+"""
+import contextvars
+import json
+import logging
+import random
+import re
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+import redis
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .profiling import redact_params
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+BUFFER_KEY = "diagnostics:slow-queries"
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+current_origin = contextvars.ContextVar('slow_query_origin', default=None)
+_explaining = threading.local()
+
+local_buffer = deque()
+_buffer_lock = threading.Lock()
+_explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-explain')
+_pending = set()
+_redis_down_until = 0.0
+_file_logger = None
+
+
+def slow_query_settings():
+    return settings.SLOW_QUERIES
+
+
+# ---------------------------------- Origem ----------------------------------
+
+def set_origin(origin):
+    """Marca a rota ou tarefa em execução; retorna o token para `reset_origin`"""
+    return current_origin.set(origin)
+
+
+def reset_origin(token):
+    current_origin.reset(token)
+
+
+def _origin():
+    origin = current_origin.get()
+    # Requisição: a rota só é conhecida depois da resolução da URL
+    if origin is not None and not isinstance(origin, str):
+        match = getattr(origin, 'resolver_match', None)
+        route = f"/{match.route}" if match else origin.path
+        return f"{origin.method} {route}"
+    return origin
+
+
+def call_site():
+    """Frame mais interno do código do projeto (fora deste módulo e das libs)"""
+    base = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        if frame.filename.startswith(base) and 'site-packages' not in frame.filename \
+                and not frame.filename.endswith('slowqueries.py'):
+            return f"{Path(frame.filename).relative_to(base)}:{frame.lineno} in {frame.name}"
+    return None
+
+
+class SlowQueryMiddleware:
+    """Guarda a requisição no contexto para nomear a origem das consultas lentas"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = set_origin(request)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_origin(token)
+
+
+# ------------------------------- Registro -------------------------------
+
+def _log_file():
+    global _file_logger
+    if _file_logger is None:
+        config = slow_query_settings()
+        path = Path(config['LOG_FILE'])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        file_logger = logging.getLogger('slow_queries.file')
+        file_logger.propagate = False
+        file_logger.setLevel(logging.INFO)
+        file_logger.addHandler(RotatingFileHandler(path, maxBytes=config['LOG_MAX_BYTES'], backupCount=3))
+        _file_logger = file_logger
+    return _file_logger
+
+
+def record(entry):
+    """Anexa ao buffer circular e ao arquivo de log"""
+    global _redis_down_until
+
+    config = slow_query_settings()
+    data = json.dumps(entry, default=str)
+    try:
+        _log_file().info(data)
+    except OSError as e:
+        logger.warning(f"Falha ao gravar o log de consultas lentas: {e}")
+
+    if config['BACKEND'] == 'redis' and time.monotonic() >= _redis_down_until:
+        try:
+            client = get_redis()
+            pipe = client.pipeline()
+            pipe.lpush(BUFFER_KEY, data)
+            pipe.ltrim(BUFFER_KEY, 0, config['BUFFER_SIZE'] - 1)
+            pipe.execute()
+            return
+        except redis.RedisError as e:
+            logger.warning(f"Log de consultas lentas sem Redis, usando buffer local: {e}")
+            _redis_down_until = time.monotonic() + 5
+    with _buffer_lock:
+        local_buffer.appendleft(entry)
+        while len(local_buffer) > config['BUFFER_SIZE']:
+            local_buffer.pop()
+
+
+def entries():
+    """Registros do buffer, do mais novo ao mais antigo"""
+    config = slow_query_settings()
+    if config['BACKEND'] == 'redis' and time.monotonic() >= _redis_down_until:
+        try:
+            return [json.loads(item) for item in get_redis().lrange(BUFFER_KEY, 0, -1)]
+        except redis.RedisError:
+            pass
+    with _buffer_lock:
+        return list(local_buffer)
+
+
+def top_offenders(limit=20, order='total_ms'):
+    """Registros agrupados pelo SQL, ordenados por tempo total, máximo ou contagem"""
+    groups = {}
+    for entry in entries():
+        group = groups.setdefault(entry['sql'], {
+            'sql': entry['sql'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'origins': set(), 'call_sites': set(), 'last_seen': entry['at'], 'plan': None,
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        group['max_ms'] = max(group['max_ms'], entry['ms'])
+        group['origins'].add(entry['origin'] or '-')
+        group['call_sites'].add(entry['call_site'] or '-')
+        # Entradas vêm do mais novo ao mais antigo: fica o plano mais recente
+        group['plan'] = group['plan'] or entry.get('plan')
+    offenders = sorted(groups.values(), key=lambda g: g[order], reverse=True)[:limit]
+    for group in offenders:
+        group['total_ms'] = round(group['total_ms'], 3)
+        group['origins'] = sorted(group['origins'])
+        group['call_sites'] = sorted(group['call_sites'])
+    return offenders
+
+
+# -------------------------------- EXPLAIN --------------------------------
+
+def explain_sql(alias, sql):
+    vendor = connections[alias].vendor
+    if vendor == 'postgresql':
+        return f"EXPLAIN (ANALYZE off) {sql}"
+    if vendor == 'sqlite':
+        return f"EXPLAIN QUERY PLAN {sql}"
+    return f"EXPLAIN {sql}"
+
+
+def _explain_and_record(alias, entry, params):
+    _explaining.active = True
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(explain_sql(alias, entry['sql']), params)
+            plan = '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+            entry['plan'] = STRING_LITERAL.sub("'?'", plan)
+    except Exception as e:  # noqa: BLE001 - o plano é opcional, o registro não
+        entry['plan_error'] = str(e)
+    finally:
+        _explaining.active = False
+        connections[alias].close()  # Conexão própria da thread do EXPLAIN
+    record(entry)
+
+
+def wait_for_explains(timeout=None):
+    """Espera os EXPLAIN em andamento (testes e encerramento do processo)"""
+    for future in list(_pending):
+        future.result(timeout=timeout)
+
+
+# -------------------------------- Wrapper --------------------------------
+
+class SlowQueryWrapper:
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            config = slow_query_settings()
+            if elapsed >= config['THRESHOLD_MS'] and not getattr(_explaining, 'active', False):
+                self.slow(sql, params, many, elapsed, config)
+
+    def slow(self, sql, params, many, elapsed, config):
+        entry = {
+            'at': timezone.now().isoformat(),
+            'alias': self.alias,
+            'sql': sql,
+            **redact_params(params),
+            'many': many,
+            'ms': round(elapsed, 3),
+            'origin': _origin(),
+            'call_site': call_site(),
+            'plan': None,
+        }
+        explain = (
+            not many
+            and sql.lstrip().upper().startswith(EXPLAINABLE)
+            and random.random() < config['EXPLAIN_SAMPLE_RATE']
+        )
+        if not explain:
+            record(entry)
+            return
+        future = _explainer.submit(_explain_and_record, self.alias, entry, params)
+        _pending.add(future)
+        future.add_done_callback(_pending.discard)
+
+
+def install_wrapper(sender, connection, **kwargs):
+    """Receptor de `connection_created`: um wrapper por conexão, mesmo após reconexões"""
+    if not slow_query_settings()['ENABLED']:
+        return
+    if not any(isinstance(w, SlowQueryWrapper) for w in connection.execute_wrappers):
+        connection.execute_wrappers.append(SlowQueryWrapper(connection.alias))
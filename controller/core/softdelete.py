@@ -0,0 +1,17 @@
+# softdelete.py
+"""
+Exclusão lógica: com `deleted_at` preenchido a linha some do manager padrão
+(`objects`) na hora, e a remoção física fica para um job em segundo plano.
+Os modelos declaram também `all_objects`, que enxerga as linhas excluídas
+(job de remoção, checagens de unicidade).
+"""
+from django.db import models
+
+
+class AliveManagerMixin:
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class AliveManager(AliveManagerMixin, models.Manager):
+    pass
@@ -0,0 +1,104 @@
+# telemetry.py
+"""
+Métricas das tarefas Celery: tempo de espera na fila (publicação -> início)
+e tempo de execução, por tarefa e fila. Os sinais são conectados em
+core/celery.py; cada processo agrega os próprios números e também os
+registra no log para coleta externa.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+
+from . import slowqueries
+
+logger = logging.getLogger(__name__)
+
+SENT_AT_HEADER = 'sent_at'
+
+
+class TaskMetrics:
+    """Agregados por (tarefa, fila): execuções, falhas, espera e duração"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = defaultdict(lambda: {
+                'count': 0,
+                'failures': 0,
+                'runtime_total': 0.0,
+                'runtime_max': 0.0,
+                'wait_total': 0.0,
+                'wait_max': 0.0,
+            })
+
+    def record(self, task_name, queue, runtime, wait, failed=False):
+        with self.lock:
+            stats = self.stats[(task_name, queue)]
+            stats['count'] += 1
+            stats['failures'] += int(failed)
+            stats['runtime_total'] += runtime
+            stats['runtime_max'] = max(stats['runtime_max'], runtime)
+            if wait is not None:
+                stats['wait_total'] += wait
+                stats['wait_max'] = max(stats['wait_max'], wait)
+
+    def snapshot(self):
+        with self.lock:
+            return {key: dict(value) for key, value in self.stats.items()}
+
+
+metrics = TaskMetrics()
+_started = {}
+_origins = {}
+
+
+@before_task_publish.connect
+def stamp_sent_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault(SENT_AT_HEADER, time.time())
+
+
+@task_prerun.connect
+def start_timer(task_id=None, task=None, **kwargs):
+    sent_at = getattr(task.request, SENT_AT_HEADER, None)
+    if sent_at is None:
+        sent_at = (task.request.headers or {}).get(SENT_AT_HEADER)
+    wait = max(0.0, time.time() - float(sent_at)) if sent_at else None
+    _started[task_id] = (time.perf_counter(), wait)
+
+
+@task_prerun.connect
+def mark_query_origin(task_id=None, task=None, **kwargs):
+    # Consultas lentas da tarefa são atribuídas a ela (core/slowqueries.py)
+    _origins[task_id] = slowqueries.set_origin(f"task {task.name}")
+
+
+@task_postrun.connect
+def clear_query_origin(task_id=None, **kwargs):
+    token = _origins.pop(task_id, None)
+    if token is not None:
+        try:
+            slowqueries.reset_origin(token)
+        except ValueError:  # Outro contexto (ex.: pool de threads): a variável morre com ele
+            pass
+
+
+@task_postrun.connect
+def stop_timer(task_id=None, task=None, state=None, **kwargs):
+    started = _started.pop(task_id, None)
+    if started is None:
+        return
+    start, wait = started
+    runtime = time.perf_counter() - start
+    queue = (task.request.delivery_info or {}).get('routing_key') or 'eager'
+    metrics.record(task.name, queue, runtime, wait, failed=state == 'FAILURE')
+    logger.info(
+        "task=%s queue=%s state=%s wait_ms=%s runtime_ms=%.1f",
+        task.name, queue, state, f"{wait * 1000:.1f}" if wait is not None else '-', runtime * 1000,
+    )
@@ -0,0 +1,322 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+# Orçamento de cold start de um worker gunicorn e de um worker Celery em
+# módulos carregados: determinístico, ao contrário do tempo de relógio
+# (instável em máquinas de CI carregadas). Folga de ~15% sobre o atual.
+WEB_MODULE_BUDGET = 1000
+CELERY_MODULE_BUDGET = 1250
+
+WEB_PROBE = """
+import json, sys
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps({"modules": sorted(sys.modules)}))
+"""
+
+CELERY_PROBE = """
+import json, sys
+from celery.app.utils import find_app
+app = find_app("core")
+app.loader.import_default_modules()
+print(json.dumps({"modules": sorted(sys.modules), "tasks": sorted(app.tasks)}))
+"""
+
+# Um módulo de tarefas importado sozinho (como no enqueue do web) deve ligar
+# as tarefas ao app do projeto, não ao app padrão do Celery
+TASKS_PROBE = """
+import importlib, json, sys
+import django
+django.setup()
+module = importlib.import_module(sys.argv[1])
+celery = sys.modules.get("core.celery")
+print(json.dumps({name: celery is not None and getattr(module, name).app is celery.app for name in module.__all__}))
+"""
+
+# Backends opcionais: só carregados quando configurados e usados
+OPTIONAL_BACKENDS = ('elasticsearch', 'django_elasticsearch_dsl')
+
+
+def run_probe(code, *args):
+    """Executa `code` num interpretador novo (cold start) com o settings atual"""
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'core.settings')}
+    output = subprocess.run(
+        [sys.executable, '-c', code, *args],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+class ImportTimeTests(SimpleTestCase):
+    def test_web_worker_cold_start(self):
+        result = run_probe(WEB_PROBE)
+        modules = set(result['modules'])
+        self.assertLess(len(modules), WEB_MODULE_BUDGET)
+        # Tarefas são enfileiradas com import tardio: nem Celery nem kombu no web
+        for module in ('celery', 'kombu', 'exams.tasks', 'users.tasks', *OPTIONAL_BACKENDS):
+            self.assertNotIn(module, modules)
+
+    def test_celery_worker_cold_start(self):
+        result = run_probe(CELERY_PROBE)
+        self.assertIn('exams.tasks.update_ranking', result['tasks'])
+        self.assertIn('users.tasks.provision_users_job', result['tasks'])
+        modules = set(result['modules'])
+        self.assertLess(len(modules), CELERY_MODULE_BUDGET)
+        for module in OPTIONAL_BACKENDS:
+            self.assertNotIn(module, modules)
+
+    def test_task_modules_bind_the_project_app(self):
+        import importlib.util
+        from django.apps import apps
+        # core/__init__.py não carrega o Celery: cada tasks.py importa core.celery
+        modules = [f'{config.name}.tasks' for config in apps.get_app_configs()
+                   if config.path.startswith(str(settings.BASE_DIR))
+                   and importlib.util.find_spec(f'{config.name}.tasks')]
+        self.assertIn('users.tasks', modules)
+        for module in modules:
+            with self.subTest(module=module):
+                bound = run_probe(TASKS_PROBE, module)
+                self.assertTrue(bound)
+                self.assertEqual([name for name, ok in bound.items() if not ok], [])
+
+
+class SingleAPITests(SimpleTestCase):
+    def test_routes_are_not_double_prefixed(self):
+        self.assertEqual(reverse('api:login'), '/api/auth/login')
+        self.assertEqual(reverse('api:list_exams'), '/api/exams')
+        self.assertEqual(reverse('api:list_active_exams'), '/api/exams/active')
+
+
+class CeleryTopologyTests(SimpleTestCase):
+    def setUp(self):
+        from core.celery import app
+        self.app = app
+
+    def test_tasks_are_routed_to_their_queues(self):
+        router = self.app.amqp.router
+        self.assertEqual(router.route({}, 'exams.tasks.grade_answers')['queue'].name, 'grading')
+        self.assertEqual(router.route({}, 'exams.tasks.update_ranking')['queue'].name, 'batch')
+        self.assertEqual(router.route({}, 'exams.tasks.ensure_answer_partitions')['queue'].name, 'maintenance')
+
+    def test_unread_results_are_not_stored(self):
+        from exams import tasks
+        self.assertTrue(tasks.grade_answers.ignore_result)
+        self.assertTrue(tasks.update_ranking.ignore_result)
+        self.assertTrue(tasks.update_ranking.acks_late)
+        self.assertFalse(tasks.grade_answers.acks_late)
+
+    def test_worker_records_queue_wait_and_runtime(self):
+        import time
+        from celery import Celery
+        from celery.contrib.testing.worker import start_worker
+        from core.telemetry import metrics
+
+        # App isolado com broker em memória: o app do projeto já tem o produtor
+        # apontado para o Redis e não é reconfigurado depois do primeiro uso.
+        # Os sinais de telemetria são globais e valem para qualquer app.
+        app = Celery('telemetry-test', set_as_current=False)
+        app.conf.update(broker_url='memory://', result_backend='cache+memory://',
+                        task_default_queue='maintenance')
+
+        @app.task(name='telemetry.add')
+        def add(x, y):
+            return x + y
+
+        metrics.reset()
+        with start_worker(app, pool='solo', perform_ping_check=False, shutdown_timeout=10,
+                          queues=['maintenance']):
+            self.assertEqual(add.delay(2, 3).get(timeout=10), 5)
+            deadline = time.monotonic() + 5
+            while ('telemetry.add', 'maintenance') not in metrics.snapshot() and time.monotonic() < deadline:
+                time.sleep(0.05)
+
+        stats = metrics.snapshot()[('telemetry.add', 'maintenance')]
+        self.assertEqual(stats['count'], 1)
+        self.assertGreaterEqual(stats['wait_max'], 0)
+        self.assertGreater(stats['runtime_total'], 0)
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.calls = 0
+
+    def _route(self, ttl=60):
+        from django.http import HttpResponse
+        from .response_cache import cached_route
+
+        @cached_route(ttl=ttl, tags=lambda request, exam_id, **kwargs: [f'exam:{exam_id}'])
+        def route(request, exam_id):
+            self.calls += 1
+            return HttpResponse(f'{{"exam": {exam_id}, "call": {self.calls}}}', content_type='application/json')
+        return route
+
+    def _request(self, query='', role='PARTICIPANT'):
+        from types import SimpleNamespace
+        from django.test import RequestFactory
+        request = RequestFactory().get(f'/api/exams/1{query}')
+        request.auth = SimpleNamespace(role=role)
+        return request
+
+    def test_hit_varies_on_query_and_role(self):
+        route = self._route()
+        self.assertEqual(route(self._request(), exam_id=1)['X-Cache'], 'MISS')
+        self.assertEqual(route(self._request(), exam_id=1)['X-Cache'], 'HIT')
+        route(self._request('?fields=id'), exam_id=1)
+        route(self._request(role='ADMIN'), exam_id=1)
+        self.assertEqual(self.calls, 3)
+
+    def test_purging_a_tag_invalidates(self):
+        from .response_cache import purge
+        route = self._route()
+        route(self._request(), exam_id=1)
+        purge('exam:2')
+        self.assertEqual(route(self._request(), exam_id=1)['X-Cache'], 'HIT')
+        purge('exam:1')
+        self.assertEqual(route(self._request(), exam_id=1)['X-Cache'], 'MISS')
+        self.assertEqual(self.calls, 2)
+
+    def test_expired_entry_is_served_stale_while_another_worker_recomputes(self):
+        import time
+        from unittest.mock import patch
+        from django.core.cache import cache
+        route = self._route(ttl=1)
+        first = route(self._request(), exam_id=1)
+        with patch('core.response_cache.time.time', return_value=time.time() + 5):
+            # Lock com outro processo
+            with patch.object(cache, 'add', return_value=False):
+                stale = route(self._request(), exam_id=1)
+            self.assertEqual(stale['X-Cache'], 'STALE')
+            self.assertEqual(stale.content, first.content)
+            self.assertEqual(self.calls, 1)
+            # Quem obtém o lock recalcula
+            self.assertEqual(route(self._request(), exam_id=1)['X-Cache'], 'MISS')
+        self.assertEqual(self.calls, 2)
+
+    def test_miss_waits_for_the_recompute_in_progress(self):
+        from unittest.mock import patch
+        from django.core.cache import cache
+        from django.test import override_settings
+        route = self._route()
+        with override_settings(RESPONSE_CACHE={**settings.RESPONSE_CACHE, 'LOCK_WAIT': 0.1}), \
+                patch.object(cache, 'add', return_value=False):
+            response = route(self._request(), exam_id=1)
+        # Ninguém terminou o recálculo no prazo: calcula sem esperar mais
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.calls, 1)
+
+
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from users.models import User
+        from users.tokens import issue_tokens
+        cache.clear()
+        self.admin = User.objects.create_user(username='profiler_admin', password='x', role='ADMIN')
+        self.participant = User.objects.create_user(username='profiler_user', password='x', role='PARTICIPANT')
+        self.admin_auth = f"Bearer {issue_tokens(self.admin.id)['token']}"
+        self.participant_auth = f"Bearer {issue_tokens(self.participant.id)['token']}"
+
+    def test_admin_header_profiles_sql_and_cache(self):
+        response = self.client.get('/api/exams', HTTP_AUTHORIZATION=self.admin_auth, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+        detail = self.client.get(f'/api/diagnostics/profiles/{profile_id}', HTTP_AUTHORIZATION=self.admin_auth)
+        profile = detail.json()
+        self.assertEqual(profile['summary']['path'], '/api/exams')
+        self.assertGreater(profile['sql']['count'], 0)
+        self.assertTrue(all('ms' in q for q in profile['sql']['statements']))
+        # Valores dos parâmetros não saem do processo
+        self.assertTrue(all('params' not in q and 'params_digest' in q for q in profile['sql']['statements']))
+        # Cache de respostas: lookup da entrada, versões das tags e lock
+        self.assertIn('get', [call['method'] for call in profile['cache']['calls']])
+        self.assertTrue(profile['functions'])
+
+        listing = self.client.get('/api/diagnostics/profiles', HTTP_AUTHORIZATION=self.admin_auth).json()
+        self.assertEqual([p['id'] for p in listing], [profile_id])
+
+    def test_duplicate_queries_are_flagged(self):
+        from .profiling import summarize_queries
+        from .profiling import redact_params
+        queries = [{'sql': 'SELECT %s', **redact_params((1,)), 'ms': 1.0}] * 2 + \
+            [{'sql': 'SELECT %s', **redact_params((2,)), 'ms': 1.0}]
+        summary = summarize_queries(queries, top=1)
+        self.assertEqual(summary['duplicates'][0]['count'], 2)
+        self.assertEqual(summary['similar'][0]['count'], 3)
+
+    def test_header_is_ignored_for_non_admins(self):
+        response = self.client.get('/api/auth/users', HTTP_AUTHORIZATION=self.participant_auth, HTTP_X_PROFILE='1')
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        response = self.client.get('/api/diagnostics/profiles', HTTP_AUTHORIZATION=self.participant_auth)
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(PROFILING={**settings.PROFILING, 'SAMPLE_RATE': 1.0})
+    def test_sampled_requests_are_stored(self):
+        from django.core.cache import caches
+        response = self.client.get('/api/exams')
+        self.assertTrue(response.has_header('X-Profile-Id'))
+        self.assertNotIn('get', caches['default'].__dict__)  # Coletor do cache removido
+
+
+class SlowQueryLogTests(TestCase):
+    def setUp(self):
+        import logging
+        import tempfile
+        from django.core.cache import cache
+        from . import slowqueries
+        cache.clear()  # Respostas e principais em cache não consultariam o banco
+        self.slowqueries = slowqueries
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.log_dir.name, 'slow.log')
+        override = override_settings(SLOW_QUERIES={
+            **settings.SLOW_QUERIES, 'THRESHOLD_MS': 0, 'EXPLAIN_SAMPLE_RATE': 1.0,
+            'BACKEND': 'local', 'LOG_FILE': self.log_file,
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(self.log_dir.cleanup)
+        slowqueries.local_buffer.clear()
+        slowqueries._file_logger = None
+        file_logger = logging.getLogger('slow_queries.file')
+        self.addCleanup(lambda: [file_logger.removeHandler(h) or h.close() for h in list(file_logger.handlers)])
+        self.addCleanup(setattr, slowqueries, '_file_logger', None)
+
+    def test_query_is_recorded_with_call_site_and_plan(self):
+        from users.models import User
+        list(User.objects.filter(username='ninguem'))
+        self.slowqueries.wait_for_explains(timeout=10)
+
+        entry = next(e for e in self.slowqueries.entries() if e['call_site'] and 'core/tests.py' in e['call_site'])
+        self.assertIn('"username"', entry['sql'])
+        self.assertEqual(entry['param_count'], 1)
+        self.assertTrue(entry['plan'])  # O EXPLAIN recebeu os valores
+        with open(self.log_file) as f:
+            logged = f.read()
+        self.assertIn(entry['params_digest'], logged)
+        self.assertNotIn('ninguem', logged)
+
+    def test_admin_endpoint_lists_offenders_by_route(self):
+        from users.models import User
+        from users.tokens import issue_tokens
+        admin = User.objects.create_user(username='slow_admin', password='x', role='ADMIN')
+        auth = f"Bearer {issue_tokens(admin.id)['token']}"
+        self.client.get('/api/exams', HTTP_AUTHORIZATION=auth)
+        self.slowqueries.wait_for_explains(timeout=10)
+
+        response = self.client.get('/api/diagnostics/slow-queries?order=count', HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, 200)
+        offenders = response.json()
+        self.assertTrue(offenders)
+        self.assertEqual(offenders, sorted(offenders, key=lambda o: o['count'], reverse=True))
+        self.assertTrue(any('GET /api/exams' in origin for o in offenders for origin in o['origins']))
@@ -0,0 +1,186 @@
+# throttling.py
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import redis
+from django.conf import settings
+from django.http import JsonResponse
+from ninja.throttling import BaseThrottle
+
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+# Token bucket atômico: recarrega pela idade do balde e consome 1 ficha
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+
+def parse_rate(rate):
+    """'20/m' -> (20, 60)"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+class LocalBuckets:
+    """Token buckets em memória, usados quando o Redis não está disponível"""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        now = time.monotonic()
+        with self.lock:
+            tokens, ts = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * rate)
+            if tokens >= 1:
+                allowed, wait = True, 0.0
+                tokens -= 1
+            else:
+                allowed, wait = False, (1 - tokens) / rate
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return allowed, wait
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+local_buckets = LocalBuckets()
+_redis_down_until = 0.0
+_script = None
+
+
+def take_token(key, capacity, rate):
+    """
+    Consome uma ficha do balde `key`. Retorna (permitido, espera em segundos).
+    Usa o Redis (script Lua atômico) e recorre aos baldes locais se ele
+    estiver fora, sem tentar reconectar a cada requisição.
+    """
+    global _redis_down_until, _script
+
+    if settings.RATE_LIMIT_BACKEND == 'redis' and time.monotonic() >= _redis_down_until:
+        try:
+            if _script is None:
+                _script = get_redis().register_script(TOKEN_BUCKET_LUA)
+            allowed, wait = _script(keys=[key], args=[capacity, rate])
+            return bool(allowed), float(wait)
+        except redis.RedisError as e:
+            logger.warning(f"Rate limit sem Redis, usando baldes locais: {e}")
+            _redis_down_until = time.monotonic() + 5
+    return local_buckets.take(key, capacity, rate)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle do Ninja com token bucket. O limite vem de
+    settings.RATE_LIMITS[scope] = {'rate': '20/m', 'burst': 10}.
+    Subclasses definem a identidade do balde em `get_bucket_ident`.
+    """
+
+    scope = None
+
+    def __init__(self, scope=None):
+        if scope:
+            self.scope = scope
+        self._state = threading.local()
+
+    def get_bucket_ident(self, request):
+        raise NotImplementedError(".get_bucket_ident() must be overridden")
+
+    def allow_request(self, request):
+        self._state.wait = None
+        ident = self.get_bucket_ident(request)
+        if ident is None:
+            return True
+
+        config = settings.RATE_LIMITS[self.scope]
+        count, period = parse_rate(config['rate'])
+        capacity = config.get('burst', count)
+        allowed, wait = take_token(f"ratelimit:{self.scope}:{ident}", capacity, count / period)
+        if not allowed:
+            self._state.wait = wait
+        return allowed
+
+    def wait(self):
+        return getattr(self._state, 'wait', None)
+
+
+class IPTokenBucket(TokenBucketThrottle):
+    """Balde por IP do cliente"""
+
+    def get_bucket_ident(self, request):
+        return self.get_ident(request)
+
+
+class UserTokenBucket(TokenBucketThrottle):
+    """Balde por usuário autenticado (por IP nas requisições anônimas)"""
+
+    def get_bucket_ident(self, request):
+        user = getattr(request, 'auth', None)
+        if user is not None and getattr(user, 'id', None):
+            return f"user:{user.id}"
+        return f"ip:{self.get_ident(request)}"
+
+
+class UsernameTokenBucket(TokenBucketThrottle):
+    """Balde pelo `username` enviado no corpo (ex.: login)"""
+
+    def get_bucket_ident(self, request):
+        try:
+            username = json.loads(request.body or b'{}').get('username')
+        except (ValueError, AttributeError):
+            return None
+        return f"username:{str(username).lower()}" if username else None
+
+
+def shed_when_busy(max_concurrent, retry_after=1):
+    """
+    Limita as execuções simultâneas da view neste processo. Acima do limite
+    responde 503 com Retry-After em vez de enfileirar, para que rotas caras
+    (ex.: hash de senha no login) não ocupem todos os workers.
+    """
+    def decorator(func):
+        slots = threading.BoundedSemaphore(max_concurrent)
+
+        @wraps(func)
+        def wrapper(request, *args, **kwargs):
+            if not slots.acquire(blocking=False):
+                response = JsonResponse({"detail": "Servidor ocupado, tente novamente"}, status=503)
+                response['Retry-After'] = str(retry_after)
+                return response
+            try:
+                return func(request, *args, **kwargs)
+            finally:
+                slots.release()
+        return wrapper
+    return decorator
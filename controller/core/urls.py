@@ -1,8 +1,9 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path
+
+from .api import api
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/auth/', include('users.urls')),  # Rotas do app users
-    path('api/exams/', include('exams.urls')),  # Rotas do app exams
-]
\ No newline at end of file
+    path('api/', api.urls),  # /api/auth/... (users) e /api/exams, /api/questions... (exams)
+]
@@ -0,0 +1,224 @@
+# activation.py
+"""
+Ativação das provas pela janela `start_time`/`end_time`.
+
+Os limites futuros de cada prova ficam num índice ordenado por horário
+(ZSET no Redis; membros "<exam_id>:start" e "<exam_id>:end"). A tarefa
+`activate_exams` aplica os limites vencidos, liga/desliga `is_active` e
+invalida o conjunto de provas ativas. Fora das transições a listagem
+pública é só uma leitura de cache.
+
+Dentro da janela o admin continua podendo desativar a prova manualmente;
+o próximo limite volta a valer o horário.
+"""
+import logging
+import threading
+import time
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.compression import precompressed_response
+from core.redis_client import get_redis
+from core.renderers import dumps
+from core.fieldsets import rows
+from core.response_cache import purge
+from .caching import exam_tag
+from .models import Exam
+from .schemas import ExamOut
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_VERSION_KEY = "exams:active:version"
+ACTIVE_PAGE_KEY = "exams:active:{version}:{fields}:{limit}:{offset}"
+
+
+def schedule_settings():
+    return settings.EXAM_SCHEDULE
+
+
+def in_window(now):
+    return (
+        (Q(start_time__isnull=True) | Q(start_time__lte=now))
+        & (Q(end_time__isnull=True) | Q(end_time__gt=now))
+    )
+
+
+def boundaries(exam, now):
+    """Limites ainda não alcançados da prova: {membro: timestamp}"""
+    entries = {}
+    for name in ('start', 'end'):
+        moment = getattr(exam, f'{name}_time')
+        if moment is not None and moment > now:
+            entries[f'{exam.id}:{name}'] = moment.timestamp()
+    return entries
+
+
+class RedisScheduleIndex:
+    """Índice de limites num ZSET do Redis, compartilhado entre processos"""
+
+    def __init__(self, client, key):
+        self.client = client
+        self.key = key
+
+    def add(self, entries):
+        if entries:
+            self.client.zadd(self.key, entries)
+
+    def remove(self, exam_id):
+        self.client.zrem(self.key, f'{exam_id}:start', f'{exam_id}:end')
+
+    def due(self, until):
+        members = self.client.zrangebyscore(self.key, '-inf', until)
+        return {int(member.split(b':')[0]) for member in members}
+
+    def ack(self, until):
+        self.client.zremrangebyscore(self.key, '-inf', until)
+
+    def next_at(self):
+        first = self.client.zrange(self.key, 0, 0, withscores=True)
+        return first[0][1] if first else None
+
+
+class LocalScheduleIndex:
+    """Índice em memória: desenvolvimento e fallback quando o Redis está fora"""
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def add(self, entries):
+        with self.lock:
+            self.entries.update(entries)
+
+    def remove(self, exam_id):
+        with self.lock:
+            self.entries.pop(f'{exam_id}:start', None)
+            self.entries.pop(f'{exam_id}:end', None)
+
+    def due(self, until):
+        with self.lock:
+            return {int(member.split(':')[0]) for member, at in self.entries.items() if at <= until}
+
+    def ack(self, until):
+        with self.lock:
+            self.entries = {member: at for member, at in self.entries.items() if at > until}
+
+    def next_at(self):
+        with self.lock:
+            return min(self.entries.values(), default=None)
+
+
+local_index = LocalScheduleIndex()
+_redis_down_until = 0.0
+
+
+def _index_call(method, *args):
+    """Executa no índice do Redis e recorre ao local se ele estiver fora"""
+    global _redis_down_until
+
+    config = schedule_settings()
+    if config['BACKEND'] == 'redis' and time.monotonic() >= _redis_down_until:
+        try:
+            return getattr(RedisScheduleIndex(get_redis(), config['KEY']), method)(*args)
+        except redis.RedisError as e:
+            logger.warning(f"Agenda de provas sem Redis, usando índice local: {e}")
+            _redis_down_until = time.monotonic() + 5
+    return getattr(local_index, method)(*args)
+
+
+def schedule(exam, now=None):
+    """(Re)agenda os limites futuros da prova"""
+    _index_call('remove', exam.id)
+    _index_call('add', boundaries(exam, now or timezone.now()))
+
+
+def rebuild(now=None):
+    """Reinsere os limites futuros de todas as provas (ex.: Redis reiniciado). Retorna quantos"""
+    now = now or timezone.now()
+    entries = {}
+    for exam in Exam.objects.filter(Q(start_time__gt=now) | Q(end_time__gt=now)).only('id', 'start_time', 'end_time'):
+        entries.update(boundaries(exam, now))
+    _index_call('add', entries)
+    return len(entries)
+
+
+def apply_transitions(now=None):
+    """
+    Aplica os limites vencidos. Retorna (provas alteradas, próximo limite
+    como timestamp ou None).
+    """
+    now = now or timezone.now()
+    until = now.timestamp()
+    exam_ids = _index_call('due', until)
+    changed = 0
+    if exam_ids:
+        exams = Exam.objects.filter(id__in=exam_ids)
+        # updated_at explícito: o update() não passa pelo auto_now
+        changed += exams.filter(in_window(now), is_active=False).update(is_active=True, updated_at=now)
+        changed += exams.exclude(in_window(now)).filter(is_active=True).update(is_active=False, updated_at=now)
+        # A janela mudou mesmo sem alterar a flag: o conjunto ativo é outro
+        invalidate_active()
+        purge('exams', *(exam_tag(exam_id) for exam_id in exam_ids))
+    _index_call('ack', until)
+    return changed, _index_call('next_at')
+
+
+def active_version():
+    return cache.get(ACTIVE_VERSION_KEY, 0)
+
+
+def _bump_active_version():
+    try:
+        cache.incr(ACTIVE_VERSION_KEY)
+    except ValueError:
+        cache.set(ACTIVE_VERSION_KEY, 1, None)
+
+
+def invalidate_active():
+    _bump_active_version()
+    # De novo no commit: um leitor entre os dois não deixa o conjunto antigo na versão nova
+    transaction.on_commit(_bump_active_version)
+
+
+def active_exams(now=None):
+    return Exam.objects.filter(in_window(now or timezone.now()), is_active=True)
+
+
+def active_page(fields, limit, offset):
+    """Página do conjunto de provas ativas, pré-serializada e compactada em cache"""
+    config = schedule_settings()
+    limit = max(1, min(limit, config['MAX_LIMIT']))
+    offset = max(0, offset)
+    key = ACTIVE_PAGE_KEY.format(version=active_version(), fields=','.join(fields or []),
+                                 limit=limit, offset=offset)
+
+    def build():
+        exams = active_exams()
+        return dumps({
+            'items': list(rows(exams.order_by('-created_at'), ExamOut, fields)[offset:offset + limit]),
+            'count': exams.count(),
+        })
+
+    return precompressed_response(key, build, timeout=config['ACTIVE_CACHE_TTL'])
+
+
+@receiver(post_save, sender=Exam)
+def reschedule_exam(sender, instance, **kwargs):
+    if instance.deleted_at:
+        _index_call('remove', instance.id)
+    else:
+        schedule(instance)
+    invalidate_active()
+
+
+@receiver(post_delete, sender=Exam)
+def unschedule_exam(sender, instance, **kwargs):
+    _index_call('remove', instance.id)
+    invalidate_active()
@@ -2,33 +2,50 @@
 from ninja import Router, Query
 from ninja.pagination import paginate
 from typing import List, Optional
+from django.conf import settings
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from django.db import transaction
+from django.db import IntegrityError, connection, transaction
 from datetime import datetime
-from django.db.models import Q
+from django.utils import timezone
+from django.db.models import F, Q
 import logging
-from .documents import ExamDocument
 
 logger = logging.getLogger(__name__)
 
-from celery import shared_task                              
-
-from .models import Exam, Question, Choice, Participant, Answer
+from .models import Exam, Question, Choice, Participant, Answer, AnswerArchive
+from .archive import read_archived_answers
+from . import (activation, caching, grading, ingestion, partitions, purge, ranking, regrade, registration, roster,
+               search, snapshots, summary)
 from .schemas import (
     ExamIn,
     ExamOut,
     QuestionIn,
     QuestionOut,
+    RegradeOut,
     ChoiceIn,
     ChoiceOut,
     ParticipantIn,
     ParticipantOut,
+    ParticipantSummaryOut,
+    DeletionProgressOut,
+    RankedParticipantOut,
+    RankingAroundOut,
     AnswerIn,
     AnswerOut,
+    AnswerQueuedOut,
+    ActiveExamsOut,
+    ExamContentOut,
+    ExamSnapshotOut,
     ExamUpdate,
     ErrorResponse
 )
 from users.api import AuthBearer
+from users.pagination import EstimatedCountPagination
+from core.throttling import UserTokenBucket
+from core.fieldsets import parse_fields, pick, rows, sparse_schema
+from core.renderers import fast_response
+from core.response_cache import cached_route
 
 router = Router(tags=["Exams"])
 
@@ -45,13 +62,16 @@ def create_exam(request, payload: ExamIn):
     
     exam = Exam.objects.create(
         **payload.dict(),
-        created_by=request.auth
+        created_by_id=request.auth.id
     )
     return 201, exam
 
-@router.get('/exams', response=List[ExamOut])
+@router.get('/exams', response=List[sparse_schema(ExamOut)], exclude_unset=True)
+@cached_route(ttl=60, tags=caching.exam_tags)
+@fast_response
 @paginate
-def list_exams(request, search: Optional[str] = None, is_active: Optional[bool] = None):
+def list_exams(request, search: Optional[str] = None, is_active: Optional[bool] = None,
+               fields: Optional[str] = None):
     """Lista todas as provas com filtros"""
     queryset = Exam.objects.all()
     
@@ -63,11 +83,14 @@ def list_exams(request, search: Optional[str] = None, is_active: Optional[bool]
     if is_active is not None:
         queryset = queryset.filter(is_active=is_active)
     
-    return queryset.order_by('-created_at')
+    return rows(queryset.order_by('-created_at'), ExamOut, parse_fields(fields, ExamOut))
 
-@router.get('/exams', response=List[ExamOut])
+@router.get('/exams', response=List[sparse_schema(ExamOut)], exclude_unset=True)
+@cached_route(ttl=60, tags=caching.exam_tags)
+@fast_response
 @paginate
-def list_exams(request, search: Optional[str] = None, is_active: Optional[bool] = None, order_by: Optional[str] = '-created_at'):
+def list_exams(request, search: Optional[str] = None, is_active: Optional[bool] = None, order_by: Optional[str] = '-created_at',
+               fields: Optional[str] = None):
     """Lista todas as provas com filtros e ordenação"""
     queryset = Exam.objects.all()
     
@@ -79,36 +102,65 @@ def list_exams(request, search: Optional[str] = None, is_active: Optional[bool]
     if is_active is not None:
         queryset = queryset.filter(is_active=is_active)
     
-    return queryset.order_by(order_by)
+    return rows(queryset.order_by(order_by), ExamOut, parse_fields(fields, ExamOut))
 
-@router.get('/exams/{exam_id}', response=ExamOut, auth=AuthBearer())
-def get_exam(request, exam_id: int):
+@router.get('/exams/{int:exam_id}', response=sparse_schema(ExamOut), exclude_unset=True, auth=AuthBearer())
+@cached_route(ttl=300, tags=caching.exam_tags)
+@fast_response
+def get_exam(request, exam_id: int, fields: Optional[str] = None):
     """Detalhes de uma prova específica"""
-    return get_object_or_404(Exam, id=exam_id)
+    queryset = Exam.objects.filter(id=exam_id)
+    return get_object_or_404(rows(queryset, ExamOut, parse_fields(fields, ExamOut)))
 
-@router.put('/exams/{exam_id}', response=ExamOut, auth=AuthBearer())
+@router.put('/exams/{int:exam_id}', response=ExamOut, auth=AuthBearer())
 def update_exam(request, exam_id: int, payload: ExamUpdate):
     """Atualiza uma prova (Admin only)"""
     if request.auth.role != 'ADMIN':
         return 403, {"detail": "Permissão negada"}
     
     exam = get_object_or_404(Exam, id=exam_id)
-    for attr, value in payload.dict().items():
+    # Só os campos enviados: os demais do ExamUpdate são opcionais
+    for attr, value in payload.dict(exclude_unset=True).items():
         setattr(exam, attr, value)
     exam.save()
     return exam
 
-@router.delete('/exams/{exam_id}', auth=AuthBearer())
+@router.post('/exams/{int:exam_id}/publish', response={201: ExamSnapshotOut, 403: ErrorResponse}, auth=AuthBearer())
+def publish_exam(request, exam_id: int):
+    """Congela o conteúdo atual da prova numa nova versão publicada (Admin only)"""
+    if request.auth.role != 'ADMIN':
+        return 403, {"detail": "Permissão negada"}
+
+    exam = get_object_or_404(Exam, id=exam_id)
+    snapshot = snapshots.publish(exam, user=request.auth)
+    return 201, {
+        "exam_id": exam.id,
+        "version": snapshot.version,
+        "published_at": snapshot.published_at,
+        "question_count": len(snapshot.answer_key),
+    }
+
+@router.get('/exams/{int:exam_id}/content', response={200: ExamContentOut, 404: ErrorResponse}, auth=AuthBearer())
+def get_exam_content(request, exam_id: int, version: Optional[int] = None):
+    """Conteúdo publicado da prova (sem gabarito), servido do cache"""
+    try:
+        version = version or snapshots.current_version(exam_id)
+        return snapshots.content_response(exam_id, version)
+    except snapshots.SnapshotNotFound:
+        return 404, {"detail": "Prova não publicada"}
+
+@router.delete('/exams/{int:exam_id}', auth=AuthBearer())
 def delete_exam(request, exam_id: int):
     """Exclui uma prova (Admin only)"""
     if request.auth.role != 'ADMIN':
         return 403, {"detail": "Permissão negada"}
     
     exam = get_object_or_404(Exam, id=exam_id)
-    exam.delete()
+    # Some na hora; questões, inscrições e respostas saem em lotes, em segundo plano
+    purge.soft_delete(exam)
     return 200, {"detail": "Prova excluída com sucesso"}
 
-@router.get("/exams/{exam_id}")
+@router.get("/exams/{int:exam_id}")
 def get_exam_by_id(exam_id: int):
     exam = db.get_exam_by_id(exam_id)
     if not exam:
@@ -118,11 +170,11 @@ def get_exam_by_id(exam_id: int):
 
 
 @router.get('/exams/search', response=List[ExamOut], auth=None)
-def search_exams(request, query: str):
-    """Busca provas no Elasticsearch"""
-    search = ExamDocument.search().query("multi_match", query=query, fields=["title", "description"])
-    results = search.execute()
-    return [hit.to_dict() for hit in results]
+def search_exams(request, query: str, limit: Optional[int] = None):
+    """Busca provas por título e descrição, em ordem de relevância"""
+    ids = search.search(query, limit)
+    exams = Exam.objects.in_bulk(ids)
+    return [exams[exam_id] for exam_id in ids if exam_id in exams]
 
 
 # ---------------------------- Questions Endpoints ----------------------------
@@ -136,20 +188,25 @@ def create_question(request, payload: QuestionIn):
     question = Question.objects.create(
         exam=exam,
         text=payload.text,
-        points=payload.points
+        points=payload.points,
+        question_type=payload.question_type,
+        numeric_tolerance=payload.numeric_tolerance,
+        max_edit_distance=payload.max_edit_distance,
     )
     return question
 
-@router.get('/questions', response=List[QuestionOut], auth=AuthBearer())
+@router.get('/questions', response=List[sparse_schema(QuestionOut)], exclude_unset=True, auth=AuthBearer())
+@cached_route(ttl=300, tags=caching.question_tags)
+@fast_response
 @paginate
-def list_questions(request, exam_id: Optional[int] = None):
+def list_questions(request, exam_id: Optional[int] = None, fields: Optional[str] = None):
     """Lista questões com filtro por prova"""
     queryset = Question.objects.all()
     
     if exam_id:
         queryset = queryset.filter(exam_id=exam_id)
     
-    return queryset.order_by('id')
+    return rows(queryset.order_by('id'), QuestionOut, parse_fields(fields, QuestionOut))
 
 @router.put('/questions/{question_id}', response={200: QuestionOut, 403: ErrorResponse}, auth=AuthBearer())
 def update_question(request, question_id: int, payload: QuestionIn):
@@ -158,11 +215,30 @@ def update_question(request, question_id: int, payload: QuestionIn):
         return 403, {"detail": "Permissão negada"}
     
     question = get_object_or_404(Question, id=question_id)
+    # Gabarito: só os campos enviados (omitir não volta ao padrão do QuestionIn nem recorrige)
+    key_fields = payload.dict(include={'points', 'numeric_tolerance', 'max_edit_distance'}, exclude_unset=True)
+    key_changed = any(getattr(question, attr) != value for attr, value in key_fields.items())
     question.text = payload.text
-    question.points = payload.points
+    for attr, value in key_fields.items():
+        setattr(question, attr, value)
     question.save()
+    if key_changed:
+        # Notas já dadas mudam junto com o gabarito
+        transaction.on_commit(lambda: regrade.schedule(question.id))
     return question
 
+@router.post('/questions/{question_id}/regrade', response={200: RegradeOut, 403: ErrorResponse, 404: ErrorResponse},
+             auth=AuthBearer())
+def regrade_question(request, question_id: int):
+    """Recorrige as respostas da questão pelo gabarito atual (Admin only)"""
+    if request.auth.role != 'ADMIN':
+        return 403, {"detail": "Permissão negada"}
+
+    report = regrade.regrade_question(question_id)
+    if report is None:
+        return 404, {"detail": "Questão não encontrada"}
+    return report
+
 @router.delete('/questions/{question_id}', auth=AuthBearer())
 def delete_question(request, question_id: int):
     """Exclui uma questão (Admin only)"""
@@ -186,16 +262,18 @@ def create_choice(request, payload: ChoiceIn):
     )
     return 201, choice
 
-@router.get('/choices', response=List[ChoiceOut], auth=AuthBearer())
+@router.get('/choices', response=List[sparse_schema(ChoiceOut)], exclude_unset=True, auth=AuthBearer())
+@cached_route(ttl=300, tags=caching.choice_tags)
+@fast_response
 @paginate
-def list_choices(request, question_id: Optional[int] = None):
+def list_choices(request, question_id: Optional[int] = None, fields: Optional[str] = None):
     """Lista alternativas com filtro por questão"""
     queryset = Choice.objects.all()
     
     if question_id:
         queryset = queryset.filter(question_id=question_id)
     
-    return queryset.order_by('id')
+    return rows(queryset.order_by('id'), ChoiceOut, parse_fields(fields, ChoiceOut))
 
 @router.put('/choices/{choice_id}', response={200: ChoiceOut, 403: ErrorResponse}, auth=AuthBearer())
 def update_choice(request, choice_id: int, payload: ChoiceIn):
@@ -203,10 +281,15 @@ def update_choice(request, choice_id: int, payload: ChoiceIn):
     if request.auth.role != 'ADMIN':
         return 403, {"detail": "Permissão negada"}
     
-    choice = get_object_or_404(Choice, id=choice_id)
+    choice = get_object_or_404(Choice.objects.select_related('question'), id=choice_id)
+    # Em SA o texto das alternativas corretas também é gabarito
+    key_changed = choice.is_correct != payload.is_correct or (
+        choice.question.question_type == 'SA' and choice.is_correct and choice.text != payload.text)
     choice.text = payload.text
     choice.is_correct = payload.is_correct
     choice.save()
+    if key_changed:
+        transaction.on_commit(lambda: regrade.schedule(choice.question_id))
     return choice
 
 @router.delete('/choices/{choice_id}', auth=AuthBearer())
@@ -222,39 +305,36 @@ def delete_choice(request, choice_id: int):
 # -------------------------- Participants Endpoints ---------------------------
 @router.post('/participants', response={201: ParticipantOut, 400: ErrorResponse}, auth=AuthBearer())
 def register_participant(request, payload: ParticipantIn):
-    exam = get_object_or_404(Exam, id=payload.exam_id)
-# Verifica tentativas existentes
-    last_attempt = Participant.objects.filter(
-        user=request.auth,
-        exam=exam
-    ).order_by('-current_attempt').first()
-    
-    current_attempt = 1 if not last_attempt else last_attempt.current_attempt + 1
-
-    if current_attempt >= exam.max_attempts:
-        return 400, {"detail": f"Número máximo de tentativas ({exam.max_attempts}) atingido"}
-    
-    # Verifica se já está inscrito
-    if Participant.objects.filter(user=request.auth, exam=exam).exists():
-        return 400, {"detail": "Usuário já está inscrito nesta prova"}
-    
-    participant = Participant.objects.create(
-        user=request.auth,
-        exam=exam,
-        current_attempt=current_attempt
-    )
+    """Inscreve o usuário numa nova tentativa da prova (aceita antes do início)"""
+    try:
+        participant = registration.register(request.auth.id, payload.exam_id)
+    except registration.RegistrationError as e:
+        return e.status, {"detail": e.detail}
+    roster.remember(participant)
     return 201, participant
 
-@router.get('/participants', response=List[ParticipantOut], auth=AuthBearer())
-@paginate
-def list_participants(request, exam_id: Optional[int] = None):
+@router.get('/participants', response=List[sparse_schema(ParticipantOut)], exclude_unset=True, auth=AuthBearer())
+@fast_response
+@paginate(EstimatedCountPagination)
+def list_participants(request, exam_id: Optional[int] = None, fields: Optional[str] = None):
     """Lista participantes com filtro por prova"""
     queryset = Participant.objects.all()
     
     if exam_id:
         queryset = queryset.filter(exam_id=exam_id)
     
-    return queryset.order_by('-score')
+    return rows(queryset.order_by('-score'), ParticipantOut, parse_fields(fields, ParticipantOut))
+
+@router.get('/participants/{int:participant_id}/summary',
+            response={200: ParticipantSummaryOut, 403: ErrorResponse, 404: ErrorResponse}, auth=AuthBearer())
+def get_participant_summary(request, participant_id: int):
+    """Resultado consolidado da tentativa (o próprio participante ou admin)"""
+    data = summary.get(participant_id)
+    if data is None:
+        return 404, {"detail": "Participante não encontrado"}
+    if data['user_id'] != request.auth.id and request.auth.role != 'ADMIN':
+        return 403, {"detail": "Permissão negada"}
+    return data
 
 @router.delete('/participants/{participant_id}', auth=AuthBearer())
 def delete_participant(request, participant_id: int):
@@ -263,63 +343,158 @@ def delete_participant(request, participant_id: int):
         return 403, {"detail": "Permissão negada"}
     
     participant = get_object_or_404(Participant, id=participant_id)
-    participant.delete()
+    purge.soft_delete(participant)
     return 200, {"detail": "Participante removido com sucesso"}
 
+@router.get('/deletions/{kind}/{int:object_id}', response={200: DeletionProgressOut, 403: ErrorResponse, 404: ErrorResponse},
+            auth=AuthBearer())
+def get_deletion_progress(request, kind: str, object_id: int):
+    """Andamento da remoção de uma prova, participante ou usuário excluído (Admin only)"""
+    if request.auth.role != 'ADMIN':
+        return 403, {"detail": "Permissão negada"}
+
+    state = purge.progress(kind, object_id) if kind in purge.MODELS else None
+    if state is None:
+        return 404, {"detail": "Exclusão não encontrada"}
+    return state
+
 # ---------------------------- Answers Endpoints ------------------------------
-@router.post('/answers', response={200: AnswerOut, 400: ErrorResponse}, auth=AuthBearer())
+@router.post('/answers', response={200: AnswerOut, 202: AnswerQueuedOut, 400: ErrorResponse}, auth=AuthBearer(),
+             throttle=UserTokenBucket('answers_user'))
 def submit_answer(request, payload: AnswerIn):
     """Submete resposta de uma questão"""
-    question = get_object_or_404(Question, id=payload.question_id)
-    choice = get_object_or_404(Choice, id=payload.choice_id)
-    
-    # Verifica se a alternativa pertence à questão
-    if choice.question != question:
-        return 400, {"detail": "Alternativa não pertence à questão"}
-    
-    # Verifica se o usuário está inscrito na prova
-    participant = get_object_or_404(
-        Participant,
-        user=request.auth,
-        exam=question.exam
-    )
+    # Questão e inscrição vêm do cache (pré-aquecido antes do início da prova)
+    exam_id = roster.question_exam_id(payload.question_id)
+    if exam_id is None:
+        raise Http404("Questão não encontrada")
+
+    # Verifica se o usuário está inscrito na prova (tentativa mais recente)
+    participant = roster.participant_for(exam_id, request.auth.id)
+    if participant is None:
+        raise Http404("Participante não encontrado")
+
+    version = participant['snapshot_version']
+    short_answer = payload.text_answer is not None
+    if short_answer:
+        # Resposta em texto: corrigida depois, em lote (grading.py)
+        question_type = version and snapshots.question_type(exam_id, version, payload.question_id)
+        if not question_type:
+            question_type = Question.objects.filter(id=payload.question_id).values_list(
+                'question_type', flat=True).first()
+        if question_type != 'SA':
+            return 400, {"detail": "Questão não aceita resposta em texto"}
+        is_correct, points = False, 0
+    elif version:
+        # Correção pelo gabarito do snapshot em que o participante se inscreveu
+        graded = snapshots.grade(exam_id, version, payload.question_id, payload.choice_id)
+        if graded is None:
+            return 400, {"detail": "Alternativa não pertence à questão"}
+        is_correct, points = graded
+    else:
+        choice = get_object_or_404(Choice.objects.select_related('question'), id=payload.choice_id)
+        # Verifica se a alternativa pertence à questão (em SA as alternativas são o gabarito)
+        if choice.question_id != payload.question_id or choice.question.question_type == 'SA':
+            return 400, {"detail": "Alternativa não pertence à questão"}
+        is_correct, points = choice.is_correct, choice.question.points
     
+    # O buffer só leva respostas já corrigidas; SA vai direto para a fila de correção
+    if ingestion.is_buffered() and not short_answer:
+        # Escrita adiada: a chave (participante, questão) faz a deduplicação
+        queued = ingestion.submit(
+            participant_id=participant['id'],
+            question_id=payload.question_id,
+            choice_id=payload.choice_id,
+            is_correct=is_correct,
+            points=points,
+            exam_id=exam_id,
+        )
+        if not queued:
+            return 400, {"detail": "Questão já respondida"}
+        return 202, {
+            "participant_id": participant['id'],
+            "question_id": payload.question_id,
+            "choice_id": payload.choice_id,
+            "is_correct": is_correct,
+        }
+
     # Verifica tentativa duplicada
-    if Answer.objects.filter(participant=participant, question=question).exists():
+    if Answer.objects.filter(participant_id=participant['id'], question_id=payload.question_id).exists():
         return 400, {"detail": "Questão já respondida"}
     
     with transaction.atomic():
-        answer = Answer.objects.create(
-            participant=participant,
-            question=question,
-            choice=choice,
-            is_correct=choice.is_correct
-        )
-        
-        if choice.is_correct:
-            participant.score += question.points
-            participant.save()
+        try:
+            with transaction.atomic():
+                answer = Answer.objects.create(
+                    participant_id=participant['id'],
+                    question_id=payload.question_id,
+                    choice_id=payload.choice_id,
+                    text_answer=payload.text_answer or '',
+                    is_correct=is_correct,
+                    # Só SA fica pendente: a varredura da correção em lote olha graded_at vazio
+                    graded_at=None if short_answer else timezone.now(),
+                )
+                # As chaves estrangeiras só seriam checadas no commit (fora deste except)
+                connection.check_constraints(table_names=[Answer._meta.db_table])
+        except IntegrityError as e:
+            if partitions.is_duplicate_answer(e):
+                # Envio concorrente da mesma resposta: a restrição única decide
+                return 400, {"detail": "Questão já respondida"}
+            # Alternativa, questão ou inscrição (em cache) removidas durante o envio
+            roster.forget(exam_id, request.auth.id)
+            raise Http404("Questão, alternativa ou participante não encontrado")
+
+        if is_correct:
+            # Incremento atômico, sem carregar o participante
+            Participant.objects.filter(id=participant['id']).update(score=F('score') + points)
+        transaction.on_commit(lambda: summary.invalidate(participant['id']))
+        if short_answer:
+            transaction.on_commit(lambda: grading.schedule(exam_id))
     
     return answer
 
-@router.get('/answers', response=List[AnswerOut], auth=AuthBearer())
-@paginate
-def list_answers(request, participant_id: Optional[int] = None):
+@router.get('/answers', response=List[sparse_schema(AnswerOut)], exclude_unset=True, auth=AuthBearer())
+@fast_response
+@paginate(EstimatedCountPagination)
+def list_answers(request, participant_id: Optional[int] = None, fields: Optional[str] = None):
     """Lista respostas com filtro por participante"""
+    fields = parse_fields(fields, AnswerOut)
+    if participant_id:
+        # Provas encerradas podem ter as respostas movidas para arquivo
+        archive = AnswerArchive.objects.filter(exam__participants__id=participant_id).first()
+        if archive:
+            answers = read_archived_answers(archive, participant_id=participant_id)
+            answers = sorted(answers, key=lambda a: a['answered_at'], reverse=True)
+            return pick(answers, fields or list(AnswerOut.model_fields))
+
     queryset = Answer.objects.all()
     
     if participant_id:
         queryset = queryset.filter(participant_id=participant_id)
     
-    return queryset.order_by('-answered_at')
+    return rows(queryset.order_by('-answered_at'), AnswerOut, fields)
 
 # ---------------------------- Public Endpoints -------------------------------
-@router.get('/exams/active', response=List[ExamOut], auth=None)
-def list_active_exams(request):
-    """Lista provas ativas (público)"""
-    exams = Exam.objects.filter(is_active=True).order_by('-created_at')
-    return list(exams)
-@router.get('/exams/{exam_id}/ranking', response=List[ParticipantOut])
-def get_ranking(request, exam_id: int):
-    """Ranking de participantes de uma prova"""
-    return Participant.objects.filter(exam_id=exam_id).order_by('-score', 'started_at')
+@router.get('/exams/active', response=ActiveExamsOut, auth=None)
+def list_active_exams(request, fields: Optional[str] = None, limit: int = 100, offset: int = 0):
+    """Lista provas na janela de realização (público), paginada e servida do cache"""
+    return activation.active_page(parse_fields(fields, ExamOut), limit, offset)
+
+@router.get('/exams/{int:exam_id}/ranking', response=List[sparse_schema(RankedParticipantOut)], exclude_unset=True)
+# Muda a cada resposta corrigida: TTL curto, servindo a versão vencida durante o recálculo
+@cached_route(ttl=5, tags=caching.exam_tags)
+@fast_response
+def get_ranking(request, exam_id: int, top: Optional[int] = None, fields: Optional[str] = None):
+    """As `top` primeiras posições do ranking de uma prova"""
+    config = settings.RANKING
+    top = max(1, min(top or config['DEFAULT_TOP'], config['MAX_TOP']))
+    return ranking.top(exam_id, top, parse_fields(fields, RankedParticipantOut))
+
+@router.get('/exams/{int:exam_id}/ranking/me', response={200: RankingAroundOut, 404: ErrorResponse}, auth=AuthBearer())
+def get_my_ranking(request, exam_id: int, window: Optional[int] = None):
+    """Posição do usuário e os `window` participantes acima e abaixo dele"""
+    config = settings.RANKING
+    window = max(0, min(config['DEFAULT_WINDOW'] if window is None else window, config['MAX_WINDOW']))
+    result = ranking.around(exam_id, request.auth.id, window)
+    if result is None:
+        return 404, {"detail": "Usuário não está inscrito nesta prova"}
+    return result
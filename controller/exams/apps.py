@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ExamsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'exams'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from core import slowqueries
+        from . import activation, caching, roster, search  # noqa: F401 - conecta os sinais de invalidação
+
+        # Log de consultas lentas em toda conexão, na web e nos workers
+        connection_created.connect(slowqueries.install_wrapper, dispatch_uid='slow-query-wrapper')
@@ -0,0 +1,99 @@
+# archive.py
+import gzip
+import hashlib
+import json
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Answer, AnswerArchive, Exam
+
+# Colunas gravadas no arquivo (a primeira linha do arquivo traz a lista)
+COLUMNS = [
+    'id',
+    'participant_id',
+    'question_id',
+    'choice_id',
+    'text_answer',
+    'is_correct',
+    'response_time',
+    'answered_at',
+]
+CHUNK_SIZE = 2000
+
+
+def archive_dir():
+    return Path(settings.ANSWER_ARCHIVE_DIR)
+
+
+def completed_exams(older_than_days=None):
+    """Provas encerradas há mais de N dias e ainda não arquivadas"""
+    if older_than_days is None:
+        older_than_days = settings.ANSWER_ARCHIVE_AFTER_DAYS
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return Exam.objects.filter(
+        end_time__lt=cutoff,
+        answer_archive__isnull=True,
+    ).order_by('end_time')
+
+
+def archive_exam_answers(exam):
+    """
+    Grava as respostas da prova em JSONL compactado (gzip), uma linha de
+    cabeçalho com as colunas e uma lista de valores por resposta, e remove
+    as linhas do banco. Retorna o AnswerArchive criado (ou None se vazio).
+    """
+    answers = Answer.objects.filter(participant__exam_id=exam.id)
+    if not answers.exists():
+        return None
+
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"exam_{exam.id}.jsonl.gz"
+    tmp_path = path.with_suffix('.tmp')
+
+    digest = hashlib.sha256()
+    row_count = 0
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as fh:
+        fh.write(json.dumps({'exam_id': exam.id, 'columns': COLUMNS}) + '\n')
+        rows = answers.order_by('participant_id', 'id').values_list(*COLUMNS)
+        for row in rows.iterator(chunk_size=CHUNK_SIZE):
+            fh.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+            row_count += 1
+
+    with open(tmp_path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(block)
+    os.replace(tmp_path, path)
+
+    with transaction.atomic():
+        archive = AnswerArchive.objects.create(
+            exam=exam,
+            path=str(path),
+            row_count=row_count,
+            size_bytes=path.stat().st_size,
+            sha256=digest.hexdigest(),
+        )
+        deleted, _ = answers.delete()
+        if deleted != row_count:
+            # Alguém respondeu durante o arquivamento: mantém o banco intacto
+            raise RuntimeError(
+                f"Prova {exam.id}: {deleted} respostas removidas, {row_count} arquivadas"
+            )
+    return archive
+
+
+def read_archived_answers(archive, participant_id=None):
+    """Lê as respostas arquivadas como dicionários no formato de AnswerOut"""
+    with gzip.open(archive.path, 'rt', encoding='utf-8') as fh:
+        columns = json.loads(fh.readline())['columns']
+        for line in fh:
+            row = dict(zip(columns, json.loads(line)))
+            if participant_id is not None and row['participant_id'] != participant_id:
+                continue
+            yield row
@@ -0,0 +1,53 @@
+# caching.py
+"""
+Tags do cache de respostas (core/response_cache.py) das rotas de provas,
+questões e alternativas, e a invalidação pelos sinais dos modelos: editar
+uma prova, questão ou alternativa purga `exam:<id>` e a coleção afetada.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.response_cache import purge
+from .models import Choice, Exam, Question
+
+
+def exam_tag(exam_id):
+    return f'exam:{exam_id}'
+
+
+def question_tag(question_id):
+    return f'question:{question_id}'
+
+
+def exam_tags(request, exam_id=None, **kwargs):
+    return [exam_tag(exam_id)] if exam_id else ['exams']
+
+
+def question_tags(request, exam_id=None, **kwargs):
+    return [exam_tag(exam_id)] if exam_id else ['questions']
+
+
+def choice_tags(request, question_id=None, **kwargs):
+    return [question_tag(question_id)] if question_id else ['choices']
+
+
+@receiver(post_save, sender=Exam)
+@receiver(post_delete, sender=Exam)
+def purge_exam(sender, instance, **kwargs):
+    purge(exam_tag(instance.id), 'exams')
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def purge_question(sender, instance, **kwargs):
+    purge(exam_tag(instance.exam_id), question_tag(instance.id), 'questions')
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def purge_choice(sender, instance, **kwargs):
+    question = Question.objects.filter(id=instance.question_id).values('exam_id').first()
+    tags = [question_tag(instance.question_id), 'choices']
+    if question:
+        tags.append(exam_tag(question['exam_id']))
+    purge(*tags)
@@ -0,0 +1,254 @@
+# grading.py
+"""
+Correção em lote das respostas curtas (SA).
+
+As respostas aceitas de uma questão são as suas alternativas corretas. Uma
+resposta vale se, depois de normalizada (minúsculas, sem acentos nem
+pontuação), for:
+
+1. igual a uma resposta aceita;
+2. numericamente próxima (`numeric_tolerance`), quando as duas são números;
+3. formada pelos mesmos termos, em qualquer ordem;
+4. a até `max_edit_distance` erros de digitação (distância de edição) de
+   uma resposta aceita com texto (não vale para números).
+
+Respostas pendentes são agrupadas por regra (questão + versão do snapshot)
+e cada resposta normalizada distinta é avaliada uma única vez: o resultado
+fica no cache e grupos grandes vão para um pool de processos.
+"""
+import hashlib
+import multiprocessing
+import re
+import unicodedata
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.utils import timezone
+
+from . import snapshots
+from .models import Answer, Choice, Participant, Question
+
+MATCH_KEY = "sa:match:{rule}:{answer}"
+SCHEDULED_KEY = "sa:grade:scheduled:{exam_id}"
+NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?')
+TOKEN_RE = re.compile(r'-?\d+(?:\.\d+)?|\w+')
+MIN_TYPO_LENGTH = 4  # Respostas aceitas mais curtas exigem grafia exata
+
+
+def grading_settings():
+    return settings.SHORT_ANSWER_GRADING
+
+
+# --------------------------- Regras (funções puras) ---------------------------
+# Executadas também nos processos do pool: não dependem do Django
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r'(\d),(\d)', r'\1.\2', text)  # Vírgula decimal
+    return ' '.join(TOKEN_RE.findall(text))
+
+
+def as_number(text):
+    return float(text) if NUMBER_RE.fullmatch(text) else None
+
+
+def edit_distance(a, b, limit):
+    """Distância de Levenshtein, interrompida ao passar de `limit`"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def matches(answer, rule):
+    """`rule` = (respostas aceitas normalizadas, tolerância numérica, erros tolerados)"""
+    accepted, tolerance, max_distance = rule
+    if not answer:
+        return False
+    if answer in accepted:
+        return True
+    number = as_number(answer)
+    tokens = sorted(answer.split())
+    for candidate in accepted:
+        expected = as_number(candidate)
+        if expected is not None:
+            if number is not None and tolerance is not None and abs(number - expected) <= tolerance:
+                return True
+            continue
+        if tokens == sorted(candidate.split()):
+            return True
+        if (max_distance and len(candidate) >= MIN_TYPO_LENGTH
+                and edit_distance(answer, candidate, max_distance) <= max_distance):
+            return True
+    return False
+
+
+def score_unique(rule, answers):
+    """Avalia um grupo (uma regra, respostas distintas). Retorna {resposta: correta}"""
+    return {answer: matches(answer, rule) for answer in answers}
+
+
+def _score_group(args):
+    return score_unique(*args)
+
+
+# ------------------------------- Regras do banco -------------------------------
+
+def make_rule(accepted, tolerance, max_distance):
+    return (tuple(sorted({normalize(text) for text in accepted})), tolerance, max_distance)
+
+
+def rule_digest(rule):
+    return hashlib.sha1(repr(rule).encode()).hexdigest()[:16]
+
+
+def live_rules(question_ids):
+    """{questão: (regra, pontos)} pelo conteúdo atual (participantes sem snapshot)"""
+    questions = Question.objects.filter(id__in=question_ids).prefetch_related(
+        Prefetch('choices', queryset=Choice.objects.filter(is_correct=True), to_attr='accepted'))
+    return {
+        q.id: (make_rule([c.text for c in q.accepted], q.numeric_tolerance, q.max_edit_distance), q.points)
+        for q in questions
+    }
+
+
+def snapshot_rule(exam_id, version, question_id):
+    entry = snapshots.get(exam_id, version)['answer_key'].get(str(question_id))
+    if entry is None or 'accepted' not in entry:
+        return None
+    return make_rule(entry['accepted'], entry['tolerance'], entry['max_edit_distance']), entry['points']
+
+
+# ---------------------------------- Execução ----------------------------------
+
+def _can_fork():
+    # Filhos do prefork do Celery são daemônicos e não podem criar processos
+    return not multiprocessing.current_process().daemon
+
+
+def evaluate(groups, processes=None):
+    """
+    `groups` = {regra: conjunto de respostas normalizadas}. Consulta o cache
+    de resultados e avalia só o que falta, em paralelo se valer a pena.
+    Retorna ({(regra, resposta): correta}, quantas foram avaliadas agora).
+    """
+    config = grading_settings()
+    keys = {
+        MATCH_KEY.format(rule=rule_digest(rule), answer=hashlib.sha1(answer.encode()).hexdigest()): (rule, answer)
+        for rule, answers in groups.items() for answer in answers
+    }
+    results = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+
+    missing = defaultdict(list)
+    for rule, answer in keys.values():
+        if (rule, answer) not in results:
+            missing[rule].append(answer)
+    work = list(missing.items())
+    total = sum(len(answers) for _, answers in work)
+
+    processes = config['PROCESSES'] if processes is None else processes
+    if processes > 1 and total >= config['POOL_MIN_ANSWERS'] and _can_fork():
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            scored = list(pool.map(_score_group, work, chunksize=max(1, len(work) // (processes * 4))))
+    else:
+        scored = [score_unique(rule, answers) for rule, answers in work]
+
+    computed = {}
+    for (rule, _), outcome in zip(work, scored):
+        for answer, correct in outcome.items():
+            results[(rule, answer)] = correct
+            computed[MATCH_KEY.format(rule=rule_digest(rule),
+                                      answer=hashlib.sha1(answer.encode()).hexdigest())] = correct
+    if computed:
+        cache.set_many(computed, config['MATCH_CACHE_TTL'])
+    return results, total
+
+
+def grade_pending(exam_id=None, limit=None, processes=None):
+    """
+    Corrige um lote de respostas SA pendentes. As linhas ficam travadas
+    (SKIP LOCKED) até o fim, então lotes simultâneos não se sobrepõem.
+    Retorna as estatísticas do lote.
+    """
+    limit = limit or grading_settings()['BATCH_SIZE']
+    stats = {'graded': 0, 'correct': 0, 'distinct': 0, 'evaluated': 0,
+             'exams': set(), 'participants': set()}
+    with transaction.atomic():
+        pending = Answer.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+            question__question_type='SA', graded_at__isnull=True)
+        if exam_id is not None:
+            pending = pending.filter(participant__exam_id=exam_id)
+        pending = list(pending.values(
+            'id', 'participant_id', 'question_id', 'text_answer',
+            'participant__exam_id', 'participant__snapshot_version',
+        )[:limit])
+        if not pending:
+            return stats
+
+        # Regra do snapshot do participante; conteúdo atual sem snapshot (ou snapshot antigo)
+        live = live_rules({a['question_id'] for a in pending})
+        rules = {}
+        for a in pending:
+            key = (a['question_id'], a['participant__snapshot_version'])
+            if key not in rules:
+                version = a['participant__snapshot_version']
+                found = version and snapshot_rule(a['participant__exam_id'], version, a['question_id'])
+                rules[key] = found or live[a['question_id']]
+            a['normalized'] = normalize(a['text_answer'])
+
+        groups = defaultdict(set)
+        for a in pending:
+            rule, _ = rules[(a['question_id'], a['participant__snapshot_version'])]
+            groups[rule].add(a['normalized'])
+        results, evaluated = evaluate(groups, processes)
+
+        correct_ids, wrong_ids = [], []
+        increments = defaultdict(int)
+        for a in pending:
+            rule, points = rules[(a['question_id'], a['participant__snapshot_version'])]
+            if results[(rule, a['normalized'])]:
+                correct_ids.append(a['id'])
+                increments[a['participant_id']] += points
+            else:
+                wrong_ids.append(a['id'])
+
+        now = timezone.now()
+        Answer.objects.filter(id__in=correct_ids).update(is_correct=True, graded_at=now)
+        Answer.objects.filter(id__in=wrong_ids).update(is_correct=False, graded_at=now)
+        for participant_id, points in increments.items():
+            Participant.objects.filter(id=participant_id).update(score=F('score') + points)
+
+    stats.update(
+        graded=len(pending),
+        correct=len(correct_ids),
+        distinct=sum(len(answers) for answers in groups.values()),
+        evaluated=evaluated,
+        exams={a['participant__exam_id'] for a in pending},
+        participants={a['participant_id'] for a in pending},
+    )
+    return stats
+
+
+def schedule(exam_id):
+    """
+    Dispara a correção da prova após uma submissão SA. Submissões dentro de
+    DEBOUNCE segundos caem no mesmo disparo (e no mesmo lote).
+    """
+    # Import tardio: o processo web não carrega o Celery no import
+    from .tasks import grade_short_answers
+
+    debounce = grading_settings()['DEBOUNCE']
+    if cache.add(SCHEDULED_KEY.format(exam_id=exam_id), 1, debounce):
+        grade_short_answers.apply_async(kwargs={'exam_id': exam_id}, countdown=debounce)
@@ -0,0 +1,294 @@
+# ingestion.py
+"""
+Ingestão de respostas com escrita adiada (write-behind).
+
+No modo `buffered` a resposta validada é anexada a um buffer (Redis Stream
+ou um log local somente-anexação) e confirmada na hora. Um consumidor grava
+os lotes em `Answer` com INSERT ... ON CONFLICT DO NOTHING RETURNING e soma
+às notas só as respostas que entraram de fato. A chave (participante,
+questão), única também no banco, garante que cada resposta seja gravada uma
+única vez; `flush` roda sob um lock para que consumidores concorrentes
+(comando dedicado e tarefa do beat) não gravem o mesmo lote.
+
+Entregas de um consumidor que morreu (worker reciclado) ficam pendentes no
+grupo do Stream: passado CLAIM_IDLE_MS, outro consumidor as assume com
+XAUTOCLAIM. A resposta já foi confirmada ao candidato (202) e não pode se
+perder.
+"""
+import fcntl
+import json
+import os
+import socket
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.redis_client import get_redis
+from . import summary
+from .models import Answer, Participant
+
+DEDUPE_KEY = "answers:dedupe:{participant_id}:{question_id}"
+FLUSH_LOCK_KEY = "answers:flush:lock"
+
+# Conflitos (resposta síncrona concorrente, outro consumidor após o TTL do
+# lock) são descartados pelo banco; RETURNING diz o que entrou de fato
+INSERT_SQL = (
+    f"INSERT INTO {Answer._meta.db_table} "
+    "(participant_id, question_id, choice_id, text_answer, is_correct, response_time, answered_at, graded_at) "
+    "VALUES {rows} ON CONFLICT DO NOTHING RETURNING participant_id, question_id"
+)
+
+
+def ingestion_settings():
+    return settings.ANSWER_INGESTION
+
+
+def is_buffered():
+    return ingestion_settings()['MODE'] == 'buffered'
+
+
+def consumer_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class RedisStreamBuffer:
+    """Buffer baseado em Redis Stream com grupo de consumidores"""
+
+    def __init__(self, client, stream, group):
+        self.client = client
+        self.stream = stream
+        self.group = group
+        self._group_ready = False
+
+    def append(self, entry):
+        self.client.xadd(self.stream, {'data': json.dumps(entry)})
+
+    def _ensure_group(self):
+        if self._group_ready:
+            return
+        try:
+            self.client.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._group_ready = True
+
+    def _entries(self, messages):
+        # Entradas pendentes já removidas do stream chegam sem campos
+        self.ack([entry_id for entry_id, fields in messages if not fields])
+        return [(entry_id, json.loads(fields[b'data'])) for entry_id, fields in messages if fields]
+
+    def _claim_idle(self, consumer, count):
+        """Assume entregas paradas há CLAIM_IDLE_MS em outros consumidores (ex.: worker morto)"""
+        response = self.client.xautoclaim(
+            self.stream, self.group, consumer,
+            min_idle_time=ingestion_settings()['CLAIM_IDLE_MS'], start_id='0-0', count=count,
+        )
+        return self._entries(response[1])
+
+    def read(self, consumer, count):
+        self._ensure_group()
+        # Primeiro as entregas pendentes deste consumidor (ex.: após uma queda)
+        response = self.client.xreadgroup(self.group, consumer, {self.stream: '0'}, count=count)
+        entries = self._entries([message for _, stream_messages in response for message in stream_messages])
+        if entries:
+            return entries
+        entries = self._claim_idle(consumer, count)
+        if entries:
+            return entries
+        response = self.client.xreadgroup(self.group, consumer, {self.stream: '>'}, count=count)
+        return self._entries([message for _, stream_messages in response for message in stream_messages])
+
+    @contextmanager
+    def flush_lock(self):
+        """Lock entre hosts; False se outro consumidor segurar o lote por mais de FLUSH_LOCK_WAIT"""
+        config = ingestion_settings()
+        lock = self.client.lock(FLUSH_LOCK_KEY, timeout=config['FLUSH_LOCK_TTL'],
+                                blocking_timeout=config['FLUSH_LOCK_WAIT'])
+        acquired = lock.acquire()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except redis.exceptions.LockError:  # Expirou durante um lote lento
+                    pass
+
+    def ack(self, ids):
+        if ids:
+            self.client.xack(self.stream, self.group, *ids)
+            self.client.xdel(self.stream, *ids)
+
+    def pending(self):
+        return self.client.xlen(self.stream)
+
+
+class LocalLogBuffer:
+    """
+    Substituto local do Redis Stream: arquivo somente-anexação com um
+    arquivo de offset confirmado. Serve para um único host (dev/testes).
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.log_path = self.directory / 'answers.log'
+        self.offset_path = self.directory / 'answers.offset'
+        self.lock_path = self.directory / 'answers.lock'
+        self.flush_lock_path = self.directory / 'answers.flush.lock'
+
+    def _locked(self, path=None):
+        fh = open(path or self.lock_path, 'a')
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        return fh
+
+    @contextmanager
+    def flush_lock(self):
+        """Lock do host entre a leitura e a confirmação do lote (sem marca de entrega)"""
+        with self._locked(self.flush_lock_path):
+            yield True
+
+    def _offset(self):
+        try:
+            return int(self.offset_path.read_text() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def append(self, entry):
+        with self._locked():
+            with open(self.log_path, 'a', encoding='utf-8') as fh:
+                fh.write(json.dumps(entry) + '\n')
+
+    def read(self, consumer, count):
+        with self._locked():
+            if not self.log_path.exists():
+                return []
+            entries = []
+            with open(self.log_path, 'rb') as fh:
+                fh.seek(self._offset())
+                while len(entries) < count:
+                    line = fh.readline()
+                    if not line.endswith(b'\n'):
+                        break
+                    entries.append((fh.tell(), json.loads(line)))
+            return entries
+
+    def ack(self, ids):
+        if not ids:
+            return
+        with self._locked():
+            offset = max(ids)
+            if offset >= self.log_path.stat().st_size:
+                # Tudo consumido: compacta o log
+                self.log_path.write_bytes(b'')
+                offset = 0
+            self.offset_path.write_text(str(offset))
+
+    def pending(self):
+        with self._locked():
+            if not self.log_path.exists():
+                return 0
+            with open(self.log_path, 'rb') as fh:
+                fh.seek(self._offset())
+                return sum(1 for _ in fh)
+
+
+def get_buffer():
+    config = ingestion_settings()
+    if config['BACKEND'] == 'redis':
+        return RedisStreamBuffer(get_redis(), config['STREAM'], config['GROUP'])
+    return LocalLogBuffer(config['LOCAL_DIR'])
+
+
+def submit(participant_id, question_id, choice_id, is_correct, points, exam_id):
+    """
+    Anexa a resposta ao buffer. Retorna False se a chave de deduplicação
+    (participante, questão) já existir, ou seja, a questão já foi respondida.
+    """
+    key = DEDUPE_KEY.format(participant_id=participant_id, question_id=question_id)
+    if not cache.add(key, 1, timeout=ingestion_settings()['DEDUPE_TTL']):
+        return False
+    try:
+        get_buffer().append({
+            'participant_id': participant_id,
+            'question_id': question_id,
+            'choice_id': choice_id,
+            'is_correct': is_correct,
+            'points': points,
+            'exam_id': exam_id,
+        })
+    except Exception:
+        cache.delete(key)
+        raise
+    return True
+
+
+def flush(batch_size=None, consumer=None):
+    """
+    Grava um lote do buffer em `Answer`. Entradas cujo par (participante,
+    questão) já existe no banco (reentregas) são descartadas. Retorna o
+    número de entradas consumidas, de respostas gravadas e os ids das
+    provas afetadas.
+    """
+    buffer = get_buffer()
+    with buffer.flush_lock() as acquired:
+        if not acquired:
+            return 0, 0, set()
+        return _flush(buffer, batch_size or ingestion_settings()['BATCH_SIZE'], consumer or consumer_name())
+
+
+def _flush(buffer, batch_size, consumer):
+    entries = buffer.read(consumer, batch_size)
+    if not entries:
+        return 0, 0, set()
+
+    pending = {}
+    for _, entry in entries:
+        pending.setdefault((entry['participant_id'], entry['question_id']), entry)
+
+    # O índice único é por partição (mês): respostas de meses anteriores só a consulta enxerga
+    existing = set(
+        Answer.objects.filter(
+            participant_id__in={p for p, _ in pending},
+            question_id__in={q for _, q in pending},
+        ).values_list('participant_id', 'question_id')
+    )
+    new_entries = [entry for key, entry in pending.items() if key not in existing]
+
+    now = connection.ops.adapt_datetimefield_value(timezone.now())  # O buffer só leva respostas já corrigidas (não SA)
+    with transaction.atomic():
+        inserted = _insert(new_entries, now) if new_entries else set()
+        increments = defaultdict(int)
+        exams = set()
+        for key in inserted:
+            entry = pending[key]
+            exams.add(entry['exam_id'])
+            if entry['is_correct']:
+                increments[entry['participant_id']] += entry['points']
+        for participant_id, points in increments.items():
+            Participant.objects.filter(id=participant_id).update(score=F('score') + points)
+        written = {participant_id for participant_id, _ in inserted}
+        transaction.on_commit(lambda: summary.invalidate(*written))
+
+    buffer.ack([entry_id for entry_id, _ in entries])
+    return len(entries), len(inserted), exams
+
+
+def _insert(entries, now):
+    """Insere as respostas e retorna os pares (participante, questão) realmente gravados"""
+    params = []
+    for entry in entries:
+        params += [entry['participant_id'], entry['question_id'], entry['choice_id'], '',
+                   entry['is_correct'], 0, now, now]
+    rows = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(entries))
+    with connection.cursor() as cursor:
+        cursor.execute(INSERT_SQL.format(rows=rows), params)
+        return {tuple(row) for row in cursor.fetchall()}
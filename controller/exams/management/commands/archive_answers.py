@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from exams.archive import archive_exam_answers, completed_exams
+from exams.models import Exam
+
+
+class Command(BaseCommand):
+    help = "Move as respostas de provas encerradas para arquivos compactados"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, help="Arquiva apenas a prova informada")
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help="Dias desde o término da prova (padrão: ANSWER_ARCHIVE_AFTER_DAYS)")
+        parser.add_argument('--dry-run', action='store_true', help="Apenas lista as provas")
+
+    def handle(self, *args, **options):
+        if options['exam']:
+            exams = Exam.objects.filter(id=options['exam'], answer_archive__isnull=True)
+            if not exams.exists():
+                raise CommandError(f"Prova {options['exam']} não encontrada ou já arquivada")
+        else:
+            exams = completed_exams(options['older_than_days'])
+
+        total = 0
+        for exam in exams:
+            if options['dry_run']:
+                self.stdout.write(f"[dry-run] {exam}")
+                continue
+            archive = archive_exam_answers(exam)
+            if archive is None:
+                self.stdout.write(f"{exam}: nenhuma resposta")
+                continue
+            total += archive.row_count
+            self.stdout.write(f"{exam}: {archive.row_count} respostas -> {archive.path}")
+
+        self.stdout.write(self.style.SUCCESS(f"{total} respostas arquivadas"))
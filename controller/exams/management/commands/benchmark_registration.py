@@ -0,0 +1,69 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count, Max
+
+from exams.models import Exam, Participant
+from exams.registration import RegistrationError, register
+from users.models import User
+
+
+def _register(user_id, exam_id):
+    try:
+        register(user_id, exam_id)
+        return 'created'
+    except RegistrationError as e:
+        return e.detail.split(' (')[0]
+    except Exception as e:  # noqa: BLE001 - o benchmark conta qualquer erro como 500
+        return f"erro: {type(e).__name__}"
+
+
+class Command(BaseCommand):
+    help = "Simula o pico de inscrições no início da prova e verifica a consistência"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--max-attempts', type=int, default=1)
+        parser.add_argument('--requests-per-user', type=int, default=3,
+                            help="Requisições simultâneas por usuário (cliques repetidos, retries)")
+
+    def handle(self, *args, **options):
+        admin = User.objects.create_user(username='bench_registration_admin', password='x', role='ADMIN')
+        exam = Exam.objects.create(title='Benchmark de inscrição', description='-', duration=60,
+                                   max_attempts=options['max_attempts'], created_by=admin)
+        users = User.objects.bulk_create([
+            User(username=f'bench_registration_{i}', role='PARTICIPANT') for i in range(options['users'])
+        ])
+        jobs = [user.id for user in users for _ in range(options['requests_per_user'])]
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                outcomes = Counter(pool.map(lambda user_id: _register(user_id, exam.id), jobs))
+            elapsed = time.perf_counter() - start
+
+            per_user = Participant.objects.filter(exam=exam).values('user_id').annotate(
+                total=Count('id'), last=Max('current_attempt'))
+            over_limit = [row for row in per_user if row['total'] > options['max_attempts']]
+            gaps = [row for row in per_user if row['last'] != row['total']]
+
+            self.stdout.write(f"{len(jobs)} requisições em {elapsed:.2f}s ({len(jobs) / elapsed:,.0f}/s)")
+            for outcome, count in outcomes.most_common():
+                self.stdout.write(f"  {outcome}: {count}")
+            registered = per_user.count()
+            errors = sum(count for outcome, count in outcomes.items() if outcome.startswith('erro'))
+            # Requisições simultâneas do mesmo usuário valem como uma inscrição
+            ok = registered == options['users'] and not over_limit and not gaps and not errors
+            style = self.style.SUCCESS if ok else self.style.ERROR
+            self.stdout.write(style(
+                f"usuários inscritos: {registered}/{options['users']}, acima do limite: {len(over_limit)}, "
+                f"numeração com lacunas: {len(gaps)}, erros: {errors}"
+            ))
+        finally:
+            exam.delete()
+            User.objects.filter(username__startswith='bench_registration_').delete()
+            connections.close_all()
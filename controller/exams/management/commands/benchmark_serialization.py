@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from ninja.renderers import JSONRenderer
+
+from core.fieldsets import rows
+from core.renderers import dumps
+from exams.models import Exam
+from exams.schemas import ExamOut
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Mede linhas/s da serialização de listas: modelos + schema + json vs values() + orjson"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help="Provas criadas para o teste")
+        parser.add_argument('--repeat', type=int, default=5, help="Execuções por caminho")
+
+    def handle(self, *args, **options):
+        count = options['rows']
+        # Dados temporários: tudo é desfeito ao final
+        with transaction.atomic():
+            admin = User.objects.create_user(username='benchmark_admin', password='x', role='ADMIN')
+            Exam.objects.bulk_create([
+                Exam(title=f'Prova {i}', description='Descrição ' * 50, duration=60, created_by=admin)
+                for i in range(count)
+            ], batch_size=1000)
+            queryset = Exam.objects.filter(created_by=admin).order_by('-created_at')
+
+            renderer = JSONRenderer()
+
+            # QuerySet novo a cada execução: os dois caminhos pagam a consulta (sem _result_cache)
+            def default_path():
+                items = [ExamOut.model_validate(exam).model_dump() for exam in queryset.all()]
+                return renderer.render(None, {'items': items, 'count': count}, response_status=200).encode()
+
+            def fast_path():
+                return dumps({'items': list(rows(queryset.all(), ExamOut)), 'count': count})
+
+            for name, func in [('modelos + schema + json', default_path), ('values() + orjson', fast_path)]:
+                best = min(self._timeit(func) for _ in range(options['repeat']))
+                self.stdout.write(f"{name}: {count / best:,.0f} linhas/s ({best * 1000:.1f} ms)")
+
+            transaction.set_rollback(True)
+
+    def _timeit(self, func):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
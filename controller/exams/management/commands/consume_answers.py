@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exams import ingestion
+from exams.tasks import update_ranking
+
+
+class Command(BaseCommand):
+    help = "Consumidor dedicado do buffer de ingestão de respostas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--idle-sleep', type=float, default=0.5,
+                            help="Espera (s) quando o buffer está vazio")
+        parser.add_argument('--once', action='store_true', help="Esvazia o buffer e sai")
+
+    def handle(self, *args, **options):
+        consumer = ingestion.consumer_name()
+        self.stdout.write(f"Consumidor {consumer} iniciado")
+        while True:
+            consumed, written, exams = ingestion.flush(options['batch_size'], consumer=consumer)
+            for exam_id in exams:
+                update_ranking.delay(exam_id)
+            if written:
+                self.stdout.write(f"{written} respostas gravadas ({consumed} lidas)")
+            if not consumed:
+                if options['once']:
+                    break
+                time.sleep(options['idle_sleep'])
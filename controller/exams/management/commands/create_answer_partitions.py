@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from exams.partitions import ensure_answer_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = "Cria as partições mensais futuras da tabela de respostas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            self.stdout.write(self.style.WARNING("Tabela de respostas não é particionada"))
+            return
+        for name in ensure_answer_partitions(options['months_ahead']):
+            self.stdout.write(f"Partição criada: {name}")
+        self.stdout.write(self.style.SUCCESS("Partições em dia"))
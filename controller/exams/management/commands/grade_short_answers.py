@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exams import grading, summary
+from exams.tasks import update_ranking
+
+
+class Command(BaseCommand):
+    help = "Corrige em lote as respostas curtas (SA) pendentes, com pool de processos"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, default=None, help="Corrige só a prova indicada")
+        parser.add_argument('--processes', type=int, default=None,
+                            help="Processos do pool (padrão: SHORT_ANSWER_GRADING['PROCESSES'])")
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        graded = correct = evaluated = 0
+        exams = set()
+        while True:
+            stats = grading.grade_pending(options['exam'], options['batch_size'], options['processes'])
+            if not stats['graded']:
+                break
+            graded += stats['graded']
+            correct += stats['correct']
+            evaluated += stats['evaluated']
+            exams |= stats['exams']
+            summary.invalidate(*stats['participants'])
+            self.stdout.write(f"Lote: {stats['graded']} respostas, {stats['distinct']} distintas, "
+                              f"{stats['evaluated']} avaliadas (o resto veio do cache)")
+        for exam_id in exams:
+            update_ranking.delay(exam_id)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{graded} respostas corrigidas ({correct} corretas, {evaluated} avaliações) em {elapsed:.1f}s"
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from exams.models import Exam
+from exams.prewarm import warm_exam, warm_upcoming
+
+
+class Command(BaseCommand):
+    help = "Pré-carrega os caches das provas prestes a começar e mostra a cobertura"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=None,
+                            help="Janela antes do início (padrão: EXAM_PREWARM_MINUTES)")
+        parser.add_argument('--exam', type=int, action='append', dest='exam_ids',
+                            help="Aquece a prova indicada independentemente do horário")
+
+    def handle(self, *args, **options):
+        if options['exam_ids']:
+            reports = [warm_exam(exam) for exam in Exam.objects.filter(id__in=options['exam_ids'])]
+        else:
+            reports = warm_upcoming(options['minutes'])
+        if not reports:
+            self.stdout.write("Nenhuma prova para aquecer")
+            return
+        for report in reports:
+            style = self.style.SUCCESS if report['coverage'] == 1 else self.style.WARNING
+            published = "" if report['published'] else " (sem snapshot publicado)"
+            self.stdout.write(style(
+                f"Prova {report['exam_id']}{published}: {report['cached']}/{report['keys']} chaves "
+                f"({report['coverage']:.0%}), {report['participants']} inscritos"
+            ))
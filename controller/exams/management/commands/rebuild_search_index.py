@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exams import search
+
+
+class Command(BaseCommand):
+    help = "Reconstrói o índice de busca de provas (e o snapshot em disco, no backend 'memory')"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        total = search.get_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} provas indexadas em {time.perf_counter() - start:.2f}s"
+        ))
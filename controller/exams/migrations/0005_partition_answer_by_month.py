@@ -0,0 +1,107 @@
+# Particiona exams_answer por mês de answered_at (PostgreSQL).
+# Em outros bancos a migração não faz nada.
+
+from datetime import date
+
+from django.db import migrations
+
+TABLE = 'exams_answer'
+LEGACY = 'exams_answer_legacy'
+MONTHS_AHEAD = 3
+
+# Restrições/índices recriados com os mesmos nomes gerados pelo Django
+FOREIGN_KEYS = [
+    ('choice_id', 'exams_choice', 'exams_answer_choice_id_bb8a2b71'),
+    ('participant_id', 'exams_participant', 'exams_answer_participant_id_e0712b68'),
+    ('question_id', 'exams_question', 'exams_answer_question_id_7327e287'),
+]
+
+
+def _add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_answers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    execute = schema_editor.execute
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT MIN(answered_at), CURRENT_DATE FROM "{TABLE}"')
+        oldest, today = cursor.fetchone()
+
+    execute(f'ALTER TABLE "{TABLE}" RENAME TO "{LEGACY}"')
+    execute(f'ALTER TABLE "{LEGACY}" RENAME CONSTRAINT "{TABLE}_pkey" TO "{LEGACY}_pkey"')
+    execute(f'ALTER SEQUENCE "{TABLE}_id_seq" RENAME TO "{LEGACY}_id_seq"')
+    execute(
+        f'CREATE TABLE "{TABLE}" (LIKE "{LEGACY}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY RANGE ("answered_at")'
+    )
+    execute(f'CREATE SEQUENCE "{TABLE}_id_seq" OWNED BY "{TABLE}"."id"')
+    execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN "id" SET DEFAULT nextval(\'{TABLE}_id_seq\')')
+    execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ("id", "answered_at")')
+
+    # Partição padrão + uma por mês desde a resposta mais antiga
+    execute(f'CREATE TABLE "{TABLE}_default" PARTITION OF "{TABLE}" DEFAULT')
+    month = date((oldest or today).year, (oldest or today).month, 1)
+    last = _add_months(date(today.year, today.month, 1), MONTHS_AHEAD)
+    while month <= last:
+        upper = _add_months(month, 1)
+        execute(
+            f'CREATE TABLE "{TABLE}_p{month:%Y_%m}" PARTITION OF "{TABLE}" '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+
+    execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{LEGACY}"')
+    execute(
+        f'SELECT setval(\'{TABLE}_id_seq\', COALESCE((SELECT MAX("id") FROM "{LEGACY}"), 0) + 1, false)'
+    )
+    execute(f'DROP TABLE "{LEGACY}"')
+
+    for column, target, name in FOREIGN_KEYS:
+        execute(f'CREATE INDEX "{name}" ON "{TABLE}" ("{column}")')
+        execute(
+            f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}_fk_{target}_id" FOREIGN KEY ("{column}") '
+            f'REFERENCES "{target}" ("id") DEFERRABLE INITIALLY DEFERRED'
+        )
+
+
+def unpartition_answers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    execute = schema_editor.execute
+    execute(f'ALTER TABLE "{TABLE}" RENAME TO "{LEGACY}"')
+    execute(f'ALTER TABLE "{LEGACY}" RENAME CONSTRAINT "{TABLE}_pkey" TO "{LEGACY}_pkey"')
+    execute(f'ALTER SEQUENCE "{TABLE}_id_seq" RENAME TO "{LEGACY}_id_seq"')
+    execute(f'CREATE TABLE "{TABLE}" (LIKE "{LEGACY}" INCLUDING CONSTRAINTS)')
+    execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN "id" ADD GENERATED BY DEFAULT AS IDENTITY')
+    execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ("id")')
+    execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{LEGACY}"')
+    execute(
+        f'SELECT setval(pg_get_serial_sequence(\'{TABLE}\', \'id\'), '
+        f'COALESCE((SELECT MAX("id") FROM "{LEGACY}"), 0) + 1, false)'
+    )
+    execute(f'DROP TABLE "{LEGACY}" CASCADE')
+
+    for column, target, name in FOREIGN_KEYS:
+        execute(f'CREATE INDEX "{name}" ON "{TABLE}" ("{column}")')
+        execute(
+            f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}_fk_{target}_id" FOREIGN KEY ("{column}") '
+            f'REFERENCES "{target}" ("id") DEFERRABLE INITIALLY DEFERRED'
+        )
+
+
+class Migration(migrations.Migration):
+
+    atomic = True
+
+    dependencies = [
+        ('exams', '0004_alter_participant_unique_together'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_answers, unpartition_answers),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0006_answerarchive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='published_version',
+            field=models.PositiveIntegerField(blank=True, help_text='Versão do snapshot publicado servida aos candidatos', null=True),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='snapshot_version',
+            field=models.PositiveIntegerField(blank=True, help_text='Versão do snapshot da prova usada na correção', null=True),
+        ),
+        migrations.CreateModel(
+            name='ExamSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('content', models.BinaryField()),
+                ('answer_key', models.JSONField()),
+                ('published_at', models.DateTimeField(auto_now_add=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='exams.exam')),
+                ('published_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='published_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('exam', 'version')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0007_examsnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['exam', '-score', 'started_at', 'id'], name='participant_ranking_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0008_participant_ranking_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='graded_at',
+            field=models.DateTimeField(blank=True, help_text='Correção em lote das respostas curtas (SA); vazio = pendente', null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='max_edit_distance',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Erros de digitação tolerados (distância de edição)'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='numeric_tolerance',
+            field=models.FloatField(blank=True, help_text='Diferença absoluta aceita em respostas numéricas', null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0009_short_answer_grading'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, help_text='Exclusão lógica; os dados são removidos em segundo plano', null=True),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, help_text='Exclusão lógica; as respostas são removidas em segundo plano', null=True),
+        ),
+    ]
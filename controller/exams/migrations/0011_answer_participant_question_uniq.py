@@ -0,0 +1,68 @@
+# Uma resposta por (participante, questão) no banco.
+# Na tabela particionada (PostgreSQL) a restrição vira um índice único em cada
+# partição: o pai só aceita restrições únicas que incluam answered_at.
+
+from django.db import migrations, models
+
+TABLE = 'exams_answer'
+CONSTRAINT = models.UniqueConstraint(fields=['participant', 'question'], name='answer_participant_question_uniq')
+
+
+def _partitions(cursor):
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = %s::regclass",
+        [TABLE],
+    )
+    return [name for name, in cursor.fetchall()]
+
+
+def _is_partitioned(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def remove_duplicates(apps, schema_editor):
+    # Reentregas gravadas antes da restrição: fica a resposta mais antiga
+    schema_editor.execute(
+        f'DELETE FROM "{TABLE}" WHERE id IN ('
+        f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+        f'PARTITION BY participant_id, question_id ORDER BY answered_at, id) AS position '
+        f'FROM "{TABLE}") ranked WHERE position > 1)'
+    )
+
+
+class AddAnswerConstraint(migrations.AddConstraint):
+    """AddConstraint que, na tabela particionada, cria o índice em cada partição"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_partitioned(schema_editor.connection):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        with schema_editor.connection.cursor() as cursor:
+            for partition in _partitions(cursor):
+                cursor.execute(
+                    f'CREATE UNIQUE INDEX IF NOT EXISTS "{partition}_pq_uniq" '
+                    f'ON "{partition}" ("participant_id", "question_id")'
+                )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_partitioned(schema_editor.connection):
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        with schema_editor.connection.cursor() as cursor:
+            for partition in _partitions(cursor):
+                cursor.execute(f'DROP INDEX IF EXISTS "{partition}_pq_uniq"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0010_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        AddAnswerConstraint(model_name='answer', constraint=CONSTRAINT),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:40
+
+from django.db import migrations, models
+
+
+def mark_graded(apps, schema_editor):
+    # Respostas de múltipla escolha/V-F já nascem corrigidas: fora da fila de SA
+    schema_editor.execute(
+        "UPDATE exams_answer SET graded_at = answered_at WHERE graded_at IS NULL "
+        "AND question_id IN (SELECT id FROM exams_question WHERE question_type <> 'SA')"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0011_answer_participant_question_uniq'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_graded, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(condition=models.Q(('graded_at__isnull', True)), fields=['question'], name='answer_pending_grading_idx'),
+        ),
+    ]
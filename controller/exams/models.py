@@ -1,6 +1,8 @@
 from django.db import models
 from django.conf import settings
 
+from core.softdelete import AliveManager
+
 class Exam(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
@@ -16,6 +18,13 @@ class Exam(models.Model):
     max_attempts = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    published_version = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Versão do snapshot publicado servida aos candidatos")
+    deleted_at = models.DateTimeField(
+        null=True, blank=True, help_text="Exclusão lógica; os dados são removidos em segundo plano")
+
+    objects = AliveManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return f"{self.title} (ID: {self.id})"
@@ -32,6 +41,11 @@ class Question(models.Model):
     question_type = models.CharField(max_length=3, choices=TYPE_CHOICES, default='MCQ')
     points = models.PositiveIntegerField(default=1)
     explanation = models.TextField(blank=True)
+    # Correção de resposta curta (SA): as alternativas corretas são as respostas aceitas
+    numeric_tolerance = models.FloatField(
+        null=True, blank=True, help_text="Diferença absoluta aceita em respostas numéricas")
+    max_edit_distance = models.PositiveSmallIntegerField(
+        default=1, help_text="Erros de digitação tolerados (distância de edição)")
 
 class Choice(models.Model):
     question = models.ForeignKey(Question, related_name='choices', on_delete=models.CASCADE)
@@ -54,9 +68,20 @@ class Participant(models.Model):
     current_attempt = models.PositiveIntegerField(default=1)
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    snapshot_version = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Versão do snapshot da prova usada na correção")
+    deleted_at = models.DateTimeField(
+        null=True, blank=True, help_text="Exclusão lógica; as respostas são removidas em segundo plano")
+
+    objects = AliveManager()
+    all_objects = models.Manager()
 
     class Meta:
         unique_together = ('user', 'exam', 'current_attempt')
+        indexes = [
+            # Ordem do ranking: top-K e vizinhança sem ordenar a prova inteira
+            models.Index(fields=['exam', '-score', 'started_at', 'id'], name='participant_ranking_idx'),
+        ]
     
     def update_rank(sender, instance, **kwargs):
         participants = Participant.objects.filter(exam=instance.exam).order_by('-score')
@@ -72,4 +97,53 @@ class Answer(models.Model):
     is_correct = models.BooleanField(default=False)
     response_time = models.PositiveIntegerField(default=0,  # Adicione um valor padrão
         help_text="Tempo de resposta em segundos")
-    answered_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    answered_at = models.DateTimeField(auto_now_add=True)
+    graded_at = models.DateTimeField(
+        null=True, blank=True, help_text="Correção em lote das respostas curtas (SA); vazio = pendente")
+
+    class Meta:
+        indexes = [
+            # Fila da correção em lote: só as respostas SA pendentes (as demais nascem corrigidas)
+            models.Index(fields=['question'], condition=models.Q(graded_at__isnull=True),
+                         name='answer_pending_grading_idx'),
+        ]
+        constraints = [
+            # Com a tabela particionada vira um índice único por partição (partitions.py)
+            models.UniqueConstraint(fields=['participant', 'question'], name='answer_participant_question_uniq'),
+        ]
+
+class AnswerArchive(models.Model):
+    """Respostas de uma prova encerrada movidas para arquivo compactado"""
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, related_name='answer_archive')
+    path = models.CharField(max_length=500)
+    row_count = models.PositiveIntegerField(default=0)
+    size_bytes = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Arquivo da prova {self.exam_id} ({self.row_count} respostas)"
+
+
+class ExamSnapshot(models.Model):
+    """
+    Conteúdo publicado e imutável de uma prova: JSON já serializado para o
+    candidato (sem gabarito) e o gabarito usado na correção.
+    """
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='snapshots')
+    version = models.PositiveIntegerField()
+    content = models.BinaryField()
+    answer_key = models.JSONField()
+    published_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='published_snapshots'
+    )
+    published_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('exam', 'version')
+
+    def __str__(self):
+        return f"{self.exam_id} v{self.version}"
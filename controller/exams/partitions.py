@@ -0,0 +1,93 @@
+# partitions.py
+from datetime import date
+
+from django.db import connection
+from django.utils import timezone
+
+ANSWER_TABLE = 'exams_answer'
+UNIQUE_ANSWER_CONSTRAINT = 'answer_participant_question_uniq'
+
+
+def month_start(value):
+    """Primeiro dia do mês de uma data/datetime"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    """Soma meses a um primeiro dia de mês"""
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{ANSWER_TABLE}_p{month:%Y_%m}"
+
+
+def unique_index_name(partition):
+    return f"{partition}_pq_uniq"
+
+
+def ensure_unique_answers(cursor, partition):
+    """
+    Uma resposta por (participante, questão) na partição. O PostgreSQL não
+    aceita restrição única no pai sem a chave de partição (answered_at),
+    então cada partição recebe o próprio índice único.
+    """
+    cursor.execute(
+        f'CREATE UNIQUE INDEX IF NOT EXISTS "{unique_index_name(partition)}" '
+        f'ON "{partition}" ("participant_id", "question_id")'
+    )
+
+
+def is_duplicate_answer(error):
+    """
+    IntegrityError da chave única (participante, questão)? As violações de
+    chave estrangeira (alternativa, questão ou participante removidos) não são.
+    """
+    cause = error.__cause__
+    diag = getattr(cause, 'diag', None)
+    if diag is not None:
+        name = diag.constraint_name or ''
+        return name == UNIQUE_ANSWER_CONSTRAINT or name.endswith(unique_index_name(''))
+    # SQLite não informa o nome da restrição
+    return 'UNIQUE constraint failed' in str(cause)
+
+
+def is_partitioned():
+    """Indica se a tabela de respostas é particionada (apenas PostgreSQL)"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+            [ANSWER_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def ensure_answer_partitions(months_ahead=3, start=None):
+    """
+    Garante as partições mensais de `exams_answer` do mês de `start`
+    (padrão: mês atual) até `months_ahead` meses à frente.
+    Retorna os nomes das partições criadas.
+    """
+    if not is_partitioned():
+        return []
+
+    first = month_start(start or timezone.now())
+    created = []
+    with connection.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            lower = add_months(first, offset)
+            upper = add_months(lower, 1)
+            name = partition_name(lower)
+            cursor.execute("SELECT to_regclass(%s)", [name])
+            if cursor.fetchone()[0] is not None:
+                continue
+            cursor.execute(
+                f'CREATE TABLE "{name}" PARTITION OF "{ANSWER_TABLE}" '
+                f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+            ensure_unique_answers(cursor, name)
+            created.append(name)
+    return created
@@ -0,0 +1,57 @@
+# prewarm.py
+"""
+Pré-aquecimento dos caches das provas que vão começar: conteúdo publicado
+(já compactado), gabarito, inscritos, mapa questão -> prova e os usuários
+inscritos. Roda pelo Celery beat alguns minutos antes de `start_time`, para
+que a primeira requisição após o início não pague as idas ao banco.
+
+Os workers não alcançam a memória dos processos web: lá o nível local é
+preenchido na primeira leitura, a partir do Redis.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from users import principals
+from . import roster, snapshots
+from .models import Exam
+
+
+def upcoming_exams(minutes=None, now=None):
+    """Provas ativas que começam nos próximos `minutes` minutos"""
+    now = now or timezone.now()
+    minutes = settings.EXAM_PREWARM_MINUTES if minutes is None else minutes
+    return Exam.objects.filter(
+        is_active=True,
+        start_time__gt=now,
+        start_time__lte=now + timedelta(minutes=minutes),
+    ).order_by('start_time')
+
+
+def warm_exam(exam):
+    """Carrega os caches de uma prova e retorna o relatório de cobertura"""
+    keys = []
+    if exam.published_version:
+        keys += snapshots.warm(exam.id, exam.published_version)
+    user_ids, roster_keys = roster.warm(exam.id)
+    keys += roster_keys
+    principals.warm_principals(user_ids)
+    keys += [principals.principal_key(user_id) for user_id in user_ids]
+
+    # Cobertura medida relendo o Redis: chaves expulsas ou não gravadas aparecem aqui
+    cached = len(cache.get_many(keys)) if keys else 0
+    return {
+        'exam_id': exam.id,
+        'start_time': exam.start_time,
+        'published': bool(exam.published_version),
+        'participants': len(user_ids),
+        'keys': len(keys),
+        'cached': cached,
+        'coverage': cached / len(keys) if keys else 1.0,
+    }
+
+
+def warm_upcoming(minutes=None, now=None):
+    return [warm_exam(exam) for exam in upcoming_exams(minutes, now)]
@@ -0,0 +1,187 @@
+# purge.py
+"""
+Exclusão de provas, participantes e usuários em duas fases.
+
+1. `soft_delete` marca `deleted_at`: a linha some dos managers padrão na
+   hora e a remoção é enfileirada após o commit.
+2. `purge` (tarefa `purge_deleted`) apaga os descendentes em lotes de
+   CHUNK_SIZE linhas com DELETE ... WHERE id IN (SELECT id ... LIMIT n),
+   guiado pelos índices das chaves estrangeiras e com uma transação por
+   lote: nada é carregado em memória e nenhum lock dura mais que um lote.
+   Só a linha raiz, já sem os filhos pesados, passa pelo coletor do ORM
+   (que cuida das relações pequenas restantes e dispara os sinais).
+
+O progresso de cada exclusão fica no cache (`progress`).
+"""
+import logging
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.response_cache import purge as purge_routes
+from users.models import User
+from . import roster, snapshots
+from .caching import exam_tag
+from .models import Answer, AnswerArchive, Choice, Exam, Participant, Question
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_KEY = "purge:{kind}:{object_id}"
+
+ANSWERS, CHOICES = Answer._meta.db_table, Choice._meta.db_table
+PARTICIPANTS, QUESTIONS = Participant._meta.db_table, Question._meta.db_table
+
+MODELS = {'exam': Exam, 'participant': Participant, 'user': User}
+
+# (rótulo, tabela, condição) na ordem das chaves estrangeiras: filhos antes dos pais
+STEPS = {
+    'exam': [
+        ('answers', ANSWERS, f"question_id IN (SELECT id FROM {QUESTIONS} WHERE exam_id = %(id)s)"),
+        ('choices', CHOICES, f"question_id IN (SELECT id FROM {QUESTIONS} WHERE exam_id = %(id)s)"),
+        ('participants', PARTICIPANTS, "exam_id = %(id)s"),
+        ('questions', QUESTIONS, "exam_id = %(id)s"),
+    ],
+    'participant': [
+        ('answers', ANSWERS, "participant_id = %(id)s"),
+    ],
+    'user': [
+        ('answers', ANSWERS, f"participant_id IN (SELECT id FROM {PARTICIPANTS} WHERE user_id = %(id)s)"),
+        ('participants', PARTICIPANTS, "user_id = %(id)s"),
+    ],
+}
+
+
+def purge_settings():
+    return settings.PURGE
+
+
+def progress_key(kind, object_id):
+    return PROGRESS_KEY.format(kind=kind, object_id=object_id)
+
+
+def progress(kind, object_id):
+    """Andamento da exclusão ou None se não houver registro"""
+    return cache.get(progress_key(kind, object_id))
+
+
+def _report(kind, object_id, **changes):
+    key = progress_key(kind, object_id)
+    state = cache.get(key) or {'kind': kind, 'object_id': object_id, 'status': 'pending', 'deleted': {},
+                               'requested_at': None, 'started_at': None, 'finished_at': None}
+    deleted = changes.pop('deleted', {})
+    for label, count in deleted.items():
+        state['deleted'][label] = state['deleted'].get(label, 0) + count
+    state.update(changes)
+    cache.set(key, state, purge_settings()['PROGRESS_TTL'])
+    return state
+
+
+def soft_delete(instance):
+    """Marca a prova, participante ou usuário como excluído e agenda a remoção"""
+    kind = next(kind for kind, model in MODELS.items() if isinstance(instance, model))
+    now = timezone.now()
+    instance.deleted_at = now
+    fields = ['deleted_at']
+    if kind == 'exam':
+        fields.append('updated_at')  # A sincronização da busca segue o updated_at
+    elif kind == 'user':
+        instance.is_active = False
+        fields.append('is_active')
+    instance.save(update_fields=fields)
+
+    if kind == 'exam':
+        roster.forget_exam(instance.id)
+        snapshots.forget_current(instance.id)
+    elif kind == 'participant':
+        purge_routes(exam_tag(instance.exam_id))
+    _report(kind, instance.id, status='pending', requested_at=now)
+    transaction.on_commit(lambda: schedule(kind, instance.id))
+
+
+def schedule(kind, object_id):
+    # Import tardio: o processo web não carrega o Celery no import
+    from .tasks import purge_deleted
+
+    purge_deleted.apply_async(kwargs={'kind': kind, 'object_id': object_id})
+
+
+def delete_chunks(table, where, params, on_chunk):
+    """Apaga em lotes as linhas de `table` que atendem `where`. Retorna quantas"""
+    config = purge_settings()
+    sql = f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE {where} LIMIT %(chunk)s)"
+    total = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, {**params, 'chunk': config['CHUNK_SIZE']})
+            deleted = cursor.rowcount
+        total += deleted
+        on_chunk(deleted)
+        if deleted < config['CHUNK_SIZE']:
+            return total
+        # Folga entre lotes para a replicação e o autovacuum
+        time.sleep(config['CHUNK_PAUSE'])
+
+
+def _remove_archive(exam_id):
+    archive = AnswerArchive.objects.filter(exam_id=exam_id).first()
+    if archive:
+        Path(archive.path).unlink(missing_ok=True)
+
+
+def purge(kind, object_id):
+    """
+    Remove fisicamente uma linha excluída logicamente e seus descendentes.
+    Retorna (progresso final, provas cujo ranking mudou); (None, vazio) se
+    não há o que remover, então reexecutar é inofensivo.
+    """
+    model = MODELS[kind]
+    instance = model.all_objects.filter(id=object_id, deleted_at__isnull=False).first()
+    if instance is None:
+        return None, set()
+    _report(kind, object_id, status='running', started_at=timezone.now())
+
+    affected = set()
+    if kind == 'participant':
+        affected.add(instance.exam_id)
+    elif kind == 'user':
+        affected.update(Participant.all_objects.filter(user_id=object_id).values_list('exam_id', flat=True))
+        # Provas criadas pelo usuário iriam junto no CASCADE: removidas pelo mesmo caminho em lotes
+        for exam in Exam.all_objects.filter(created_by_id=object_id):
+            if exam.deleted_at is None:
+                exam.deleted_at = timezone.now()
+                exam.save(update_fields=['deleted_at', 'updated_at'])
+            purge('exam', exam.id)
+            affected.discard(exam.id)
+            _report(kind, object_id, deleted={'exams': 1})
+
+    # O DELETE direto não dispara post_delete: as inscrições saem do cache aqui
+    if kind == 'participant':
+        enrolled = [(instance.exam_id, instance.user_id)]
+    else:
+        enrolled = list(Participant.all_objects.filter(**{f'{kind}_id': object_id})
+                        .values_list('exam_id', 'user_id'))
+
+    for label, table, where in STEPS[kind]:
+        delete_chunks(table, where, {'id': object_id},
+                      lambda count, label=label: _report(kind, object_id, deleted={label: count}))
+    if kind == 'exam':
+        _remove_archive(object_id)
+    with transaction.atomic():
+        model.all_objects.filter(id=object_id).delete()
+    for exam_id, user_id in enrolled:
+        roster.forget(exam_id, user_id)
+
+    state = _report(kind, object_id, status='done', finished_at=timezone.now())
+    logger.info(f"Exclusão de {kind} {object_id} concluída: {state['deleted']}")
+    return state, affected
+
+
+def pending():
+    """(tipo, id) das exclusões lógicas ainda não removidas (ex.: tarefa perdida)"""
+    for kind, model in MODELS.items():
+        for object_id in model.all_objects.filter(deleted_at__isnull=False).values_list('id', flat=True):
+            yield kind, object_id
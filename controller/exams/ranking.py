@@ -0,0 +1,62 @@
+# ranking.py
+"""
+Consultas de ranking com funções de janela, sem carregar a prova inteira.
+
+A posição é o RANK() por nota (empates dividem a posição); a ordem de
+exibição desempata por início da tentativa e id. O índice
+(exam, -score, started_at, id) entrega as linhas já nessa ordem: o top-K
+para após K linhas e a vizinhança devolve só 2W + 1.
+"""
+from django.db.models import F, Window
+from django.db.models.functions import Rank
+
+from core.fieldsets import rows
+from .models import Participant
+from .schemas import RankedParticipantOut
+
+ORDERING = [F('score').desc(), F('started_at').asc(nulls_last=True), F('id').asc()]
+
+AROUND_SQL = f"""
+WITH ranked AS (
+    SELECT p.*,
+           RANK() OVER (ORDER BY p.score DESC) AS position,
+           ROW_NUMBER() OVER (ORDER BY p.score DESC, p.started_at ASC NULLS LAST, p.id) AS row_number
+    FROM {Participant._meta.db_table} p
+    WHERE p.exam_id = %(exam_id)s AND p.deleted_at IS NULL
+),
+me AS (
+    SELECT row_number FROM ranked
+    WHERE user_id = %(user_id)s
+    ORDER BY current_attempt DESC
+    LIMIT 1
+)
+SELECT ranked.*, me.row_number AS me_row_number
+FROM ranked, me
+WHERE ranked.row_number BETWEEN me.row_number - %(window)s AND me.row_number + %(window)s
+ORDER BY ranked.row_number
+"""
+
+
+def ranked(exam_id):
+    return Participant.objects.filter(exam_id=exam_id).annotate(
+        position=Window(Rank(), order_by=F('score').desc()),
+    ).order_by(*ORDERING)
+
+
+def top(exam_id, k, fields=None):
+    """As K primeiras linhas do ranking"""
+    return rows(ranked(exam_id), RankedParticipantOut, fields)[:k]
+
+
+def around(exam_id, user_id, window):
+    """
+    Tentativa mais recente do usuário e até `window` linhas acima e abaixo
+    dela. Retorna {'me', 'items'} ou None se o usuário não está inscrito.
+    """
+    neighbours = list(Participant.objects.raw(
+        AROUND_SQL, {'exam_id': exam_id, 'user_id': user_id, 'window': window}))
+    if not neighbours:
+        return None
+    items = [{name: getattr(p, name) for name in RankedParticipantOut.model_fields} for p in neighbours]
+    me = next(item for item, p in zip(items, neighbours) if p.row_number == p.me_row_number)
+    return {'me': me, 'items': items}
@@ -0,0 +1,60 @@
+# registration.py
+"""
+Inscrição de participantes num único comando SQL.
+
+O número da tentativa é calculado no próprio INSERT ... SELECT e o
+`ON CONFLICT DO NOTHING` sobre (user, exam, current_attempt) faz com que
+inscrições simultâneas do mesmo usuário não virem erro 500: a perdedora
+simplesmente não insere nada. As consultas de diagnóstico só rodam quando
+nenhuma linha foi inserida.
+"""
+from django.http import Http404
+from django.utils import timezone
+
+from .models import Exam, Participant
+
+REGISTER_SQL = f"""
+INSERT INTO {Participant._meta.db_table}
+    (user_id, exam_id, current_attempt, score, started_at, snapshot_version)
+SELECT
+    %(user_id)s,
+    e.id,
+    COALESCE(MAX(p.current_attempt), 0) + 1,
+    0,
+    CASE WHEN e.start_time IS NULL OR e.start_time <= %(now)s THEN %(now)s END,
+    e.published_version
+FROM {Exam._meta.db_table} e
+LEFT JOIN {Participant._meta.db_table} p ON p.exam_id = e.id AND p.user_id = %(user_id)s
+WHERE e.id = %(exam_id)s AND e.deleted_at IS NULL
+GROUP BY e.id, e.start_time, e.published_version, e.max_attempts
+HAVING COALESCE(MAX(p.current_attempt), 0) < e.max_attempts
+ON CONFLICT (user_id, exam_id, current_attempt) DO NOTHING
+RETURNING *
+"""
+
+
+class RegistrationError(Exception):
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+def register(user_id, exam_id, now=None):
+    """
+    Inscreve o usuário numa nova tentativa da prova. Antes de `start_time`
+    a inscrição é aceita com `started_at` vazio (pré-inscrição).
+    """
+    params = {'user_id': user_id, 'exam_id': exam_id, 'now': now or timezone.now()}
+    created = list(Participant.objects.raw(REGISTER_SQL, params))
+    if created:
+        return created[0]
+
+    exam = Exam.objects.filter(id=exam_id).values('max_attempts').first()
+    if exam is None:
+        raise Http404("Prova não encontrada")
+    attempts = Participant.objects.filter(user_id=user_id, exam_id=exam_id).count()
+    if attempts >= exam['max_attempts']:
+        raise RegistrationError(f"Número máximo de tentativas ({exam['max_attempts']}) atingido")
+    # Outra requisição do mesmo usuário ficou com esta tentativa
+    raise RegistrationError("Usuário já está inscrito nesta prova")
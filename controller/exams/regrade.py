@@ -0,0 +1,119 @@
+# regrade.py
+"""
+Recorreção em massa de uma questão depois de mudar o gabarito (alternativa
+correta, pontos ou regras de SA).
+
+Em vez de percorrer as respostas uma a uma:
+
+1. um único UPDATE acerta `Answer.is_correct` das respostas da questão
+   (em SA, as respostas voltam a pendentes e o corretor em lote refaz);
+2. um único UPDATE ... FROM (SELECT SUM(...)) recalcula a nota de quem
+   respondeu a questão, a partir de todas as respostas do participante.
+   A nota é absoluta, então as linhas dos participantes são travadas antes
+   (FOR UPDATE, em ordem de id): incrementos concorrentes (`submit_answer`,
+   `ingestion.flush`, `grading.grade_pending`) esperam e somam sobre ela, e
+   os já confirmados entram na soma;
+3. o ranking da prova é reconstruído uma vez, depois do commit.
+
+Participantes inscritos num snapshot publicado são corrigidos pelo gabarito
+congelado da versão e ficam de fora.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+
+from core.response_cache import purge
+from . import grading, summary
+from .caching import exam_tag
+from .models import Answer, Choice, Participant, Question
+
+SCHEDULED_KEY = "regrade:scheduled:{question_id}"
+
+RESCORE_SQL = f"""
+UPDATE {Participant._meta.db_table} AS p
+SET score = totals.score
+FROM (
+    SELECT a.participant_id,
+           COALESCE(SUM(q.points) FILTER (WHERE a.is_correct), 0) AS score
+    FROM {Answer._meta.db_table} a
+    JOIN {Question._meta.db_table} q ON q.id = a.question_id
+    WHERE a.participant_id IN (
+        SELECT participant_id FROM {Answer._meta.db_table} WHERE question_id = %(question_id)s
+    )
+    GROUP BY a.participant_id
+) AS totals
+WHERE p.id = totals.participant_id
+  AND p.snapshot_version IS NULL
+  AND p.score <> totals.score
+RETURNING id
+"""
+
+
+def live_answers(question_id):
+    """Respostas da questão corrigidas pelo conteúdo atual (sem snapshot)"""
+    return Answer.objects.filter(question_id=question_id, participant__snapshot_version__isnull=True)
+
+
+def _rebuild_ranking(exam_id):
+    # Import tardio: o processo web não carrega o Celery no import
+    from .tasks import update_ranking
+
+    purge(exam_tag(exam_id))
+    update_ranking.delay(exam_id)
+
+
+def regrade_question(question_id):
+    """
+    Recorrige a questão e recalcula as notas afetadas. Retorna o relatório
+    {question_id, exam_id, answers, participants} com as linhas alteradas,
+    ou None se a questão não existir.
+    """
+    question = Question.objects.filter(id=question_id).values('exam_id', 'question_type').first()
+    if question is None:
+        return None
+
+    with transaction.atomic():
+        answers = live_answers(question_id)
+        if question['question_type'] == 'SA':
+            # Regras de texto: de volta à fila do corretor em lote (grading.py)
+            changed_answers = answers.filter(graded_at__isnull=False).update(is_correct=False, graded_at=None)
+        else:
+            correct = Choice.objects.filter(id=OuterRef('choice_id')).values('is_correct')
+            changed_answers = answers.filter(choice__isnull=False).exclude(
+                is_correct=Subquery(correct)).update(is_correct=Subquery(correct))
+
+        # Depois das respostas, como os corretores (respostas -> participante): sem deadlock
+        list(Participant.all_objects.select_for_update().filter(
+            id__in=Answer.objects.filter(question_id=question_id).values('participant_id'),
+            snapshot_version__isnull=True,
+        ).order_by('id').values_list('id', flat=True))
+
+        with connection.cursor() as cursor:
+            cursor.execute(RESCORE_SQL, {'question_id': question_id})
+            changed_participants = [row[0] for row in cursor.fetchall()]
+
+        if changed_participants:
+            transaction.on_commit(lambda: summary.invalidate(*changed_participants))
+        if question['question_type'] == 'SA' and changed_answers:
+            transaction.on_commit(lambda: grading.schedule(question['exam_id']))
+        transaction.on_commit(lambda: _rebuild_ranking(question['exam_id']))
+
+    return {
+        'question_id': question_id,
+        'exam_id': question['exam_id'],
+        'answers': changed_answers,
+        'participants': len(changed_participants),
+    }
+
+
+def schedule(question_id):
+    """
+    Enfileira a recorreção após uma edição do gabarito. Edições seguidas da
+    mesma questão (ex.: trocar a alternativa correta) viram um único job.
+    """
+    from .tasks import regrade_question as regrade_task
+
+    debounce = settings.REGRADE_DEBOUNCE
+    if cache.add(SCHEDULED_KEY.format(question_id=question_id), 1, debounce):
+        regrade_task.apply_async(kwargs={'question_id': question_id}, countdown=debounce)
@@ -0,0 +1,107 @@
+# roster.py
+"""
+Consultas quentes do envio de respostas em cache (memória do processo ->
+Redis -> banco): a inscrição do usuário na prova e a prova de cada questão.
+O pré-aquecimento (prewarm.py) preenche o Redis antes do início da prova.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.localcache import LocalTTLCache, two_tier_get
+from .models import Participant, Question
+
+PARTICIPANT_KEY = "exam:roster:{exam_id}:{user_id}"
+QUESTION_KEY = "exam:question:{question_id}"
+
+local_roster = LocalTTLCache(ttl=settings.AUTH_PRINCIPAL_CACHE['LOCAL_TTL'])
+
+
+def participant_key(exam_id, user_id):
+    return PARTICIPANT_KEY.format(exam_id=exam_id, user_id=user_id)
+
+
+def question_key(question_id):
+    return QUESTION_KEY.format(question_id=question_id)
+
+
+def entry(participant):
+    return {'id': participant.id, 'snapshot_version': participant.snapshot_version}
+
+
+def participant_for(exam_id, user_id):
+    """Tentativa mais recente do usuário na prova ({'id', 'snapshot_version'}) ou None"""
+    def load():
+        participant = (
+            Participant.objects.filter(exam_id=exam_id, user_id=user_id)
+            .only('id', 'snapshot_version')
+            .order_by('-current_attempt')
+            .first()
+        )
+        return entry(participant) if participant else None
+
+    return two_tier_get(local_roster, cache, participant_key(exam_id, user_id), load,
+                        settings.ROSTER_CACHE_TTL)
+
+
+def question_exam_id(question_id):
+    """Prova à qual a questão pertence, ou None se a questão não existir"""
+    return two_tier_get(
+        local_roster,
+        cache,
+        question_key(question_id),
+        lambda: Question.objects.filter(id=question_id, exam__deleted_at__isnull=True)
+        .values_list('exam_id', flat=True).first(),
+        settings.ROSTER_CACHE_TTL,
+    )
+
+
+def remember(participant):
+    """Chamado na inscrição: o INSERT direto não dispara post_save"""
+    key = participant_key(participant.exam_id, participant.user_id)
+    cache.set(key, entry(participant), settings.ROSTER_CACHE_TTL)
+    local_roster.set(key, entry(participant))
+
+
+def forget(exam_id, user_id):
+    """Descarta a inscrição em cache (nos demais processos, após o TTL local)"""
+    key = participant_key(exam_id, user_id)
+    cache.delete(key)
+    local_roster.delete(key)
+
+
+def warm(exam_id):
+    """Grava no Redis a última tentativa de cada inscrito e o mapa questão -> prova"""
+    latest = {}
+    participants = Participant.objects.filter(exam_id=exam_id).only(
+        'id', 'user_id', 'exam_id', 'snapshot_version').order_by('current_attempt')
+    for participant in participants:
+        latest[participant.user_id] = participant
+    entries = {participant_key(exam_id, user_id): entry(p) for user_id, p in latest.items()}
+    question_ids = list(Question.objects.filter(exam_id=exam_id).values_list('id', flat=True))
+    entries.update({question_key(question_id): exam_id for question_id in question_ids})
+    cache.set_many(entries, settings.ROSTER_CACHE_TTL)
+    return list(latest), list(entries)
+
+
+def forget_exam(exam_id):
+    """Prova excluída: as questões deixam de resolver para ela (nos demais processos, após o TTL local)"""
+    keys = [question_key(question_id)
+            for question_id in Question.objects.filter(exam_id=exam_id).values_list('id', flat=True)]
+    cache.delete_many(keys)
+    for key in keys:
+        local_roster.delete(key)
+
+
+@receiver(post_save, sender=Participant)
+@receiver(post_delete, sender=Participant)
+def forget_participant(sender, instance, **kwargs):
+    forget(instance.exam_id, instance.user_id)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def forget_question(sender, instance, **kwargs):
+    cache.delete(question_key(instance.id))
+    local_roster.delete(question_key(instance.id))
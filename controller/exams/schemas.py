@@ -1,7 +1,7 @@
 # schemas.py
 from ninja import Schema
-from pydantic import Field, validator
-from typing import Optional, List
+from pydantic import Field, model_validator, validator
+from typing import Dict, Optional, List
 from datetime import datetime
 
 # ----------------------------------- Exam Schemas -----------------------------------
@@ -33,6 +33,10 @@ class ExamOut(Schema):
     created_at: datetime
     updated_at: datetime
 
+class ActiveExamsOut(Schema):
+    items: List[ExamOut]
+    count: int
+
 class ExamUpdate(Schema):
     title: Optional[str] = Field(None, min_length=3, max_length=255)
     description: Optional[str] = None
@@ -42,12 +46,44 @@ class ExamUpdate(Schema):
     duration: Optional[int] = Field(None, gt=0)
     max_attempts: Optional[int] = Field(None, gt=0)
 
+# ------------------------------- Snapshot Schemas -------------------------------
+class ExamSnapshotOut(Schema):
+    exam_id: int
+    version: int
+    published_at: datetime
+    question_count: int
+
+class ContentChoiceOut(Schema):
+    id: int
+    text: str
+    order: int
+
+class ContentQuestionOut(Schema):
+    id: int
+    text: str
+    points: int
+    question_type: str
+    choices: List[ContentChoiceOut]
+
+class ExamContentOut(Schema):
+    """Conteúdo publicado da prova, sem gabarito"""
+    exam_id: int
+    version: int
+    title: str
+    description: str
+    duration: int
+    start_time: Optional[datetime]
+    end_time: Optional[datetime]
+    questions: List[ContentQuestionOut]
+
 # -------------------------------- Question Schemas --------------------------------
 class QuestionIn(Schema):
     exam_id: int
     text: str = Field(..., min_length=5)
     points: int = Field(1, gt=0)
     question_type: str = Field('MCQ', pattern=r'^(MCQ|TF|SA)$')
+    numeric_tolerance: Optional[float] = Field(None, ge=0)
+    max_edit_distance: int = Field(1, ge=0, le=3)
 
 class QuestionOut(Schema):
     id: int
@@ -56,6 +92,14 @@ class QuestionOut(Schema):
     points: int
     question_type: str
     explanation: Optional[str]
+    numeric_tolerance: Optional[float]
+    max_edit_distance: int
+
+class RegradeOut(Schema):
+    question_id: int
+    exam_id: int
+    answers: int = Field(..., description="Respostas com a correção alterada")
+    participants: int = Field(..., description="Participantes com a nota alterada")
 
 # --------------------------------- Choice Schemas ---------------------------------
 class ChoiceIn(Schema):
@@ -84,21 +128,77 @@ class ParticipantOut(Schema):
     current_attempt: int
     started_at: Optional[datetime]
     completed_at: Optional[datetime]
+    snapshot_version: Optional[int] = None
+
+class RankedParticipantOut(ParticipantOut):
+    position: int = Field(..., description="RANK() por nota; empates dividem a posição")
+
+class RankingAroundOut(Schema):
+    me: RankedParticipantOut
+    items: List[RankedParticipantOut]
+
+class QuestionTypeSummaryOut(Schema):
+    question_type: str
+    questions: int
+    answered: int
+    correct: int
+    points: float
+    max_points: float
+
+class ParticipantSummaryOut(Schema):
+    participant_id: int
+    user_id: int
+    exam_id: int
+    attempt: int
+    total_questions: int
+    answered: int
+    correct: int
+    wrong: int
+    score: float
+    max_score: float
+    percentile: float = Field(..., description="Percentil da nota na prova (empates contam pela metade)")
+    time_spent: int = Field(..., description="Soma dos tempos de resposta, em segundos")
+    elapsed: Optional[int] = Field(None, description="Segundos entre o início e a conclusão (ou a última resposta)")
+    by_type: List[QuestionTypeSummaryOut]
+
+class DeletionProgressOut(Schema):
+    kind: str
+    object_id: int
+    status: str = Field(..., description="pending, running ou done")
+    deleted: Dict[str, int] = Field(..., description="Linhas removidas por tabela")
+    requested_at: Optional[datetime]
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
 
 # ---------------------------------- Answer Schemas ---------------------------------
 class AnswerIn(Schema):
     question_id: int
-    choice_id: int
+    choice_id: Optional[int] = None
+    text_answer: Optional[str] = Field(None, max_length=1000, description="Resposta de questão SA")
+
+    @model_validator(mode='after')
+    def validate_answer(self):
+        if (self.choice_id is None) == (self.text_answer is None):
+            raise ValueError('Informe choice_id ou text_answer')
+        return self
 
 class AnswerOut(Schema):
     id: int
     participant_id: int
     question_id: int
-    choice_id: int
+    choice_id: Optional[int]
+    text_answer: str
     is_correct: bool
     response_time: int
     answered_at: datetime
 
+class AnswerQueuedOut(Schema):
+    participant_id: int
+    question_id: int
+    choice_id: Optional[int]
+    is_correct: bool
+    status: str = "queued"
+
 # ----------------------------------- Pagination -----------------------------------
 class Pagination(Schema):
     count: int
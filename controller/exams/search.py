@@ -0,0 +1,296 @@
+# search.py
+"""
+Busca de provas por título e descrição com backend plugável
+(settings.EXAM_SEARCH['BACKEND']):
+
+- 'memory': índice invertido no próprio processo com ranking BM25. É
+  atualizado pelos sinais do modelo; os demais processos percebem a
+  mudança pela versão no cache e aplicam o delta do banco na próxima
+  busca. Um snapshot em disco evita reconstruir tudo ao iniciar.
+- 'elasticsearch': o ExamDocument de documents.py, com a mesma interface.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.renderers import dumps
+from .models import Exam
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "exams:search:version"
+SNAPSHOT_FORMAT = 1
+
+TOKEN_RE = re.compile(r'\w+')
+STOPWORDS = frozenset(
+    'a o e é de da do das dos em no na nos nas um uma uns umas para por com sem sobre '
+    'ao aos à às que se ou the of and to in for on'.split()
+)
+
+
+def search_settings():
+    return settings.EXAM_SEARCH
+
+
+def tokenize(text):
+    """Minúsculas, sem acentos, sem stopwords"""
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return [token for token in TOKEN_RE.findall(text) if token not in STOPWORDS]
+
+
+def document_terms(title, description):
+    """Frequência dos termos do documento; o título pesa TITLE_BOOST vezes"""
+    terms = Counter(tokenize(description))
+    for token in tokenize(title):
+        terms[token] += search_settings()['TITLE_BOOST']
+    return terms
+
+
+class InvertedIndex:
+    """Índice invertido termo -> {prova: frequência} com pontuação BM25"""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)
+        self.docs = {}  # prova -> {termo: frequência}
+        self.lengths = {}
+        self.total_length = 0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, doc_id, terms):
+        with self.lock:
+            self.remove(doc_id)
+            self.docs[doc_id] = dict(terms)
+            self.lengths[doc_id] = sum(terms.values())
+            self.total_length += self.lengths[doc_id]
+            for term, tf in terms.items():
+                self.postings[term][doc_id] = tf
+
+    def remove(self, doc_id):
+        with self.lock:
+            terms = self.docs.pop(doc_id, None)
+            if terms is None:
+                return
+            self.total_length -= self.lengths.pop(doc_id)
+            for term in terms:
+                posting = self.postings[term]
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def search(self, query, limit):
+        """[(prova, pontuação)] em ordem decrescente de relevância"""
+        with self.lock:
+            n = len(self.docs)
+            if not n:
+                return []
+            avg_length = self.total_length / n or 1
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+class InvertedIndexBackend:
+    """Índice em memória do processo, sincronizado com o banco sob demanda"""
+
+    def __init__(self, snapshot_path=None):
+        config = search_settings()
+        self.index = InvertedIndex(k1=config['K1'], b=config['B'])
+        self.snapshot_path = Path(snapshot_path or config['SNAPSHOT_PATH'])
+        self.synced_at = None  # updated_at até onde o índice reflete o banco
+        self.seen_version = None
+        self.lock = threading.Lock()
+
+    # Sincronização
+
+    def _load_snapshot(self):
+        try:
+            data = json.loads(self.snapshot_path.read_bytes())
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning(f"Snapshot do índice de busca ignorado: {e}")
+            return False
+        if data.get('format') != SNAPSHOT_FORMAT:
+            return False
+        for doc_id, terms in data['docs'].items():
+            self.index.add(int(doc_id), terms)
+        self.synced_at = parse_datetime(data['synced_at'])
+        return True
+
+    def save_snapshot(self):
+        """Grava o índice em disco (escrita atômica). Retorna o caminho"""
+        with self.index.lock:
+            data = dumps({'format': SNAPSHOT_FORMAT, 'synced_at': self.synced_at, 'docs': self.index.docs})
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.snapshot_path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, self.snapshot_path)
+        return self.snapshot_path
+
+    def _sync(self):
+        """Aplica o delta do banco desde `synced_at` (ou reconstrói tudo)"""
+        # Margem para transações que gravaram updated_at antes de confirmar
+        started_at = timezone.now() - timedelta(seconds=search_settings()['SYNC_OVERLAP'])
+        changed = Exam.objects.only('id', 'title', 'description')
+        if self.synced_at is not None:
+            changed = changed.filter(updated_at__gt=self.synced_at)
+        for exam in changed:
+            self.index.add(exam.id, document_terms(exam.title, exam.description))
+        existing = set(Exam.objects.values_list('id', flat=True))
+        for doc_id in set(self.index.docs) - existing:
+            self.index.remove(doc_id)
+        self.synced_at = started_at
+
+    def ensure_fresh(self):
+        version = current_version()
+        if self.synced_at is not None and version == self.seen_version:
+            return
+        with self.lock:
+            if self.synced_at is None and not self._load_snapshot():
+                self._sync()
+                self.save_snapshot()
+            else:
+                self._sync()
+            self.seen_version = version
+
+    # Interface dos backends
+
+    def search(self, query, limit):
+        self.ensure_fresh()
+        return [doc_id for doc_id, _ in self.index.search(query, limit)]
+
+    def index_exam(self, exam):
+        self.index.add(exam.id, document_terms(exam.title, exam.description))
+
+    def remove_exam(self, exam_id):
+        self.index.remove(exam_id)
+
+    def rebuild(self):
+        with self.lock:
+            self.index = InvertedIndex(k1=self.index.k1, b=self.index.b)
+            self.synced_at = None
+            self._sync()
+            self.seen_version = current_version()
+            self.save_snapshot()
+        return len(self.index)
+
+
+class ElasticsearchBackend:
+    """Busca no Elasticsearch (ExamDocument); o cliente só é importado aqui"""
+
+    def _document(self):
+        from .documents import ExamDocument
+        return ExamDocument
+
+    def search(self, query, limit):
+        search = self._document().search().query(
+            "multi_match", query=query, fields=["title^2", "description"])[:limit]
+        return [int(hit.meta.id) for hit in search.execute()]
+
+    def index_exam(self, exam):
+        self._document()().update(exam)
+
+    def remove_exam(self, exam_id):
+        self._document()().update(Exam(id=exam_id), action='delete', raise_on_error=False)
+
+    def rebuild(self):
+        document = self._document()
+        document._index.delete(ignore=404)
+        document.init()
+        document().update(document().get_indexing_queryset())
+        return Exam.objects.count()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if search_settings()['BACKEND'] == 'elasticsearch':
+                    _backend = ElasticsearchBackend()
+                else:
+                    _backend = InvertedIndexBackend()
+    return _backend
+
+
+def search(query, limit=None):
+    """Ids das provas em ordem de relevância"""
+    config = search_settings()
+    limit = max(1, min(limit or config['MAX_RESULTS'], config['MAX_RESULTS']))
+    return get_backend().search(query, limit)
+
+
+def current_version():
+    """
+    Versão das provas no cache. A chave ausente (antes da primeira gravação,
+    após despejo ou reinício do Redis) é semeada com 0: sem isso cada busca
+    forçaria uma sincronização com o banco.
+    """
+    cache.add(VERSION_KEY, 0, None)
+    return cache.get(VERSION_KEY)
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def invalidate():
+    _bump_version()
+    # De novo no commit: quem sincronizar antes dele lê o banco antigo com a versão nova
+    transaction.on_commit(_bump_version)
+
+
+@receiver(post_save, sender=Exam)
+def index_exam(sender, instance, **kwargs):
+    try:
+        if instance.deleted_at:
+            get_backend().remove_exam(instance.id)
+        else:
+            get_backend().index_exam(instance)
+    except Exception as e:  # noqa: BLE001 - a busca não pode impedir a gravação da prova
+        logger.warning(f"Falha ao indexar a prova {instance.id}: {e}")
+    invalidate()
+
+
+@receiver(post_delete, sender=Exam)
+def remove_exam(sender, instance, **kwargs):
+    try:
+        get_backend().remove_exam(instance.id)
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Falha ao remover a prova {instance.id} do índice: {e}")
+    invalidate()
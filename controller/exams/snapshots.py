@@ -0,0 +1,172 @@
+# snapshots.py
+"""
+Publicação de provas em snapshots versionados e imutáveis.
+
+Publicar congela questões e alternativas num JSON já serializado para o
+candidato (sem `is_correct`) e num gabarito separado. A leitura do
+candidato e a correção usam o snapshot via cache, sem consultar
+Exam/Question/Choice; edições posteriores só valem após nova publicação.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Prefetch
+
+from core.compression import encode_variants, precompressed_response
+from core.localcache import LocalTTLCache, two_tier_get
+from core.renderers import dumps
+from .models import Choice, Exam, ExamSnapshot
+
+SNAPSHOT_KEY = "exam:snapshot:{exam_id}:{version}"
+CURRENT_KEY = "exam:snapshot:{exam_id}:current"
+BODY_KEY = SNAPSHOT_KEY + ":body"
+
+# Snapshots são imutáveis: a cópia na memória do processo nunca fica velha
+local_snapshots = LocalTTLCache(ttl=settings.EXAM_SNAPSHOT_CACHE_TTL, max_entries=512)
+
+
+class SnapshotNotFound(Exception):
+    pass
+
+
+def snapshot_ttl():
+    return settings.EXAM_SNAPSHOT_CACHE_TTL
+
+
+def build(exam):
+    """Retorna (questões como o candidato as vê, gabarito por questão)"""
+    questions = exam.questions.order_by('id').prefetch_related(
+        Prefetch('choices', queryset=Choice.objects.order_by('order', 'id'))
+    )
+    content_questions = []
+    answer_key = {}
+    for question in questions:
+        choices = list(question.choices.all())
+        short_answer = question.question_type == 'SA'
+        content_questions.append({
+            'id': question.id,
+            'text': question.text,
+            'points': question.points,
+            'question_type': question.question_type,
+            # Em SA as alternativas são as respostas aceitas: nunca vão para o candidato
+            'choices': [] if short_answer else [{'id': c.id, 'text': c.text, 'order': c.order} for c in choices],
+        })
+        answer_key[str(question.id)] = {
+            'type': question.question_type,
+            'points': question.points,
+            'choices': [] if short_answer else [c.id for c in choices],
+            'correct': [c.id for c in choices if c.is_correct],
+        }
+        if short_answer:
+            answer_key[str(question.id)].update({
+                'accepted': [c.text for c in choices if c.is_correct],
+                'tolerance': question.numeric_tolerance,
+                'max_edit_distance': question.max_edit_distance,
+            })
+    return content_questions, answer_key
+
+
+def publish(exam, user=None):
+    """Cria a próxima versão do snapshot e a torna a versão publicada (`user`: User ou principal)"""
+    with transaction.atomic():
+        exam = Exam.objects.select_for_update().get(id=exam.id)
+        version = (exam.snapshots.aggregate(last=Max('version'))['last'] or 0) + 1
+        questions, answer_key = build(exam)
+        content = dumps({
+            'exam_id': exam.id,
+            'version': version,
+            'title': exam.title,
+            'description': exam.description,
+            'duration': exam.duration,
+            'start_time': exam.start_time,
+            'end_time': exam.end_time,
+            'questions': questions,
+        })
+        snapshot = ExamSnapshot.objects.create(
+            exam=exam,
+            version=version,
+            content=content,
+            answer_key=answer_key,
+            published_by_id=user.id if user else None,
+        )
+        Exam.objects.filter(id=exam.id).update(published_version=version)
+        transaction.on_commit(lambda: _cache(snapshot))
+    return snapshot
+
+
+def _cache(snapshot):
+    cache.set(
+        SNAPSHOT_KEY.format(exam_id=snapshot.exam_id, version=snapshot.version),
+        {'content': bytes(snapshot.content), 'answer_key': snapshot.answer_key},
+        snapshot_ttl(),
+    )
+    cache.set(CURRENT_KEY.format(exam_id=snapshot.exam_id), snapshot.version, snapshot_ttl())
+
+
+def current_version(exam_id):
+    version = cache.get(CURRENT_KEY.format(exam_id=exam_id))
+    if version is None:
+        version = Exam.objects.filter(id=exam_id).values_list('published_version', flat=True).first()
+        if version is None:
+            raise SnapshotNotFound(exam_id)
+        cache.set(CURRENT_KEY.format(exam_id=exam_id), version, snapshot_ttl())
+    return version
+
+
+def forget_current(exam_id):
+    """Prova excluída: a versão publicada deixa de ser servida"""
+    cache.delete(CURRENT_KEY.format(exam_id=exam_id))
+
+
+def get(exam_id, version):
+    """Snapshot {'content', 'answer_key'}; imutável, por isso o cache não precisa de invalidação"""
+    def load():
+        snapshot = ExamSnapshot.objects.filter(exam_id=exam_id, version=version).first()
+        if snapshot is None:
+            return None
+        return {'content': bytes(snapshot.content), 'answer_key': snapshot.answer_key}
+
+    data = two_tier_get(local_snapshots, cache, SNAPSHOT_KEY.format(exam_id=exam_id, version=version),
+                        load, snapshot_ttl())
+    if data is None:
+        raise SnapshotNotFound(exam_id)
+    return data
+
+
+def question_type(exam_id, version, question_id):
+    """Tipo da questão na versão, ou None se ela não faz parte do snapshot"""
+    entry = get(exam_id, version)['answer_key'].get(str(question_id))
+    return entry.get('type') if entry else None
+
+
+def content_response(exam_id, version):
+    """Corpo do conteúdo para o candidato, com as variantes compactadas em cache"""
+    return precompressed_response(
+        BODY_KEY.format(exam_id=exam_id, version=version),
+        lambda: get(exam_id, version)['content'],
+        timeout=snapshot_ttl(),
+        local=local_snapshots,
+    )
+
+
+def warm(exam_id, version):
+    """Grava no Redis o snapshot, o corpo compactado e a versão atual. Retorna as chaves"""
+    data = get(exam_id, version)
+    entries = {
+        SNAPSHOT_KEY.format(exam_id=exam_id, version=version): data,
+        BODY_KEY.format(exam_id=exam_id, version=version): encode_variants(data['content']),
+        CURRENT_KEY.format(exam_id=exam_id): version,
+    }
+    cache.set_many(entries, snapshot_ttl())
+    return list(entries)
+
+
+def grade(exam_id, version, question_id, choice_id):
+    """
+    Corrige pela chave do snapshot. Retorna (correta, pontos) ou None se a
+    alternativa não pertence à questão nessa versão (em SA nenhuma pertence).
+    """
+    entry = get(exam_id, version)['answer_key'].get(str(question_id))
+    if entry is None or choice_id not in entry['choices']:
+        return None
+    return choice_id in entry['correct'], entry['points']
@@ -0,0 +1,134 @@
+# summary.py
+"""
+Resultado consolidado de uma tentativa numa única consulta agregada:
+totais por tipo de questão (LEFT JOIN das questões da prova com as
+respostas do participante), posição relativa na prova e tempos. O
+resultado fica em cache até a próxima resposta gravada do participante
+(`invalidate`), com TTL limitando a defasagem do percentil.
+"""
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Answer, Participant, Question
+
+SUMMARY_KEY = "participant:summary:{participant_id}"
+
+SUMMARY_SQL = f"""
+WITH me AS (
+    SELECT id, user_id, exam_id, score, current_attempt, started_at, completed_at
+    FROM {Participant._meta.db_table}
+    WHERE id = %(participant_id)s AND deleted_at IS NULL
+),
+standing AS (
+    SELECT COUNT(*) AS participants,
+           COUNT(*) FILTER (WHERE o.score < me.score) AS below,
+           COUNT(*) FILTER (WHERE o.score = me.score) AS tied
+    FROM {Participant._meta.db_table} o
+    JOIN me ON o.exam_id = me.exam_id
+    WHERE o.deleted_at IS NULL
+),
+per_type AS (
+    SELECT q.question_type,
+           COUNT(q.id) AS questions,
+           COALESCE(SUM(q.points), 0) AS max_points,
+           COUNT(a.id) AS answered,
+           COUNT(a.id) FILTER (WHERE a.is_correct) AS correct,
+           COALESCE(SUM(q.points) FILTER (WHERE a.is_correct), 0) AS points,
+           COALESCE(SUM(a.response_time), 0) AS response_time,
+           MAX(a.answered_at) AS last_answered_at
+    FROM {Question._meta.db_table} q
+    JOIN me ON q.exam_id = me.exam_id
+    LEFT JOIN {Answer._meta.db_table} a ON a.question_id = q.id AND a.participant_id = me.id
+    GROUP BY q.question_type
+)
+SELECT me.id, me.user_id, me.exam_id, me.score, me.current_attempt, me.started_at, me.completed_at,
+       standing.participants, standing.below, standing.tied,
+       per_type.question_type, per_type.questions, per_type.max_points, per_type.answered,
+       per_type.correct, per_type.points, per_type.response_time, per_type.last_answered_at
+FROM me
+CROSS JOIN standing
+LEFT JOIN per_type ON TRUE
+ORDER BY per_type.question_type
+"""
+
+
+def _as_datetime(value):
+    # Cursor cru: no SQLite vem texto ou datetime sem fuso, sem os conversores do ORM
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value is not None and timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+def summary_key(participant_id):
+    return SUMMARY_KEY.format(participant_id=participant_id)
+
+
+def compute(participant_id):
+    """Resumo da tentativa ou None se o participante não existir"""
+    with connection.cursor() as cursor:
+        cursor.execute(SUMMARY_SQL, {'participant_id': participant_id})
+        columns = [col[0] for col in cursor.description]
+        records = [dict(zip(columns, record)) for record in cursor.fetchall()]
+    if not records:
+        return None
+
+    first = records[0]
+    by_type = [
+        {
+            'question_type': r['question_type'],
+            'questions': r['questions'],
+            'answered': r['answered'],
+            'correct': r['correct'],
+            'points': r['points'],
+            'max_points': r['max_points'],
+        }
+        for r in records if r['question_type'] is not None
+    ]
+    answered = sum(t['answered'] for t in by_type)
+    correct = sum(t['correct'] for t in by_type)
+    last_answered_at = max(
+        (_as_datetime(r['last_answered_at']) for r in records if r['last_answered_at']), default=None)
+    started_at = _as_datetime(first['started_at'])
+    finished_at = _as_datetime(first['completed_at']) or last_answered_at
+    elapsed = None
+    if started_at and finished_at:
+        elapsed = max(0, int((finished_at - started_at).total_seconds()))
+
+    return {
+        'participant_id': first['id'],
+        'user_id': first['user_id'],
+        'exam_id': first['exam_id'],
+        'attempt': first['current_attempt'],
+        'total_questions': sum(t['questions'] for t in by_type),
+        'answered': answered,
+        'correct': correct,
+        'wrong': answered - correct,
+        'score': first['score'],
+        'max_score': sum(t['max_points'] for t in by_type),
+        # Percentil pelo ponto médio: empatados contam pela metade
+        'percentile': round(100 * (first['below'] + 0.5 * first['tied']) / first['participants'], 2),
+        'time_spent': sum(r['response_time'] for r in records if r['question_type'] is not None),
+        'elapsed': elapsed,
+        'by_type': by_type,
+    }
+
+
+def get(participant_id):
+    data = cache.get(summary_key(participant_id))
+    if data is None:
+        data = compute(participant_id)
+        if data is not None:
+            cache.set(summary_key(participant_id), data, settings.PARTICIPANT_SUMMARY_CACHE_TTL)
+    return data
+
+
+def invalidate(*participant_ids):
+    """Chamado sempre que respostas ou a nota do participante mudam"""
+    cache.delete_many([summary_key(participant_id) for participant_id in participant_ids])
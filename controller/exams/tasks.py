@@ -1,14 +1,27 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+
 from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
 from django.db.models import F, Subquery, OuterRef
 from .models import Participant, Answer
+from . import activation, grading, ingestion, partitions, prewarm, purge, regrade, search, snapshots, summary
+
+# O app Celery não é carregado no import do Django (core/__init__.py);
+# importá-lo aqui garante o broker configurado ao enfileirar tarefas
+from core.celery import app as celery_app  # noqa: F401
 from django.db import models
 import logging
 
 logger = logging.getLogger(__name__)
-__all__ = ['add', 'grade_answers', 'update_ranking']
+__all__ = ['add', 'grade_answers', 'update_ranking', 'ensure_answer_partitions', 'flush_answer_buffer',
+           'prewarm_exams', 'activate_exams', 'snapshot_search_index', 'grade_short_answers',
+           'regrade_question', 'purge_deleted']
 
-@shared_task
+# Não é idempotente (incrementa a nota): confirmação na entrega, sem reexecução
+@shared_task(ignore_result=True)
 def grade_answers(answer_id):
     try:
         # Busca todas as relações necessárias em uma query
@@ -18,11 +31,21 @@ def grade_answers(answer_id):
             'participant'
         ).get(id=answer_id)
         
-        if answer.choice.is_correct:
+        participant = answer.participant
+        if participant.snapshot_version:
+            # Gabarito congelado na publicação, não o conteúdo atual
+            graded = snapshots.grade(participant.exam_id, participant.snapshot_version,
+                                     answer.question_id, answer.choice_id)
+            is_correct, points = graded or (False, 0)
+        else:
+            is_correct, points = answer.choice.is_correct, answer.question.points
+
+        if is_correct:
             # Atualização atômica do score
-            Participant.objects.filter(id=answer.participant.id).update(
-                score=F('score') + answer.question.points
+            Participant.objects.filter(id=participant.id).update(
+                score=F('score') + points
             )
+        summary.invalidate(participant.id)
         update_ranking.delay(answer.participant.exam_id)
         
     except Answer.DoesNotExist as e:
@@ -30,7 +53,7 @@ def grade_answers(answer_id):
     except Exception as e:
         logger.error(f"Erro ao corrigir resposta {answer_id}: {str(e)}")
 
-@shared_task
+@shared_task(ignore_result=True, acks_late=True)
 def update_ranking(exam_id):
     try:
         with transaction.atomic():
@@ -50,6 +73,110 @@ def update_ranking(exam_id):
     except Exception as e:
         logger.error(f"Erro ao atualizar ranking da prova {exam_id}: {str(e)}")
 
+@shared_task(ignore_result=True, acks_late=True)
+def ensure_answer_partitions(months_ahead=3):
+    created = partitions.ensure_answer_partitions(months_ahead)
+    if created:
+        logger.info(f"Partições de respostas criadas: {', '.join(created)}")
+    return created
+
+# Só grava em cache: reexecutar é inofensivo
+@shared_task(ignore_result=True, acks_late=True)
+def prewarm_exams(minutes=None):
+    """Pré-carrega os caches das provas que começam nos próximos minutos"""
+    reports = prewarm.warm_upcoming(minutes)
+    for report in reports:
+        level = logging.WARNING if report['coverage'] < 1 else logging.INFO
+        logger.log(level, f"Prova {report['exam_id']} pré-aquecida: {report['cached']}/{report['keys']} chaves "
+                          f"({report['coverage']:.0%}), {report['participants']} inscritos")
+    return reports
+
+ARMED_KEY = "exams:schedule:armed:{at}"
+
+# Idempotente: reaplicar um limite não altera nada
+@shared_task(ignore_result=True, acks_late=True)
+def activate_exams(rebuild=False):
+    """Aplica os limites de janela vencidos e se agenda para o próximo, se estiver perto"""
+    if rebuild:
+        activation.rebuild()
+    changed, next_at = activation.apply_transitions()
+    if changed:
+        logger.info(f"{changed} prova(s) ativadas/desativadas pela janela")
+    config = settings.EXAM_SCHEDULE
+    if next_at is not None and next_at - time.time() <= config['ARM_WINDOW']:
+        # Um único agendamento por limite, mesmo com várias execuções do beat
+        if cache.add(ARMED_KEY.format(at=next_at), 1, timeout=config['ARM_WINDOW'] * 2):
+            activate_exams.apply_async(eta=datetime.fromtimestamp(next_at, tz=dt_timezone.utc))
+    return changed
+
+@shared_task(ignore_result=True)
+def snapshot_search_index():
+    """Sincroniza o índice de busca em memória e grava o snapshot em disco"""
+    backend = search.get_backend()
+    if isinstance(backend, search.InvertedIndexBackend):
+        backend.ensure_fresh()
+        backend.save_snapshot()
+
+# Reentregas são descartadas pela checagem (participante, questão)
+@shared_task(ignore_result=True, acks_late=True)
+def flush_answer_buffer(max_batches=10):
+    """Grava em lote as respostas do buffer de ingestão e dispara o ranking"""
+    if not ingestion.is_buffered():
+        return 0
+    total = 0
+    affected = set()
+    for _ in range(max_batches):
+        consumed, written, exams = ingestion.flush()
+        total += written
+        affected |= exams
+        if not consumed:
+            break
+    for exam_id in affected:
+        update_ranking.delay(exam_id)
+    return total
+
+# Lotes travados com SKIP LOCKED e marcados como corrigidos: reexecutar é inofensivo
+@shared_task(ignore_result=True, acks_late=True)
+def grade_short_answers(exam_id=None, max_batches=20):
+    """Corrige em lote as respostas curtas (SA) pendentes e dispara o ranking"""
+    graded = 0
+    exams, participants = set(), set()
+    for _ in range(max_batches):
+        stats = grading.grade_pending(exam_id)
+        graded += stats['graded']
+        exams |= stats['exams']
+        participants |= stats['participants']
+        if stats['graded'] < settings.SHORT_ANSWER_GRADING['BATCH_SIZE']:
+            break
+    if participants:
+        summary.invalidate(*participants)
+    for affected in exams:
+        update_ranking.delay(affected)
+    return graded
+
+# Recorrigir de novo não altera nenhuma linha
+@shared_task(ignore_result=True, acks_late=True)
+def regrade_question(question_id):
+    """Recorrige a questão após mudança no gabarito e reconstrói o ranking"""
+    report = regrade.regrade_question(question_id)
+    if report is not None:
+        logger.info(f"Questão {question_id} recorrigida: {report['answers']} respostas e "
+                    f"{report['participants']} notas alteradas")
+    return report
+
+# Cada lote é uma transação e o que já saiu não volta: reexecutar continua de onde parou
+@shared_task(ignore_result=True, acks_late=True)
+def purge_deleted(kind=None, object_id=None):
+    """Remove em lotes o que foi excluído logicamente (um item, ou todos os pendentes)"""
+    targets = [(kind, object_id)] if kind else list(purge.pending())
+    affected = set()
+    for target_kind, target_id in targets:
+        _, exams = purge.purge(target_kind, target_id)
+        affected |= exams
+    for exam_id in affected:
+        update_ranking.delay(exam_id)
+    return len(targets)
+
 @shared_task
 def add(x, y):
     return x + y
\ No newline at end of file
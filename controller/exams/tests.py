@@ -1,5 +1,6 @@
 # tests.py
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
 from ninja.testing import TestClient
 from django.utils import timezone
 from datetime import timedelta
@@ -16,6 +17,10 @@ client = TestClient(router)
 
 class BaseExamTest(TestCase):
     def setUp(self):
+        # Caches sobrevivem ao rollback do TestCase: ids de outros testes
+        from django.core.cache import cache
+        cache.clear()
+        self._clear_local_caches()
         self.admin = User.objects.create_user(username='admin_user', password='adminpass', role='ADMIN')
         self.participant = User.objects.create_user(username='participant_user', password='participantpass', role='PARTICIPANT')
         self.admin_token = self._create_test_token(self.admin)
@@ -49,6 +54,13 @@ class BaseExamTest(TestCase):
         )
         self.participant_obj = None
 
+    def _clear_local_caches(self):
+        from users.principals import local_principals
+        from .roster import local_roster
+        from .snapshots import local_snapshots
+        for local in (local_principals, local_roster, local_snapshots):
+            local.clear()
+
     def _create_test_token(self, user):
         from datetime import datetime, timedelta
         import jwt, os
@@ -277,3 +289,1112 @@ class AuthPermissionTests(BaseExamTest):
         scores = [r['score'] for r in ranking.json()]
         self.assertEqual(scores, [20, 0])
 
+
+
+class AnswerArchiveTests(BaseExamTest):
+    def setUp(self):
+        super().setUp()
+        import tempfile
+        self.tmpdir = tempfile.mkdtemp()
+        self.exam.end_time = timezone.now() - timedelta(days=60)
+        self.exam.save()
+        self.participant_obj = Participant.objects.create(user=self.participant, exam=self.exam)
+        Answer.objects.create(
+            participant=self.participant_obj,
+            question=self.question,
+            choice=self.correct_choice,
+            is_correct=True
+        )
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_archive_moves_answers_and_keeps_them_readable(self):
+        from django.test import override_settings
+        from exams.archive import archive_exam_answers, completed_exams
+
+        with override_settings(ANSWER_ARCHIVE_DIR=self.tmpdir):
+            self.assertIn(self.exam, completed_exams(30))
+            archive = archive_exam_answers(self.exam)
+
+        self.assertEqual(archive.row_count, 1)
+        self.assertFalse(Answer.objects.filter(participant=self.participant_obj).exists())
+        self.assertNotIn(self.exam, completed_exams(30))
+
+        resp = client.get(f"/answers?participant_id={self.participant_obj.id}",
+                          headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 200)
+        items = resp.json()['items']
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]['choice_id'], self.correct_choice.id)
+        self.assertTrue(items[0]['is_correct'])
+
+    def test_answer_partitions(self):
+        from django.db import connection
+        from exams.partitions import ensure_answer_partitions, is_partitioned, partition_name, add_months, month_start
+
+        if connection.vendor != 'postgresql':
+            self.skipTest("Particionamento disponível apenas no PostgreSQL")
+        self.assertTrue(is_partitioned())
+        ensure_answer_partitions(months_ahead=12)
+        future = add_months(month_start(timezone.now()), 12)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [partition_name(future)])
+            self.assertIsNotNone(cursor.fetchone()[0])
+
+
+class BufferedIngestionTests(BaseExamTest):
+    def setUp(self):
+        super().setUp()
+        import tempfile
+        from django.conf import settings
+        from django.core.cache import cache
+        from django.test import override_settings
+
+        cache.clear()
+        self.tmpdir = tempfile.mkdtemp()
+        self.override = override_settings(ANSWER_INGESTION={
+            **settings.ANSWER_INGESTION,
+            'MODE': 'buffered',
+            'BACKEND': 'local',
+            'LOCAL_DIR': self.tmpdir,
+        })
+        self.override.enable()
+        self.participant_obj = Participant.objects.create(user=self.participant, exam=self.exam)
+
+    def tearDown(self):
+        import shutil
+        self.override.disable()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    @patch('exams.tasks.update_ranking.delay')
+    def test_buffered_answer_is_acknowledged_then_flushed(self, mock_ranking):
+        from exams.tasks import flush_answer_buffer
+
+        payload = {'question_id': self.question.id, 'choice_id': self.correct_choice.id}
+        resp = client.post("/answers", json=payload, headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(resp.json()['status'], 'queued')
+        self.assertFalse(Answer.objects.filter(participant=self.participant_obj).exists())
+
+        duplicate = client.post("/answers", json=payload, headers=self._auth_header(self.participant_token))
+        self.assertEqual(duplicate.status_code, 400)
+
+        self.assertEqual(flush_answer_buffer(), 1)
+        self.assertEqual(Answer.objects.filter(participant=self.participant_obj).count(), 1)
+        self.participant_obj.refresh_from_db()
+        self.assertEqual(self.participant_obj.score, self.question.points)
+        mock_ranking.assert_called_once_with(self.exam.id)
+
+    def test_flush_skips_redelivered_answers(self):
+        from exams import ingestion
+
+        Answer.objects.create(participant=self.participant_obj, question=self.question,
+                              choice=self.correct_choice, is_correct=True)
+        ingestion.get_buffer().append({
+            'participant_id': self.participant_obj.id,
+            'question_id': self.question.id,
+            'choice_id': self.correct_choice.id,
+            'is_correct': True,
+            'points': self.question.points,
+            'exam_id': self.exam.id,
+        })
+        consumed, written, _ = ingestion.flush()
+        self.assertEqual((consumed, written), (1, 0))
+        self.assertEqual(ingestion.get_buffer().pending(), 0)
+
+    def test_conflicting_insert_does_not_score_twice(self):
+        from unittest.mock import MagicMock
+        from exams import ingestion
+
+        # Resposta síncrona gravada depois da checagem do consumidor
+        Answer.objects.create(participant=self.participant_obj, question=self.question,
+                              choice=self.correct_choice, is_correct=True)
+        ingestion.get_buffer().append({
+            'participant_id': self.participant_obj.id,
+            'question_id': self.question.id,
+            'choice_id': self.correct_choice.id,
+            'is_correct': True,
+            'points': self.question.points,
+            'exam_id': self.exam.id,
+        })
+        snapshot = MagicMock()
+        snapshot.objects.filter.return_value.values_list.return_value = []
+        with patch('exams.ingestion.Answer', snapshot):
+            consumed, written, exams = ingestion.flush()
+        self.assertEqual((consumed, written, exams), (1, 0, set()))
+        self.participant_obj.refresh_from_db()
+        self.assertEqual(self.participant_obj.score, 0)
+        self.assertEqual(Answer.objects.filter(participant=self.participant_obj).count(), 1)
+
+    def test_answer_is_unique_per_participant_and_question(self):
+        from django.db import IntegrityError
+
+        Answer.objects.create(participant=self.participant_obj, question=self.question,
+                              choice=self.correct_choice, is_correct=True)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Answer.objects.create(participant=self.participant_obj, question=self.question,
+                                  choice=self.wrong_choice, is_correct=False)
+
+    def test_stream_reclaims_entries_of_dead_consumers(self):
+        import json
+        from unittest.mock import MagicMock
+        from exams.ingestion import RedisStreamBuffer
+
+        redis_client = MagicMock()
+        redis_client.xreadgroup.return_value = []
+        entry = {'participant_id': self.participant_obj.id, 'question_id': self.question.id}
+        redis_client.xautoclaim.return_value = [b'0-0', [(b'1-0', {b'data': json.dumps(entry)})], []]
+
+        entries = RedisStreamBuffer(redis_client, 'answers:ingest', 'answer-writers').read('host-2', 100)
+        self.assertEqual(entries, [(b'1-0', entry)])
+        _, kwargs = redis_client.xautoclaim.call_args
+        self.assertEqual(kwargs['min_idle_time'], settings.ANSWER_INGESTION['CLAIM_IDLE_MS'])
+        # Só lê entregas novas quando não há nada pendente para assumir
+        self.assertEqual(redis_client.xreadgroup.call_count, 1)
+
+
+class IdempotencyKeyTests(BaseExamTest):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        from django.urls import reverse
+        cache.clear()
+        self.url = reverse('api:create_exam')
+        self.payload = {'title': 'Prova idempotente', 'description': 'Reenvio', 'duration': 30}
+
+    def _post(self, key, payload=None):
+        import json
+        return self.client.post(
+            self.url,
+            data=json.dumps(payload or self.payload),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {self.admin_token}',
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_first_response(self):
+        first = self._post('retry-1')
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(0):
+            second = self._post('retry-1')
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json()['id'], first.json()['id'])
+        self.assertEqual(Exam.objects.filter(title='Prova idempotente').count(), 1)
+
+    def test_key_reused_with_other_body_is_rejected(self):
+        self.assertEqual(self._post('retry-2').status_code, 201)
+        resp = self._post('retry-2', {**self.payload, 'title': 'Outra prova'})
+        self.assertEqual(resp.status_code, 422)
+
+    def test_transient_responses_are_not_replayed(self):
+        import json
+        from django.http import JsonResponse
+        from django.test import RequestFactory
+        from core.middleware import IdempotencyMiddleware
+
+        responses = iter([JsonResponse({}, status=429), JsonResponse({}, status=409),
+                          JsonResponse({}, status=401), JsonResponse({'id': 1}, status=201)])
+        middleware = IdempotencyMiddleware(lambda request: next(responses))
+
+        def send():
+            return middleware(RequestFactory().post(self.url, data=json.dumps(self.payload),
+                                                    content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-3'))
+
+        # Throttle, lock e token expirado não valem pelas 24h do TTL
+        self.assertEqual([send().status_code for _ in range(4)], [429, 409, 401, 201])
+        replayed = send()
+        self.assertEqual(replayed.status_code, 201)
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+
+
+class SparseFieldsetTests(BaseExamTest):
+    def test_list_exams_returns_only_requested_fields(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = client.get('/exams?fields=id,title')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['items'], [{'id': self.exam.id, 'title': self.exam.title}])
+        select = next(q['sql'] for q in ctx.captured_queries if 'LIMIT' in q['sql'])
+        self.assertNotIn('description', select)
+
+    def test_detail_with_fields(self):
+        resp = client.get(f'/exams/{self.exam.id}?fields=title,duration', headers=self._auth_header(self.admin_token))
+        self.assertEqual(resp.json(), {'title': self.exam.title, 'duration': 60})
+
+    def test_without_fields_returns_full_schema(self):
+        resp = client.get(f'/exams/{self.exam.id}', headers=self._auth_header(self.admin_token))
+        from .schemas import ExamOut
+        self.assertEqual(set(resp.json()), set(ExamOut.model_fields))
+
+    def test_unknown_field_is_rejected(self):
+        resp = client.get('/exams?fields=id,senha')
+        self.assertEqual(resp.status_code, 400)
+
+
+class FastSerializationTests(BaseExamTest):
+    def test_list_fast_path_matches_schema(self):
+        from .schemas import ExamOut
+        resp = client.get('/exams')
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data['count'], 1)
+        item = data['items'][0]
+        self.assertEqual(set(item), set(ExamOut.model_fields))
+        self.assertEqual(item['created_by_id'], self.admin.id)
+        self.assertTrue(item['created_at'].endswith('Z'))
+
+    def test_orjson_renderer_handles_non_native_types(self):
+        from decimal import Decimal
+        from core.renderers import ORJSONRenderer
+        body = ORJSONRenderer().render(None, {'nota': Decimal('9.5'), 'em': self.exam.created_at}, response_status=200)
+        self.assertIn(b'"nota":"9.5"', body)
+
+
+class ContentNegotiationTests(BaseExamTest):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        from django.urls import reverse
+        cache.clear()
+        self.url = reverse('api:list_active_exams')
+        Exam.objects.bulk_create([
+            Exam(title=f'Prova {i}', description='Conteúdo ' * 40, duration=30, created_by=self.admin)
+            for i in range(10)
+        ])
+
+    def test_large_response_is_gzipped_once_and_reused(self):
+        import gzip
+        import json
+        from unittest.mock import patch
+
+        resp = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', resp['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(resp.content))['count'], 11)
+
+        with patch('core.middleware.compress') as middleware_compress:
+            again = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        middleware_compress.assert_not_called()
+        self.assertEqual(again.content, resp.content)
+
+    def test_small_response_is_not_compressed(self):
+        resp = self.client.get(f'{self.url}?fields=id', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(resp.has_header('Content-Encoding'))
+
+    def test_streaming_response_is_compressed(self):
+        import gzip
+        from django.http import StreamingHttpResponse
+        from django.test import RequestFactory
+        from core.middleware import ContentNegotiationMiddleware
+
+        middleware = ContentNegotiationMiddleware(
+            lambda request: StreamingHttpResponse(iter([b'{"a":', b' 1}']), content_type='application/json')
+        )
+        request = RequestFactory().get('/api/exams/export', HTTP_ACCEPT_ENCODING='gzip')
+        resp = middleware(request)
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(resp.streaming_content)), b'{"a": 1}')
+
+    def test_msgpack_when_preferred(self):
+        from core import middleware
+        if middleware.msgpack is None:
+            self.skipTest("msgpack não instalado")
+        resp = self.client.get(self.url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(resp['Content-Type'], 'application/msgpack')
+        self.assertEqual(middleware.msgpack.unpackb(resp.content)['count'], 11)
+
+
+class ExamSnapshotTests(BaseExamTest):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+
+    def _publish(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = client.post(f'/exams/{self.exam.id}/publish', headers=self._auth_header(self.admin_token))
+        self.assertEqual(resp.status_code, 201)
+        return resp.json()
+
+    def test_content_is_frozen_and_hides_answers(self):
+        self.assertEqual(self._publish()['version'], 1)
+        self.question.text = 'Texto editado durante a prova'
+        self.question.save()
+
+        resp = client.get(f'/exams/{self.exam.id}/content', headers=self._auth_header(self.participant_token))
+        content = resp.json()
+        self.assertEqual(content['version'], 1)
+        self.assertEqual(content['questions'][0]['text'], 'Quanto é 2 + 2?')
+        self.assertNotIn('is_correct', content['questions'][0]['choices'][0])
+
+        self.assertEqual(self._publish()['version'], 2)
+        resp = client.get(f'/exams/{self.exam.id}/content', headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.json()['questions'][0]['text'], 'Texto editado durante a prova')
+
+    def test_content_reads_hit_only_the_cache(self):
+        self._publish()
+        url = f'/exams/{self.exam.id}/content'
+        client.get(url, headers=self._auth_header(self.participant_token))
+        # Usuário, prova, questões e alternativas vêm do cache
+        with self.assertNumQueries(0):
+            resp = client.get(url, headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 200)
+
+    def test_unpublished_exam_has_no_content(self):
+        resp = client.get(f'/exams/{self.exam.id}/content', headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_grading_uses_snapshot_answer_key(self):
+        self._publish()
+        participant = Participant.objects.create(user=self.participant, exam=self.exam, snapshot_version=1)
+        # Gabarito alterado depois da publicação não afeta quem está fazendo a prova
+        Choice.objects.filter(id=self.correct_choice.id).update(is_correct=False)
+
+        resp = client.post('/answers', json={'question_id': self.question.id, 'choice_id': self.correct_choice.id},
+                           headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.json()['is_correct'])
+        participant.refresh_from_db()
+        self.assertEqual(participant.score, 10)
+
+
+class RegistrationTests(BaseExamTest):
+    def test_pre_registration_before_start(self):
+        self.exam.start_time = timezone.now() + timedelta(hours=2)
+        self.exam.published_version = 3
+        self.exam.save()
+        # Autenticação + o INSERT da inscrição
+        with self.assertNumQueries(2):
+            resp = client.post('/participants', json={'exam_id': self.exam.id},
+                               headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 201)
+        self.assertIsNone(resp.json()['started_at'])
+        self.assertEqual(resp.json()['snapshot_version'], 3)
+
+    def test_registration_after_start_sets_started_at(self):
+        resp = client.post('/participants', json={'exam_id': self.exam.id},
+                           headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 201)
+        self.assertIsNotNone(resp.json()['started_at'])
+        self.assertEqual(resp.json()['current_attempt'], 1)
+
+    def test_unknown_exam(self):
+        resp = client.post('/participants', json={'exam_id': 999999},
+                           headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 404)
+
+
+class ConcurrentRegistrationTests(TransactionTestCase):
+    def test_simultaneous_registrations_never_fail(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from django.db import connection, connections
+        from .registration import RegistrationError, register
+
+        if connection.vendor != 'postgresql':
+            self.skipTest("Concorrência real exige PostgreSQL")
+        admin = User.objects.create_user(username='reg_admin', password='x', role='ADMIN')
+        user = User.objects.create_user(username='reg_user', password='x', role='PARTICIPANT')
+        exam = Exam.objects.create(title='Pico', description='-', duration=60, max_attempts=2, created_by=admin)
+
+        def attempt(_):
+            try:
+                register(user.id, exam.id)
+                return 'created'
+            except RegistrationError:
+                return 'rejected'
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            outcomes = list(pool.map(attempt, range(16)))
+
+        # Nenhuma exceção (IntegrityError) escapou; tentativas dentro do limite e sem lacunas
+        created = outcomes.count('created')
+        self.assertIn(created, (1, 2))
+        attempts = sorted(Participant.objects.filter(exam=exam).values_list('current_attempt', flat=True))
+        self.assertEqual(attempts, list(range(1, created + 1)))
+
+
+class PrewarmTests(BaseExamTest):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self._clear_local_caches()
+        self.exam.start_time = timezone.now() + timedelta(minutes=5)
+        self.exam.save()
+
+    def _publish_and_register(self):
+        from . import snapshots
+        with self.captureOnCommitCallbacks(execute=True):
+            snapshots.publish(self.exam, user=self.admin)
+        return Participant.objects.create(user=self.participant, exam=self.exam, snapshot_version=1)
+
+    def test_only_exams_starting_inside_the_window(self):
+        from .prewarm import upcoming_exams
+        later = Exam.objects.create(title='Mais tarde', description='-', duration=60, created_by=self.admin,
+                                    start_time=timezone.now() + timedelta(hours=1))
+        ids = list(upcoming_exams(minutes=10).values_list('id', flat=True))
+        self.assertIn(self.exam.id, ids)
+        self.assertNotIn(later.id, ids)
+
+    def test_task_reports_full_coverage(self):
+        from .tasks import prewarm_exams
+        self._publish_and_register()
+        reports = prewarm_exams(minutes=10)
+        report = next(r for r in reports if r['exam_id'] == self.exam.id)
+        self.assertTrue(report['published'])
+        self.assertEqual(report['participants'], 1)
+        self.assertEqual(report['cached'], report['keys'])
+        self.assertEqual(report['coverage'], 1.0)
+
+    def test_first_answer_after_warmup_skips_lookups(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .prewarm import warm_exam
+        participant = self._publish_and_register()
+        warm_exam(self.exam)
+        # Processo web recém-iniciado: nível local vazio, Redis aquecido
+        self._clear_local_caches()
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = client.post('/answers', json={'question_id': self.question.id, 'choice_id': self.correct_choice.id},
+                               headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 200)
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT')]
+        for table in ('users_user', 'exams_question', 'exams_examsnapshot', 'exams_participant'):
+            self.assertFalse([sql for sql in selects if f'FROM "{table}"' in sql], table)
+        participant.refresh_from_db()
+        self.assertEqual(participant.score, 10)
+
+    def test_new_attempt_replaces_cached_roster_entry(self):
+        from .roster import participant_for
+        first = self._publish_and_register()
+        self.assertEqual(participant_for(self.exam.id, self.participant.id)['id'], first.id)
+        resp = client.post('/participants', json={'exam_id': self.exam.id},
+                           headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(participant_for(self.exam.id, self.participant.id)['id'], resp.json()['id'])
+
+    def test_stale_roster_entry_is_not_found(self):
+        from django.db import connection
+        from .roster import participant_for, participant_key
+        participant = self._publish_and_register()
+        self.assertEqual(participant_for(self.exam.id, self.participant.id)['id'], participant.id)
+        # Removido por outro processo sem sinais (DELETE direto da exclusão em lotes)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {Participant._meta.db_table} WHERE id = %s", [participant.id])
+
+        resp = client.post('/answers', json={'question_id': self.question.id, 'choice_id': self.correct_choice.id},
+                           headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 404)
+        self.assertFalse(Answer.objects.filter(participant_id=participant.id).exists())
+        from django.core.cache import cache
+        self.assertIsNone(cache.get(participant_key(self.exam.id, self.participant.id)))
+
+    def test_choice_removed_during_submit_is_not_found(self):
+        from django.db import connection
+        self._publish_and_register()
+        # O snapshot ainda corrige com a alternativa, mas ela já saiu do banco
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {Choice._meta.db_table} WHERE id = %s", [self.correct_choice.id])
+        resp = client.post('/answers', json={'question_id': self.question.id, 'choice_id': self.correct_choice.id},
+                           headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_concurrent_duplicate_is_reported_as_answered(self):
+        from django.db.models.query import QuerySet
+        self._publish_and_register()
+        payload = {'question_id': self.question.id, 'choice_id': self.correct_choice.id}
+        self.assertEqual(client.post('/answers', json=payload,
+                                     headers=self._auth_header(self.participant_token)).status_code, 200)
+        # O outro envio passou pela checagem antes deste gravar: a restrição única decide
+        with patch.object(QuerySet, 'exists', return_value=False):
+            resp = client.post('/answers', json=payload, headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('já respondida', resp.json()['detail'])
+
+    def test_purge_forgets_cached_enrollments(self):
+        from django.core.cache import cache
+        from .purge import purge
+        from .roster import participant_for, participant_key
+        self._publish_and_register()
+        participant_for(self.exam.id, self.participant.id)
+        self.participant.deleted_at = timezone.now()
+        self.participant.save(update_fields=['deleted_at'])
+
+        purge('user', self.participant.id)
+        self.assertIsNone(cache.get(participant_key(self.exam.id, self.participant.id)))
+        self.assertIsNone(participant_for(self.exam.id, self.participant.id))
+
+    def test_principal_cache_holds_no_password(self):
+        from django.core.cache import cache
+        from users.principals import get_principal, principal_key, warm_principals
+        warm_principals([self.participant.id])
+        cached = cache.get(principal_key(self.participant.id))
+        self.assertEqual(set(cached), {'id', 'username', 'role', 'is_active'})
+        self.assertNotIn('password', vars(get_principal(self.participant.id)))
+
+    def test_inactive_user_is_rejected(self):
+        self.participant.is_active = False
+        self.participant.save()
+        resp = client.post('/participants', json={'exam_id': self.exam.id},
+                           headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 401)
+
+    def test_user_changes_invalidate_cached_principal(self):
+        from users.principals import get_principal
+        self.assertEqual(get_principal(self.participant.id).role, 'PARTICIPANT')
+        self.participant.role = 'ADMIN'
+        self.participant.save()
+        self.assertEqual(get_principal(self.participant.id).role, 'ADMIN')
+
+
+@override_settings(EXAM_SCHEDULE={**settings.EXAM_SCHEDULE, 'BACKEND': 'local'})
+class ExamActivationTests(BaseExamTest):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        from .activation import local_index
+        cache.clear()
+        local_index.entries.clear()
+        self.now = timezone.now()
+        self.scheduled = Exam.objects.create(
+            title='Agendada', description='-', duration=60, created_by=self.admin, is_active=False,
+            start_time=self.now + timedelta(hours=1), end_time=self.now + timedelta(hours=2),
+        )
+
+    def _active_titles(self):
+        resp = client.get('/exams/active')
+        self.assertEqual(resp.status_code, 200)
+        return [exam['title'] for exam in resp.json()['items']]
+
+    def test_flips_state_at_window_boundaries(self):
+        from .activation import apply_transitions
+        changed, next_at = apply_transitions(now=self.now + timedelta(minutes=30))
+        self.assertEqual(changed, 0)
+        self.assertEqual(next_at, self.scheduled.start_time.timestamp())
+
+        changed, _ = apply_transitions(now=self.now + timedelta(hours=1, seconds=1))
+        self.assertEqual(changed, 1)
+        self.scheduled.refresh_from_db()
+        self.assertTrue(self.scheduled.is_active)
+
+        apply_transitions(now=self.now + timedelta(hours=2, seconds=1))
+        self.scheduled.refresh_from_db()
+        self.assertFalse(self.scheduled.is_active)
+
+    def test_listing_follows_the_window_not_only_the_flag(self):
+        Exam.objects.filter(id=self.scheduled.id).update(is_active=True)
+        titles = self._active_titles()
+        self.assertIn('Prova de Matemática', titles)
+        self.assertNotIn('Agendada', titles)
+
+    def test_listing_is_a_cache_read_until_a_transition(self):
+        from .activation import apply_transitions
+        first = client.get('/exams/active?limit=1')
+        self.assertEqual(first.json()['count'], 1)
+        with self.assertNumQueries(0):
+            client.get('/exams/active?limit=1')
+
+        with patch('django.utils.timezone.now', return_value=self.now + timedelta(hours=1, seconds=1)):
+            apply_transitions()
+            self.assertIn('Agendada', self._active_titles())
+
+    def test_edits_invalidate_the_active_set(self):
+        self._active_titles()
+        self.exam.title = 'Prova renomeada'
+        self.exam.save()
+        self.assertIn('Prova renomeada', self._active_titles())
+
+    def test_task_arms_itself_once_for_the_next_boundary(self):
+        from .tasks import activate_exams
+        Exam.objects.filter(id=self.scheduled.id).delete()
+        soon = Exam.objects.create(title='Em instantes', description='-', duration=60, created_by=self.admin,
+                                   start_time=timezone.now() + timedelta(seconds=30))
+        with patch.object(activate_exams, 'apply_async') as apply_async:
+            activate_exams()
+            activate_exams()
+        apply_async.assert_called_once()
+        self.assertEqual(apply_async.call_args.kwargs['eta'].timestamp(), soon.start_time.timestamp())
+
+
+class InvertedIndexSearchTests(BaseExamTest):
+    def setUp(self):
+        super().setUp()
+        import tempfile
+        from . import search
+        self.tmp = tempfile.TemporaryDirectory()
+        self.snapshot_path = f'{self.tmp.name}/exams.json'
+        override = override_settings(EXAM_SEARCH={**settings.EXAM_SEARCH, 'BACKEND': 'memory',
+                                                  'SNAPSHOT_PATH': self.snapshot_path})
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(self.tmp.cleanup)
+        search._backend = None
+        self.addCleanup(setattr, search, '_backend', None)
+        Exam.objects.create(title='Álgebra Linear', description='Matrizes e vetores', created_by=self.admin)
+        Exam.objects.create(title='Geometria', description='Formas, vetores e álgebra básica', created_by=self.admin)
+
+    def _titles(self, query):
+        resp = client.get(f'/exams/search?query={query}')
+        self.assertEqual(resp.status_code, 200)
+        return [exam['title'] for exam in resp.json()]
+
+    def test_ranks_title_matches_first_ignoring_accents(self):
+        titles = self._titles('algebra')
+        self.assertEqual(titles[0], 'Álgebra Linear')
+        self.assertEqual(set(titles), {'Álgebra Linear', 'Geometria', 'Prova de Matemática'})
+        self.assertEqual(self._titles('vetores')[0], 'Álgebra Linear')
+        self.assertEqual(self._titles('cálculo'), [])
+
+    def test_index_follows_model_changes(self):
+        self._titles('algebra')
+        exam = Exam.objects.get(title='Geometria')
+        exam.title = 'Geometria Analítica'
+        exam.save()
+        self.assertIn('Geometria Analítica', self._titles('analitica'))
+        exam.delete()
+        self.assertEqual(self._titles('analitica'), [])
+
+    def test_changes_from_other_processes_are_synced(self):
+        from . import search
+        self._titles('algebra')
+        # Gravação em outro processo: sem sinal aqui, só a versão no cache muda
+        Exam.objects.filter(title='Geometria').update(title='Trigonometria', updated_at=timezone.now())
+        search._bump_version()
+        self.assertEqual(self._titles('trigonometria'), ['Trigonometria'])
+
+    def test_version_is_bumped_again_on_commit(self):
+        from . import search
+        exam = Exam.objects.get(title='Geometria')
+        with self.captureOnCommitCallbacks() as callbacks:
+            exam.title = 'Geometria Analítica'
+            exam.save()
+            # Outro processo sincroniza antes do commit e guarda a versão nova
+            seen = search.current_version()
+        for callback in callbacks:
+            callback()
+        self.assertGreater(search.current_version(), seen)
+
+    def test_new_process_starts_from_disk_snapshot(self):
+        from . import search
+        search.get_backend().rebuild()
+        search._backend = None
+        with patch.object(search.InvertedIndexBackend, 'save_snapshot') as save_snapshot:
+            backend = search.get_backend()
+            backend.ensure_fresh()
+        save_snapshot.assert_not_called()
+        self.assertEqual(len(backend.index), Exam.objects.count())
+
+    def test_missing_version_key_syncs_once(self):
+        from django.core.cache import cache
+        from . import search
+        backend = search.get_backend()
+        backend.ensure_fresh()
+        cache.delete(search.VERSION_KEY)  # Despejo ou reinício do Redis
+        with patch.object(backend, '_sync', wraps=backend._sync) as sync:
+            for _ in range(3):
+                backend.ensure_fresh()
+        self.assertEqual(sync.call_count, 1)
+
+
+class RouteCacheTests(BaseExamTest):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_question_edit_purges_cached_listing(self):
+        url = f'/questions?exam_id={self.exam.id}'
+        headers = self._auth_header(self.admin_token)
+        self.assertEqual(client.get(url, headers=headers).json()['items'][0]['text'], 'Quanto é 2 + 2?')
+        with self.assertNumQueries(0):
+            client.get(url, headers=headers)
+
+        resp = client.put(f'/questions/{self.question.id}', json={'exam_id': self.exam.id, 'text': 'Quanto é 3 + 3?',
+                                                                  'points': 10}, headers=headers)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(client.get(url, headers=headers).json()['items'][0]['text'], 'Quanto é 3 + 3?')
+
+    def test_exam_edit_purges_cached_detail(self):
+        url = f'/exams/{self.exam.id}'
+        headers = self._auth_header(self.admin_token)
+        client.get(url, headers=headers)
+        resp = client.put(url, json={'title': 'Prova revisada'}, headers=headers)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(client.get(url, headers=headers).json()['title'], 'Prova revisada')
+
+
+class RankingWindowTests(BaseExamTest):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        start = timezone.now()
+        users = User.objects.bulk_create([User(username=f'ranked_{i}', role='PARTICIPANT') for i in range(20)])
+        # Os dois primeiros empatam em 19; depois 18, 17, ...
+        Participant.objects.bulk_create([
+            Participant(user=user, exam=self.exam, score=19 if i < 2 else 20 - i,
+                        started_at=start + timedelta(seconds=i))
+            for i, user in enumerate(users)
+        ])
+        self.users = users
+
+    def test_top_k_with_shared_positions_on_ties(self):
+        resp = client.get(f'/exams/{self.exam.id}/ranking?top=3')
+        self.assertEqual(resp.status_code, 200)
+        ranking = resp.json()
+        self.assertEqual([r['position'] for r in ranking], [1, 1, 3])
+        self.assertEqual([r['user_id'] for r in ranking[:2]], [self.users[0].id, self.users[1].id])
+
+    def test_around_me_returns_only_the_window(self):
+        me = self.users[10]
+        token = self._create_test_token(me)
+        with self.assertNumQueries(2):  # autenticação + a consulta com RANK() OVER
+            resp = client.get(f'/exams/{self.exam.id}/ranking/me?window=2', headers=self._auth_header(token))
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data['me']['user_id'], me.id)
+        self.assertEqual(data['me']['position'], 11)
+        self.assertEqual([r['position'] for r in data['items']], [9, 10, 11, 12, 13])
+
+    def test_around_me_for_unregistered_user(self):
+        resp = client.get(f'/exams/{self.exam.id}/ranking/me', headers=self._auth_header(self.admin_token))
+        self.assertEqual(resp.status_code, 404)
+
+
+class ParticipantSummaryTests(BaseExamTest):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self.tf = Question.objects.create(exam=self.exam, text='2 é par?', points=5, question_type='TF')
+        self.tf_true = Choice.objects.create(question=self.tf, text='Sim', is_correct=True)
+        Question.objects.create(exam=self.exam, text='Sem resposta', points=3, question_type='TF')
+        self.me = Participant.objects.create(user=self.participant, exam=self.exam,
+                                             started_at=timezone.now() - timedelta(minutes=10))
+        other = User.objects.create_user(username='other_participant', password='x', role='PARTICIPANT')
+        Participant.objects.create(user=other, exam=self.exam, score=100)
+        self.url = f'/participants/{self.me.id}/summary'
+
+    def _answer(self, question, choice):
+        resp = client.post('/answers', json={'question_id': question.id, 'choice_id': choice.id},
+                           headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 200)
+
+    def test_totals_breakdown_and_percentile(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._answer(self.question, self.wrong_choice)
+            self._answer(self.tf, self.tf_true)
+        resp = client.get(self.url, headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual((data['total_questions'], data['answered'], data['correct'], data['wrong']), (3, 2, 1, 1))
+        self.assertEqual((data['score'], data['max_score']), (5, 18))
+        self.assertEqual(data['percentile'], 25.0)
+        self.assertGreaterEqual(data['elapsed'], 600)
+        by_type = {t['question_type']: t for t in data['by_type']}
+        self.assertEqual((by_type['TF']['questions'], by_type['TF']['correct'], by_type['TF']['points']), (2, 1, 5))
+        self.assertEqual((by_type['MCQ']['answered'], by_type['MCQ']['correct']), (1, 0))
+
+    def test_cached_until_next_answer(self):
+        headers = self._auth_header(self.participant_token)
+        with self.assertNumQueries(2):  # autenticação + o agregado
+            client.get(self.url, headers=headers)
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get(self.url, headers=headers).json()['answered'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self._answer(self.tf, self.tf_true)
+        self.assertEqual(client.get(self.url, headers=headers).json()['answered'], 1)
+
+    def test_other_participants_cannot_read(self):
+        other = User.objects.get(username='other_participant')
+        resp = client.get(self.url, headers=self._auth_header(self._create_test_token(other)))
+        self.assertEqual(resp.status_code, 403)
+        resp = client.get(self.url, headers=self._auth_header(self.admin_token))
+        self.assertEqual(resp.status_code, 200)
+
+
+class ShortAnswerGradingTests(BaseExamTest):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self.sa = Question.objects.create(exam=self.exam, text='Capital do Brasil?', points=4, question_type='SA')
+        Choice.objects.create(question=self.sa, text='Brasília', is_correct=True)
+        Choice.objects.create(question=self.sa, text='Distrito Federal', is_correct=True)
+        self.numeric = Question.objects.create(exam=self.exam, text='Valor de pi?', points=2,
+                                               question_type='SA', numeric_tolerance=0.01)
+        Choice.objects.create(question=self.numeric, text='3,1416', is_correct=True)
+        self.me = Participant.objects.create(user=self.participant, exam=self.exam)
+
+    def _submit(self, question, text, token=None):
+        return client.post('/answers', json={'question_id': question.id, 'text_answer': text},
+                           headers=self._auth_header(token or self.participant_token))
+
+    def test_matching_rules(self):
+        from .grading import make_rule, matches, normalize
+        self.assertEqual(normalize('  BRASÍLIA!! '), 'brasilia')
+        rule = make_rule(['Brasília', 'Distrito Federal'], None, 1)
+        self.assertTrue(matches(normalize('brasilia'), rule))
+        self.assertTrue(matches(normalize('Brasilía.'), rule))
+        self.assertTrue(matches(normalize('Brazilia'), rule))  # Um erro de digitação
+        self.assertTrue(matches(normalize('federal, distrito'), rule))
+        self.assertFalse(matches(normalize('Bahia'), rule))
+        self.assertFalse(matches(normalize(''), rule))
+        numeric = make_rule(['3,1416'], 0.01, 1)
+        self.assertTrue(matches(normalize('3.14'), numeric))
+        self.assertFalse(matches(normalize('3.2'), numeric))
+        self.assertFalse(matches(normalize('3.1416'), make_rule(['3'], None, 1)))
+
+    @patch('exams.tasks.update_ranking.delay')
+    @patch('exams.tasks.grade_short_answers.apply_async')
+    def test_submission_is_graded_in_batch(self, mock_apply, mock_ranking):
+        from exams.tasks import grade_short_answers
+        mock_apply.side_effect = lambda kwargs, **options: grade_short_answers(**kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self._submit(self.sa, 'brasilia')
+            self.assertEqual(self._submit(self.numeric, '3,14').status_code, 200)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIsNone(resp.json()['choice_id'])
+        # Um único disparo (debounce) corrigiu as duas após o commit
+        mock_apply.assert_called_once()
+        answers = Answer.objects.filter(participant=self.me)
+        self.assertTrue(all(a.is_correct and a.graded_at for a in answers))
+        self.me.refresh_from_db()
+        self.assertEqual(self.me.score, 6)
+        mock_ranking.assert_called_once_with(self.exam.id)
+
+    def test_choice_answers_are_born_graded(self):
+        from .grading import grade_pending
+        resp = client.post('/answers', json={'question_id': self.question.id, 'choice_id': self.correct_choice.id},
+                           headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 200)
+        self.assertIsNotNone(Answer.objects.get(participant=self.me, question=self.question).graded_at)
+        self.assertEqual(grade_pending(self.exam.id)['graded'], 0)
+
+    def test_rejects_mismatched_answer_kind(self):
+        self.assertEqual(self._submit(self.question, '4').status_code, 400)
+        sa_choice = self.sa.choices.first()
+        resp = client.post('/answers', json={'question_id': self.sa.id, 'choice_id': sa_choice.id},
+                           headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 400)
+        resp = client.post('/answers', json={'question_id': self.sa.id},
+                           headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 422)
+
+    def test_identical_answers_are_evaluated_once(self):
+        from .grading import grade_pending
+        for i in range(6):
+            user = User.objects.create_user(username=f'sa_{i}', password='x', role='PARTICIPANT')
+            participant = Participant.objects.create(user=user, exam=self.exam)
+            Answer.objects.create(participant=participant, question=self.sa,
+                                  text_answer=['Brasília', 'brasilia', 'Recife'][i % 3])
+        stats = grade_pending(self.exam.id)
+        self.assertEqual((stats['graded'], stats['correct'], stats['distinct'], stats['evaluated']), (6, 4, 2, 2))
+
+        user = User.objects.create_user(username='sa_late', password='x', role='PARTICIPANT')
+        late = Participant.objects.create(user=user, exam=self.exam)
+        Answer.objects.create(participant=late, question=self.sa, text_answer='BRASILIA')
+        stats = grade_pending(self.exam.id)
+        self.assertEqual((stats['graded'], stats['evaluated']), (1, 0))  # Resultado veio do cache
+        late.refresh_from_db()
+        self.assertEqual(late.score, 4)
+
+    def test_snapshot_hides_accepted_answers_and_grades_by_its_key(self):
+        from .grading import grade_pending
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f'/exams/{self.exam.id}/publish', headers=self._auth_header(self.admin_token))
+        self.me.snapshot_version = 1
+        self.me.save()
+        content = client.get(f'/exams/{self.exam.id}/content', headers=self._auth_header(self.participant_token))
+        sa_content = next(q for q in content.json()['questions'] if q['id'] == self.sa.id)
+        self.assertEqual(sa_content['choices'], [])
+
+        # Editar o gabarito depois da publicação não muda a correção da versão 1
+        self.sa.choices.update(text='Rio de Janeiro')
+        self.assertEqual(self._submit(self.sa, 'Brasília').status_code, 200)
+        self.assertEqual(grade_pending()['correct'], 1)
+
+    @override_settings(SHORT_ANSWER_GRADING={**settings.SHORT_ANSWER_GRADING, 'POOL_MIN_ANSWERS': 1})
+    def test_process_pool_matches_inline(self):
+        from .grading import evaluate, make_rule
+        rule = make_rule(['Brasília'], None, 1)
+        answers = {'brasilia', 'brazilia', 'recife', 'sao paulo'}
+        pooled, evaluated = evaluate({rule: answers}, processes=2)
+        self.assertEqual(evaluated, 4)
+        self.assertEqual({answer for (_, answer), ok in pooled.items() if ok}, {'brasilia', 'brazilia'})
+
+
+class RegradeTests(BaseExamTest):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self.second = Question.objects.create(exam=self.exam, text='Quanto é 3 + 3?', points=5)
+        self.six = Choice.objects.create(question=self.second, text='6', is_correct=True)
+        self.participants = []
+        for i, (first, second) in enumerate([(self.wrong_choice, self.six), (self.correct_choice, self.six),
+                                             (self.correct_choice, None)]):
+            user = User.objects.create_user(username=f'regrade_{i}', password='x', role='PARTICIPANT')
+            participant = Participant.objects.create(user=user, exam=self.exam)
+            Answer.objects.create(participant=participant, question=self.question, choice=first,
+                                  is_correct=first.is_correct)
+            if second:
+                Answer.objects.create(participant=participant, question=self.second, choice=second, is_correct=True)
+            participant.score = (10 if first.is_correct else 0) + (5 if second else 0)
+            participant.save()
+            self.participants.append(participant)
+
+    def _scores(self):
+        return [Participant.objects.get(id=p.id).score for p in self.participants]
+
+    def _run_inline(self):
+        """Tarefas disparadas após o commit rodam na hora, sem broker"""
+        from exams.tasks import regrade_question
+        regrade = patch('exams.tasks.regrade_question.apply_async',
+                        side_effect=lambda kwargs, **options: regrade_question(**kwargs))
+        ranking = patch('exams.tasks.update_ranking.delay')
+        self.addCleanup(regrade.stop)
+        self.addCleanup(ranking.stop)
+        return regrade.start(), ranking.start()
+
+    def test_fixing_the_correct_choice_regrades_in_bulk(self):
+        self._run_inline()
+        self.assertEqual(self._scores(), [5, 15, 10])
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = client.put(f'/choices/{self.wrong_choice.id}', json={
+                'question_id': self.question.id, 'text': '5', 'is_correct': True},
+                headers=self._auth_header(self.admin_token))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self._scores(), [15, 15, 10])
+
+        self.correct_choice.is_correct = False
+        self.correct_choice.save()
+        # autenticação, questão, UPDATE das respostas, lock dos participantes, UPDATE das notas, savepoint
+        with self.assertNumQueries(6):
+            resp = client.post(f'/questions/{self.question.id}/regrade', headers=self._auth_header(self.admin_token))
+        self.assertEqual(resp.json(), {'question_id': self.question.id, 'exam_id': self.exam.id,
+                                       'answers': 2, 'participants': 2})
+        self.assertEqual(self._scores(), [15, 5, 0])
+
+    def test_points_change_rescores_and_skips_snapshot_participants(self):
+        self._run_inline()
+        frozen = self.participants[2]
+        frozen.snapshot_version = 1
+        frozen.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = client.put(f'/questions/{self.question.id}', json={
+                'exam_id': self.exam.id, 'text': 'Quanto é 2 + 2?', 'points': 20},
+                headers=self._auth_header(self.admin_token))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self._scores(), [5, 25, 10])
+
+        resp = client.post(f'/questions/{self.question.id}/regrade', headers=self._auth_header(self.admin_token))
+        self.assertEqual((resp.json()['answers'], resp.json()['participants']), (0, 0))
+
+    def test_omitted_grading_fields_are_kept(self):
+        regrade, _ = self._run_inline()
+        self.question.numeric_tolerance = 0.5
+        self.question.max_edit_distance = 2
+        self.question.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = client.put(f'/questions/{self.question.id}', json={
+                'exam_id': self.exam.id, 'text': 'Quanto é dois mais dois?'},
+                headers=self._auth_header(self.admin_token))
+        self.assertEqual(resp.status_code, 200)
+        self.question.refresh_from_db()
+        self.assertEqual((self.question.points, self.question.numeric_tolerance, self.question.max_edit_distance),
+                         (10, 0.5, 2))
+        regrade.assert_not_called()
+
+    def test_participants_are_locked_before_rescore(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .regrade import regrade_question
+        if connection.vendor != 'postgresql':
+            self.skipTest("FOR UPDATE só no PostgreSQL")
+        self._run_inline()
+        with CaptureQueriesContext(connection) as ctx:
+            regrade_question(self.question.id)
+        sql = [q['sql'] for q in ctx.captured_queries]
+        lock = next(i for i, q in enumerate(sql) if q.endswith('FOR UPDATE'))
+        rescore = next(i for i, q in enumerate(sql) if 'SET score = totals.score' in q)
+        self.assertLess(lock, rescore)
+
+
+class ChunkedDeletionTests(BaseExamTest):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self.participants = []
+        for i in range(3):
+            user = User.objects.create_user(username=f'purge_{i}', password='x', role='PARTICIPANT')
+            participant = Participant.objects.create(user=user, exam=self.exam)
+            Answer.objects.create(participant=participant, question=self.question, choice=self.correct_choice)
+            self.participants.append(participant)
+
+    @override_settings(PURGE={**settings.PURGE, 'CHUNK_SIZE': 2, 'CHUNK_PAUSE': 0})
+    def test_exam_is_hidden_then_removed_in_chunks(self):
+        from .purge import purge
+        from .models import ExamSnapshot
+        with patch('exams.purge.schedule') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = client.delete(f"/exams/{self.exam.id}", headers=self._auth_header(self.admin_token))
+        self.assertEqual(resp.status_code, 200)
+        schedule.assert_called_once_with('exam', self.exam.id)
+        self.assertFalse(Exam.objects.filter(id=self.exam.id).exists())
+        self.assertTrue(Exam.all_objects.filter(id=self.exam.id).exists())
+        # A questão deixa de resolver para a prova: novas respostas são recusadas
+        resp = client.post('/answers', json={'question_id': self.question.id, 'choice_id': self.correct_choice.id},
+                           headers=self._auth_header(self.participant_token))
+        self.assertEqual(resp.status_code, 404)
+
+        state, _ = purge('exam', self.exam.id)
+        self.assertEqual(state['status'], 'done')
+        self.assertEqual(state['deleted'], {'answers': 3, 'choices': 2, 'participants': 3, 'questions': 1})
+        self.assertFalse(Exam.all_objects.filter(id=self.exam.id).exists())
+        self.assertFalse(Answer.objects.exists())
+        self.assertFalse(ExamSnapshot.objects.exists())
+        self.assertEqual(purge('exam', self.exam.id), (None, set()))
+
+        resp = client.get(f'/deletions/exam/{self.exam.id}', headers=self._auth_header(self.admin_token))
+        self.assertEqual((resp.status_code, resp.json()['status']), (200, 'done'))
+
+    def test_participant_deletion_rebuilds_ranking(self):
+        from exams.tasks import purge_deleted, update_ranking
+        target = self.participants[0]
+        # A remoção e o ranking rodam na hora, sem broker
+        with patch('exams.tasks.purge_deleted.apply_async',
+                   side_effect=lambda kwargs, **options: purge_deleted(**kwargs)), \
+                patch('exams.tasks.update_ranking.delay', side_effect=update_ranking) as ranking:
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = client.delete(f'/participants/{target.id}', headers=self._auth_header(self.admin_token))
+        self.assertEqual(resp.status_code, 200)
+        ranking.assert_called_once_with(self.exam.id)
+        self.assertFalse(Participant.all_objects.filter(id=target.id).exists())
+        self.assertEqual(Answer.objects.count(), 2)
+        ranking = client.get(f'/exams/{self.exam.id}/ranking').json()
+        self.assertNotIn(target.id, [p['id'] for p in ranking])
+
+    def test_user_deletion_blocks_login_and_reserves_username(self):
+        from django.contrib.auth import authenticate
+        from .purge import purge, soft_delete
+        user = self.participants[1].user
+        with patch('exams.purge.schedule'):
+            with self.captureOnCommitCallbacks(execute=True):
+                soft_delete(user)
+        self.assertFalse(User.objects.filter(id=user.id).exists())
+        self.assertIsNone(authenticate(username=user.username, password='x'))
+
+        state, affected = purge('user', user.id)
+        self.assertEqual(state['deleted'], {'answers': 1, 'participants': 1})
+        self.assertEqual(affected, {self.exam.id})
+        self.assertFalse(User.all_objects.filter(id=user.id).exists())
@@ -1,4 +1,5 @@
-from ninja import Router
+from ninja import Router, File
+from ninja.files import UploadedFile
 from ninja.security import HttpBearer
 from ninja.pagination import paginate
 from ninja.errors import ValidationError
@@ -6,28 +7,31 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import make_password
 from django.shortcuts import get_object_or_404
 from typing import List
-from .pagination import CustomPagination
+from django.conf import settings
+from core.throttling import IPTokenBucket, UsernameTokenBucket, shed_when_busy
+from core.fieldsets import parse_fields, project, rows, sparse_schema
+from core.renderers import fast_response
+from .pagination import CustomPagination, EstimatedCountPagination
+from . import provisioning
 import jwt
-from datetime import datetime, timedelta
 from typing import Optional
-import os
 
 from .models import User
+from . import principals, tokens
+from .tokens import SECRET_KEY, ALGORITHM
 from .schemas import (
     UserCreate,
     UserOut,
     UserUpdate,
     LoginCredentials,
+    RefreshIn,
     TokenOut,
+    ProvisioningJobOut,
     ErrorResponse
 )
 
 router = Router(tags=["Users"])
 
-# Configurações JWT
-SECRET_KEY = os.getenv("SECRET_KEY", "fallback-secret-key-123")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 3  # 3 horas
 
 # ✅ AuthBearer usando HttpBearer com fallback seguro
 class AuthBearer(HttpBearer):
@@ -37,28 +41,48 @@ class AuthBearer(HttpBearer):
 
         try:
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            if payload.get("type") == "refresh":
+                return None  # Refresh token só serve para /refresh
             user_id = payload.get("sub")
-            user = User.objects.get(id=user_id)
+            # Processo -> Redis -> banco (pré-carregado antes do início das provas)
+            user = principals.get_principal(user_id)
+            if user is None or not user.is_active:
+                return None
             request.auth = user
             return user
-        except (jwt.ExpiredSignatureError, jwt.DecodeError, User.DoesNotExist):
+        except (jwt.ExpiredSignatureError, jwt.DecodeError):
             return None
 
-@router.post("/login", response={200: TokenOut, 401: dict})
+@router.post("/login", response={200: TokenOut, 401: dict},
+             throttle=[IPTokenBucket('login_ip'), UsernameTokenBucket('login_user')])
+@shed_when_busy(settings.LOGIN_MAX_CONCURRENCY)
 def login(request, credentials: LoginCredentials):
-    """Login e retorno de token JWT"""
+    """Login e retorno do par de tokens JWT (access + refresh)"""
     if user := authenticate(username=credentials.username, password=credentials.password):
-        token = jwt.encode(
-            {
-                "sub": str(user.id),
-                "exp": datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-            },
-            SECRET_KEY,
-            algorithm=ALGORITHM
-        )
-        return {"token": token, "token_type": "bearer"}
+        return tokens.issue_tokens(user.id)
     return 401, {"detail": "Credenciais inválidas"}
 
+@router.post("/refresh", response={200: TokenOut, 401: dict})
+def refresh(request, payload: RefreshIn):
+    """Renova o access token a partir do refresh token (rotação + blacklist)"""
+    try:
+        claims, new_tokens = tokens.rotate(payload.refresh)
+    except tokens.TokenError as e:
+        return 401, {"detail": str(e)}
+    if not User.objects.filter(id=claims["sub"], is_active=True).exists():
+        return 401, {"detail": "Usuário inativo ou inexistente"}
+    return new_tokens
+
+@router.post("/logout", response={200: dict, 401: dict})
+def logout(request, payload: RefreshIn):
+    """Revoga o refresh token"""
+    try:
+        claims = tokens.decode_refresh(payload.refresh)
+    except tokens.TokenError as e:
+        return 401, {"detail": str(e)}
+    tokens.blacklist(claims)
+    return 200, {"detail": "Sessão encerrada"}
+
 @router.post("/register", response={201: UserOut, 400: dict, 422: dict})
 def register(request, user_data: UserCreate):
     """Registro de novo usuário"""
@@ -79,7 +103,8 @@ def register(request, user_data: UserCreate):
         "created_at": user.date_joined
     }"""
     try:
-        if User.objects.filter(username=user_data.username).exists():
+        # Inclui os excluídos ainda não removidos: o username continua reservado
+        if User.all_objects.filter(username=user_data.username).exists():
             return 400, {"detail": "Nome de usuário já existe"}
         
         user = User.objects.create(
@@ -92,10 +117,37 @@ def register(request, user_data: UserCreate):
         # Retorna 422 para erros de validação do Pydantic
         return 422, {"detail": str(e)}
 
-@router.get("/users", response={200: List[UserOut], 403: ErrorResponse}, auth=AuthBearer())
-@paginate
+@router.post("/users/bulk", response={202: ProvisioningJobOut, 400: ErrorResponse, 403: ErrorResponse},
+             auth=AuthBearer())
+def bulk_provision_users(request, file: UploadedFile = File(...)):
+    """
+    Cadastro em massa a partir de CSV ou JSONL (apenas admin). O cadastro
+    roda num worker Celery; acompanhe em /users/bulk/{job_id}. Para arquivos
+    muito grandes use o comando `provision_users`.
+    """
+    if request.auth.role != "ADMIN":
+        return 403, {"detail": "Permissão negada"}
+    if file.size > settings.PROVISIONING_JOBS['MAX_UPLOAD_BYTES']:
+        return 400, {"detail": "Arquivo grande demais: use o comando provision_users"}
+    return 202, provisioning.enqueue(file.read(), file.name or '')
+
+@router.get("/users/bulk/{job_id}", response={200: ProvisioningJobOut, 403: ErrorResponse, 404: ErrorResponse},
+            auth=AuthBearer())
+def bulk_provision_status(request, job_id: str):
+    """Andamento e relatório de um cadastro em massa (apenas admin)"""
+    if request.auth.role != "ADMIN":
+        return 403, {"detail": "Permissão negada"}
+    job = provisioning.get_job(job_id)
+    if job is None:
+        return 404, {"detail": "Job não encontrado ou expirado"}
+    return job
+
+@router.get("/users", response={200: List[sparse_schema(UserOut)], 403: ErrorResponse},
+            exclude_unset=True, auth=AuthBearer())
+@fast_response
+@paginate(EstimatedCountPagination)
 def list_users(request, search: Optional[str] = None, role: Optional[str] = None,
-               is_active: Optional[bool] = None):
+               is_active: Optional[bool] = None, fields: Optional[str] = None):
     """Lista usuários (apenas admin)"""
     if request.auth.role != "ADMIN":
         # return 403, {"detail": "Permissão negada"}
@@ -111,15 +163,17 @@ def list_users(request, search: Optional[str] = None, role: Optional[str] = None
         queryset = queryset.filter(is_active=is_active)
     
     
-    return  queryset
+    return rows(queryset, UserOut, parse_fields(fields, UserOut))
     # return queryset.order_by('username')
     # return paginate(CustomPagination(), queryset.order_by('username'), request)
 
 
-@router.get("/users/{user_id}", response={200: UserOut, 403: dict}, auth=AuthBearer())
-def get_user(request, user_id: int):
+@router.get("/users/{user_id}", response={200: sparse_schema(UserOut), 403: dict},
+            exclude_unset=True, auth=AuthBearer())
+def get_user(request, user_id: int, fields: Optional[str] = None):
     """Obtém dados de um usuário"""
-    user = get_object_or_404(User, id=user_id)
+    fields = parse_fields(fields, UserOut)
+    user = get_object_or_404(project(User.objects.filter(id=user_id), UserOut, fields))
     if request.auth.id != user_id and request.auth.role != "ADMIN":
         return 403, {"detail": "Permissão negada"}
     return user
@@ -150,7 +204,9 @@ def delete_user(request, user_id: int):
             return 403, {"detail": "Permissão negada"}
 
         user = get_object_or_404(User, id=user_id)
-        user.delete()
+        # Import tardio: participações e provas do usuário são removidas pelo app de provas
+        from exams import purge
+        purge.soft_delete(user)
         return 200, {"detail": "Usuário excluído com sucesso"}
     except User.DoesNotExist:
         return 404, {"detail": "Usuário não encontrado"}
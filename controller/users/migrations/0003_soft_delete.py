@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:08
+
+import django.contrib.auth.models
+import users.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_remove_user_groups_remove_user_user_permissions_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', users.models.UserManager()),
+                ('all_objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, help_text='Exclusão lógica; os dados são removidos em segundo plano', null=True),
+        ),
+    ]
@@ -1,5 +1,12 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+
+from core.softdelete import AliveManagerMixin
+
+
+class UserManager(AliveManagerMixin, BaseUserManager):
+    """Esconde os usuários excluídos (inclusive do login)"""
+
 
 class User(AbstractUser):
     ADMIN = 'ADMIN'
@@ -14,6 +21,11 @@ class User(AbstractUser):
     date_joined = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
     last_login = models.DateTimeField(null=True, blank=True)
+    deleted_at = models.DateTimeField(
+        null=True, blank=True, help_text="Exclusão lógica; os dados são removidos em segundo plano")
+
+    objects = UserManager()
+    all_objects = BaseUserManager()
 
     groups = None
     user_permissions = None
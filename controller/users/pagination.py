@@ -1,6 +1,12 @@
-from ninja.pagination import PaginationBase
+from ninja.pagination import PaginationBase, LimitOffsetPagination
 from ninja.schema import Schema
-from typing import Any
+from typing import Any, List
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import QuerySet
+import hashlib
+import json
 
 # pagination.py
 class CustomPagination(PaginationBase):
@@ -30,4 +36,74 @@ class CustomPagination(PaginationBase):
             "page": page,
             "per_page": per_page,
             "items": items,
-        }
\ No newline at end of file
+        }
+
+
+def planner_estimate(queryset):
+    """
+    Estimativa de linhas do PostgreSQL: `pg_class.reltuples` para a tabela
+    inteira ou a estimativa do EXPLAIN para querysets filtrados.
+    """
+    connection = connections[queryset.db]
+    queryset = queryset.order_by()
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            # reltuples = -1 quando a tabela ainda não foi analisada
+            if row and row[0] >= 0:
+                return row[0]
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def cached_count(queryset, timeout):
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.sha1(f"{queryset.db}:{sql}:{params}".encode()).hexdigest()
+    return cache.get_or_set(f"pagination:count:{digest}", queryset.count, timeout)
+
+
+def count_items(queryset):
+    """
+    Retorna (total, aproximado). Conta exato abaixo de EXACT_THRESHOLD;
+    acima dele usa a estimativa do planner ou uma contagem em cache.
+    """
+    if not isinstance(queryset, QuerySet):
+        return len(queryset), False
+
+    config = settings.PAGINATION_COUNT
+    if config['STRATEGY'] == 'exact' or connections[queryset.db].vendor != 'postgresql':
+        return queryset.count(), False
+
+    estimate = planner_estimate(queryset)
+    if estimate < config['EXACT_THRESHOLD']:
+        return queryset.count(), False
+    if config['STRATEGY'] == 'cached':
+        return cached_count(queryset, config['CACHE_TTL']), True
+    return estimate, True
+
+
+class EstimatedCountPagination(LimitOffsetPagination):
+    """LimitOffset com `count` estimado em listas grandes (ver count_items)"""
+
+    class Output(Schema):
+        items: List[Any]
+        count: int
+        count_is_estimate: bool = False
+
+    def paginate_queryset(self, queryset, pagination, **params):
+        offset = pagination.offset
+        limit = min(pagination.limit, self.max_limit)
+        count, is_estimate = count_items(queryset)
+        return {
+            "items": queryset[offset:offset + limit],
+            "count": count,
+            "count_is_estimate": is_estimate,
+        }
@@ -0,0 +1,56 @@
+# principals.py
+"""
+Cache dos usuários autenticados (principals) usado pelo AuthBearer:
+memória do processo -> Redis -> banco. Alterações no usuário invalidam as
+entradas (sinais abaixo); nos demais processos o TTL local limita o atraso.
+
+O cache guarda só o necessário para autorizar (PRINCIPAL_FIELDS), nunca a
+instância do User: o hash da senha não vai para o Redis nem circula entre
+processos.
+"""
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.localcache import LocalTTLCache, two_tier_get
+from .models import User
+
+PRINCIPAL_KEY = "auth:principal:v2:{user_id}"  # v2: dicionário mínimo (v1 guardava o User)
+PRINCIPAL_FIELDS = ('id', 'username', 'role', 'is_active')
+
+local_principals = LocalTTLCache(ttl=settings.AUTH_PRINCIPAL_CACHE['LOCAL_TTL'])
+
+
+def principal_key(user_id):
+    return PRINCIPAL_KEY.format(user_id=user_id)
+
+
+def get_principal(user_id):
+    """Principal (id, username, role, is_active) pelo id, ou None se o usuário não existir"""
+    data = two_tier_get(
+        local_principals,
+        cache,
+        principal_key(user_id),
+        lambda: User.objects.filter(id=user_id).values(*PRINCIPAL_FIELDS).first(),
+        settings.AUTH_PRINCIPAL_CACHE['TTL'],
+    )
+    # Objeto novo a cada chamada: o dicionário em cache é compartilhado entre requisições
+    return SimpleNamespace(**data) if data is not None else None
+
+
+def warm_principals(user_ids):
+    """Carrega os usuários no Redis numa única consulta. Retorna quantos foram carregados"""
+    users = User.objects.filter(id__in=list(user_ids)).values(*PRINCIPAL_FIELDS)
+    entries = {principal_key(user['id']): user for user in users}
+    cache.set_many(entries, settings.AUTH_PRINCIPAL_CACHE['TTL'])
+    return len(entries)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_principal(sender, instance, **kwargs):
+    cache.delete(principal_key(instance.id))
+    local_principals.delete(principal_key(instance.id))
@@ -0,0 +1,227 @@
+# provisioning.py
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from pydantic import ValidationError
+
+from .models import User
+from .schemas import UserCreate
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+INSERT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+JOB_KEY = "provisioning:job:{job_id}"
+UPLOAD_KEY = "provisioning:upload:{job_id}"
+CLAIM_KEY = "provisioning:claim:{job_id}"
+
+
+def _init_worker(settings_module):
+    # Processos iniciados com "spawn" precisam configurar o Django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def _can_fork():
+    # Filhos do prefork do Celery são daemônicos e não podem criar processos
+    return not multiprocessing.current_process().daemon
+
+
+def read_rows(fileobj, fmt):
+    """Lê linhas CSV (com cabeçalho) ou JSONL como dicionários"""
+    if isinstance(fileobj.read(0), bytes):
+        # UploadedFile do Django expõe o arquivo binário em `.file`
+        fileobj = io.TextIOWrapper(getattr(fileobj, 'file', fileobj), encoding='utf-8')
+    if fmt == 'csv':
+        yield from csv.DictReader(fileobj)
+    elif fmt == 'jsonl':
+        for line in fileobj:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError(f"Formato não suportado: {fmt}")
+
+
+def detect_format(filename):
+    return 'jsonl' if filename.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+class Provisioner:
+    """
+    Cria usuários em massa: valida as linhas, resolve conflitos de username
+    com uma consulta por lote, gera os hashes de senha num pool de processos
+    e insere com `bulk_create`.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.created = 0
+        self.conflicts = 0
+        self.invalid = 0
+        self.errors = []
+        self._seen = set()
+        self._pool = None
+
+    def __enter__(self):
+        if self.workers > 1 and _can_fork():
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'core.settings'),),
+            )
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool:
+            self._pool.shutdown()
+
+    def _error(self, line, username, detail):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "username": username, "detail": detail})
+
+    def _hash(self, passwords):
+        if self._pool is None:
+            return [make_password(p) for p in passwords]
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self._pool.map(make_password, passwords, chunksize=chunksize))
+
+    def _existing(self, usernames):
+        return set(User.all_objects.filter(username__in=usernames).values_list('username', flat=True))
+
+    def provision(self, rows):
+        rows = enumerate(rows, start=1)
+        while chunk := list(islice(rows, CHUNK_SIZE)):
+            self._provision_chunk(chunk)
+        return self.report()
+
+    def _provision_chunk(self, chunk):
+        valid = []
+        for line, row in chunk:
+            try:
+                user = UserCreate(**row)
+            except (ValidationError, TypeError) as e:
+                self.invalid += 1
+                self._error(line, row.get('username') if isinstance(row, dict) else None, str(e))
+                continue
+            if user.username in self._seen:
+                self.conflicts += 1
+                self._error(line, user.username, "Username repetido no arquivo")
+                continue
+            self._seen.add(user.username)
+            valid.append((line, user))
+
+        existing = self._existing([user.username for _, user in valid])
+        pending = []
+        for line, user in valid:
+            if user.username in existing:
+                self.conflicts += 1
+                self._error(line, user.username, "Nome de usuário já existe")
+            else:
+                pending.append(user)
+
+        hashes = self._hash([user.password for user in pending])
+        users = [
+            User(username=user.username, password=hashed, role=user.role)
+            for user, hashed in zip(pending, hashes)
+        ]
+        for start in range(0, len(users), INSERT_BATCH_SIZE):
+            self._insert(users[start:start + INSERT_BATCH_SIZE])
+
+    def _insert(self, batch):
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(batch)
+            self.created += len(batch)
+        except IntegrityError:
+            # Cadastro concorrente entre a checagem e a inserção
+            taken = self._existing([user.username for user in batch])
+            remaining = [user for user in batch if user.username not in taken]
+            self.conflicts += len(batch) - len(remaining)
+            if remaining:
+                with transaction.atomic():
+                    User.objects.bulk_create(remaining)
+                self.created += len(remaining)
+
+    def report(self):
+        return {
+            "created": self.created,
+            "conflicts": self.conflicts,
+            "invalid": self.invalid,
+            "errors": self.errors,
+        }
+
+
+def provision_users(rows, workers=None):
+    with Provisioner(workers) as provisioner:
+        return provisioner.provision(rows)
+
+
+# --------------------------- Jobs (API -> Celery) ---------------------------
+# A API não gera hashes: o arquivo vai para o cache (compartilhado com os
+# workers, que não veem o disco do web) e a tarefa `provision_users_job` faz
+# o cadastro com o pool de processos do worker.
+
+def _save_job(job):
+    cache.set(JOB_KEY.format(job_id=job['job_id']), job, settings.PROVISIONING_JOBS['TTL'])
+    return job
+
+
+def get_job(job_id):
+    """Andamento do job ou None se não existir/expirou"""
+    return cache.get(JOB_KEY.format(job_id=job_id))
+
+
+def enqueue(content, filename):
+    """Guarda o arquivo enviado e enfileira o cadastro. Retorna o job"""
+    job_id = uuid.uuid4().hex
+    ttl = settings.PROVISIONING_JOBS['TTL']
+    cache.set(UPLOAD_KEY.format(job_id=job_id), content, ttl)
+    job = _save_job({'job_id': job_id, 'status': 'queued', 'filename': filename,
+                     'requested_at': timezone.now(), 'started_at': None, 'finished_at': None,
+                     'report': None, 'detail': None})
+
+    # Import tardio: o processo web não carrega o Celery no import
+    from .tasks import provision_users_job
+
+    provision_users_job.apply_async(kwargs={'job_id': job_id})
+    return job
+
+
+def run_job(job_id, workers=None):
+    """Processa o arquivo do job e grava o relatório. Retorna o job, ou None se sumiu do cache"""
+    job = get_job(job_id)
+    content = cache.get(UPLOAD_KEY.format(job_id=job_id))
+    if job is None or content is None or job['status'] != 'queued':
+        return job
+    # Só uma entrega tira o job de 'queued' (reentregas concorrentes desistem aqui)
+    if not cache.add(CLAIM_KEY.format(job_id=job_id), 1, settings.PROVISIONING_JOBS['TTL']):
+        return job
+    _save_job({**job, 'status': 'running', 'started_at': timezone.now()})
+    try:
+        rows = read_rows(io.BytesIO(content), detect_format(job['filename']))
+        job = {**job, 'status': 'done', 'report': provision_users(rows, workers=workers)}
+    except (ValueError, UnicodeDecodeError) as e:
+        job = {**job, 'status': 'failed', 'detail': f"Arquivo inválido: {e}"}
+    except Exception as e:
+        # Qualquer falha encerra o job: nunca fica em 'running' para sempre
+        logger.exception(f"Cadastro em massa {job_id} falhou")
+        job = {**job, 'status': 'failed', 'detail': f"Erro no cadastro: {e}"}
+    finally:
+        cache.delete(UPLOAD_KEY.format(job_id=job_id))
+    logger.info(f"Cadastro em massa {job_id}: {job['status']} {job['report'] or job['detail']}")
+    return _save_job({**job, 'finished_at': timezone.now()})
@@ -1,7 +1,7 @@
 from enum import Enum
 from ninja import Schema
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List
 from pydantic import validator, field_validator, ConfigDict
 
 class UserRole(str, Enum):
@@ -64,9 +64,35 @@ class LoginCredentials(Schema):
     username: str
     password: str
 
+class RefreshIn(Schema):
+    refresh: str
+
 class TokenOut(Schema):
     token: str
     token_type: str = "bearer"
+    refresh: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class ProvisioningError(Schema):
+    line: int
+    username: Optional[str] = None
+    detail: str
+
+class BulkProvisionOut(Schema):
+    created: int
+    conflicts: int
+    invalid: int
+    errors: List[ProvisioningError]
+
+class ProvisioningJobOut(Schema):
+    job_id: str
+    status: str  # queued, running, done ou failed
+    filename: str
+    requested_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    report: Optional[BulkProvisionOut] = None
+    detail: Optional[str] = None
 
 class ErrorResponse(Schema):
     detail: str
@@ -0,0 +1,19 @@
+# tasks.py
+from celery import shared_task
+from django.conf import settings
+
+from . import provisioning
+
+# O app Celery não é carregado no import do Django (core/__init__.py);
+# importá-lo aqui garante o broker configurado ao enfileirar tarefas
+from core.celery import app as celery_app  # noqa: F401
+
+__all__ = ['provision_users_job']
+
+
+# O job só sai de 'queued' uma vez: reentregas não cadastram de novo
+@shared_task(ignore_result=True)
+def provision_users_job(job_id):
+    """Cadastro em massa enviado pela API (hashes no pool de processos do worker)"""
+    job = provisioning.run_job(job_id, workers=settings.PROVISIONING_WORKERS)
+    return job and job['status']
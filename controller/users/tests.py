@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from django.test import TestCase
 from ninja.testing import TestClient
 from django.contrib.auth.hashers import check_password
+from unittest.mock import patch
 
 from .models import User
 from .api import router, AuthBearer, SECRET_KEY, ALGORITHM
@@ -203,4 +204,290 @@ class UserAPITests(TestCase):
     
     def test_access_without_token(self):
         response = self.client.get("/users")
-        self.assertEqual(response.status_code, 401)
\ No newline at end of file
+        self.assertEqual(response.status_code, 401)
+
+class LoginRateLimitTests(TestCase):
+    def setUp(self):
+        from core.throttling import local_buckets
+        local_buckets.clear()
+        self.client = TestClient(router)
+        User.objects.create_user(username="ratelimited", password="somepass123", role="PARTICIPANT")
+
+    def test_login_is_throttled_per_username(self):
+        from django.test import override_settings
+        from django.conf import settings
+
+        limits = {**settings.RATE_LIMITS, 'login_user': {'rate': '2/m', 'burst': 2}}
+        with override_settings(RATE_LIMIT_BACKEND='local', RATE_LIMITS=limits):
+            for _ in range(2):
+                response = self.client.post("/login", json={"username": "ratelimited", "password": "wrong"})
+                self.assertEqual(response.status_code, 401)
+            response = self.client.post("/login", json={"username": "ratelimited", "password": "somepass123"})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+
+    def test_token_bucket_refills(self):
+        from core.throttling import LocalBuckets
+
+        buckets = LocalBuckets()
+        self.assertEqual(buckets.take("k", capacity=1, rate=1000)[0], True)
+        allowed, wait = buckets.take("k", capacity=1, rate=0.5)
+        self.assertFalse(allowed)
+        self.assertGreater(wait, 0)
+
+
+class RefreshTokenTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from core.throttling import local_buckets
+        cache.clear()
+        local_buckets.clear()  # Sem Redis o limite de login por usuário fica no processo
+        self.client = TestClient(router)
+        self.user = User.objects.create_user(username="refresher", password="refreshpass", role="PARTICIPANT")
+        response = self.client.post("/login", json={"username": "refresher", "password": "refreshpass"})
+        self.tokens = response.json()
+
+    def test_login_returns_refresh_token(self):
+        self.assertIn("refresh", self.tokens)
+        self.assertEqual(self.tokens["expires_in"], 15 * 60)
+
+    @patch('users.api.authenticate')
+    def test_refresh_rotates_without_password_check(self, mock_authenticate):
+        response = self.client.post("/refresh", json={"refresh": self.tokens["refresh"]})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertNotEqual(data["refresh"], self.tokens["refresh"])
+        mock_authenticate.assert_not_called()
+
+        me = self.client.get(f"/users/{self.user.id}", headers={"Authorization": f"Bearer {data['token']}"})
+        self.assertEqual(me.status_code, 200)
+
+        # O refresh token rotacionado não pode ser reutilizado
+        reused = self.client.post("/refresh", json={"refresh": self.tokens["refresh"]})
+        self.assertEqual(reused.status_code, 401)
+
+    def test_tokens_are_not_interchangeable(self):
+        response = self.client.post("/refresh", json={"refresh": self.tokens["token"]})
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get(f"/users/{self.user.id}",
+                                   headers={"Authorization": f"Bearer {self.tokens['refresh']}"})
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_revokes_refresh_token(self):
+        self.assertEqual(self.client.post("/logout", json={"refresh": self.tokens["refresh"]}).status_code, 200)
+        response = self.client.post("/refresh", json={"refresh": self.tokens["refresh"]})
+        self.assertEqual(response.status_code, 401)
+
+
+    def test_logout_revokes_refresh_token_without_blacklist_after_rotation(self):
+        from django.conf import settings
+        from django.test import override_settings
+
+        self.client.post("/logout", json={"refresh": self.tokens["refresh"]})
+        with override_settings(NINJA_JWT={**settings.NINJA_JWT, 'ROTATE_REFRESH_TOKENS': True,
+                                          'BLACKLIST_AFTER_ROTATION': False}):
+            response = self.client.post("/refresh", json={"refresh": self.tokens["refresh"]})
+        self.assertEqual(response.status_code, 401)
+
+    def test_blacklist_ttl_ignores_host_timezone(self):
+        import os
+        import time
+        from users.tokens import blacklist
+
+        payload = {"jti": "fuso", "exp": int(time.time()) + 600}
+        self.addCleanup(time.tzset)
+        with patch.dict(os.environ, {"TZ": "America/Sao_Paulo"}), patch("users.tokens.cache.add") as add:
+            time.tzset()
+            blacklist(payload)
+        self.assertAlmostEqual(add.call_args.kwargs["timeout"], 601, delta=2)
+
+class BulkProvisioningTests(TestCase):
+    def setUp(self):
+        self.client = TestClient(router)
+        self.admin = User.objects.create_user(username="bulkadmin", password="adminpass", role="ADMIN")
+        self.admin_token = jwt.encode({
+            "sub": str(self.admin.id),
+            "exp": datetime.utcnow() + timedelta(minutes=5)
+        }, SECRET_KEY, algorithm=ALGORITHM)
+
+    def test_provision_from_jsonl_with_process_pool(self):
+        import io
+        import json
+        from users.provisioning import provision_users, read_rows
+
+        lines = [
+            {"username": "aluno1", "password": "senha12345", "role": "PARTICIPANT"},
+            {"username": "aluno2", "password": "senha12345", "role": "PARTICIPANT"},
+            {"username": "aluno1", "password": "senha12345", "role": "PARTICIPANT"},
+            {"username": "bulkadmin", "password": "senha12345", "role": "ADMIN"},
+            {"username": "x", "password": "curta", "role": "PARTICIPANT"},
+        ]
+        fh = io.StringIO("\n".join(json.dumps(line) for line in lines))
+        report = provision_users(read_rows(fh, 'jsonl'), workers=2)
+
+        self.assertEqual(report["created"], 2)
+        self.assertEqual(report["conflicts"], 2)
+        self.assertEqual(report["invalid"], 1)
+        user = User.objects.get(username="aluno2")
+        self.assertTrue(check_password("senha12345", user.password))
+
+    def _upload(self, name, content):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return self.client.post(
+            "/users/bulk",
+            FILES={"file": SimpleUploadedFile(name, content, content_type="text/csv")},
+            headers={"Authorization": f"Bearer {self.admin_token}"},
+        )
+
+    def _status(self, job_id):
+        return self.client.get(f"/users/bulk/{job_id}", headers={"Authorization": f"Bearer {self.admin_token}"})
+
+    @patch("users.tasks.provision_users_job.apply_async")
+    def test_bulk_endpoint_queues_a_job(self, mock_apply):
+        from users.tasks import provision_users_job
+
+        content = b"username,password,role\nturma1,senha12345,PARTICIPANT\nturma2,senha12345,PARTICIPANT\n"
+        response = self._upload("alunos.csv", content)
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["job_id"]
+        self.assertEqual(response.json()["status"], "queued")
+        # Nada é cadastrado na requisição
+        self.assertFalse(User.objects.filter(username__in=["turma1", "turma2"]).exists())
+        mock_apply.assert_called_once_with(kwargs={"job_id": job_id})
+
+        provision_users_job(job_id)
+        job = self._status(job_id).json()
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["report"]["created"], 2)
+        self.assertEqual(User.objects.filter(username__in=["turma1", "turma2"]).count(), 2)
+        # Reentrega da tarefa não cadastra de novo
+        provision_users_job(job_id)
+        self.assertEqual(self._status(job_id).json()["report"]["created"], 2)
+
+    @patch("users.tasks.provision_users_job.apply_async")
+    def test_invalid_file_fails_the_job(self, mock_apply):
+        from users.tasks import provision_users_job
+
+        job_id = self._upload("alunos.csv", b"\xff\xfe\x00").json()["job_id"]
+        provision_users_job(job_id)
+        job = self._status(job_id).json()
+        self.assertEqual(job["status"], "failed")
+        self.assertIn("Arquivo inválido", job["detail"])
+        self.assertEqual(self._status("desconhecido").status_code, 404)
+
+    @patch("users.tasks.provision_users_job.apply_async")
+    def test_unexpected_error_fails_the_job_and_drops_the_upload(self, mock_apply):
+        from django.core.cache import cache
+        from users.provisioning import UPLOAD_KEY
+        from users.tasks import provision_users_job
+
+        job_id = self._upload("alunos.csv", b"username,password,role\nturma1,senha12345,PARTICIPANT\n").json()["job_id"]
+        with patch("users.provisioning.provision_users", side_effect=RuntimeError("pool quebrado")):
+            provision_users_job(job_id)
+        job = self._status(job_id).json()
+        self.assertEqual(job["status"], "failed")
+        self.assertIn("pool quebrado", job["detail"])
+        self.assertIsNone(cache.get(UPLOAD_KEY.format(job_id=job_id)))
+
+    @patch("users.tasks.provision_users_job.apply_async")
+    def test_job_is_claimed_once(self, mock_apply):
+        from django.core.cache import cache
+        from users.provisioning import CLAIM_KEY, run_job
+
+        job_id = self._upload("alunos.csv", b"username,password,role\nturma1,senha12345,PARTICIPANT\n").json()["job_id"]
+        # Outra entrega já reivindicou o job entre a leitura e a transição
+        cache.add(CLAIM_KEY.format(job_id=job_id), 1)
+        self.assertEqual(run_job(job_id)["status"], "queued")
+        self.assertFalse(User.objects.filter(username="turma1").exists())
+
+    def test_task_module_binds_the_project_app(self):
+        import json
+        import os
+        import subprocess
+        import sys
+        from django.conf import settings
+
+        # Processo novo importando só users.tasks (como o web no enqueue)
+        code = (
+            "import json, django; django.setup()\n"
+            "from users.tasks import provision_users_job as t\n"
+            "print(json.dumps({'broker': t.app.conf.broker_url,"
+            " 'queue': t.app.amqp.router.route({}, t.name)['queue'].name}))"
+        )
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'core.settings')}
+        output = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        self.assertEqual(result['broker'], settings.CELERY_BROKER_URL)
+        self.assertEqual(result['queue'], 'batch')
+
+    def test_daemonic_worker_hashes_serially(self):
+        from types import SimpleNamespace
+        from users.provisioning import Provisioner
+
+        # Filho do prefork do Celery: criar o pool levantaria AssertionError
+        with patch("users.provisioning.multiprocessing.current_process", return_value=SimpleNamespace(daemon=True)):
+            with Provisioner(workers=4) as provisioner:
+                self.assertIsNone(provisioner._pool)
+                hashed, = provisioner._hash(["senha12345"])
+        self.assertTrue(check_password("senha12345", hashed))
+
+
+class EstimatedCountPaginationTests(TestCase):
+    def setUp(self):
+        self.client = TestClient(router)
+        self.admin = User.objects.create_user(username="countadmin", password="adminpass", role="ADMIN")
+        self.admin_token = jwt.encode({
+            "sub": str(self.admin.id),
+            "exp": datetime.utcnow() + timedelta(minutes=5)
+        }, SECRET_KEY, algorithm=ALGORITHM)
+        User.objects.bulk_create([User(username=f"conta{i}", role="PARTICIPANT") for i in range(5)])
+
+    def _list(self, query=""):
+        return self.client.get(
+            f"/users?{query}",
+            headers={"Authorization": f"Bearer {self.admin_token}"},
+        ).json()
+
+    def test_small_lists_use_exact_count(self):
+        data = self._list("limit=2")
+        self.assertEqual(len(data["items"]), 2)
+        self.assertEqual(data["count"], 6)
+        self.assertFalse(data["count_is_estimate"])
+
+    def test_large_lists_flag_estimated_count(self):
+        from django.db import connection
+        from django.test import override_settings
+
+        if connection.vendor != 'postgresql':
+            self.skipTest("Estimativa do planner exige PostgreSQL")
+        config = {'STRATEGY': 'estimate', 'EXACT_THRESHOLD': 0, 'CACHE_TTL': 60}
+        with override_settings(PAGINATION_COUNT=config):
+            data = self._list("role=PARTICIPANT")
+        self.assertTrue(data["count_is_estimate"])
+        self.assertGreaterEqual(data["count"], 0)
+
+    def test_cached_strategy_reuses_count(self):
+        from django.core.cache import cache
+        from django.db import connection
+        from django.test import override_settings
+
+        if connection.vendor != 'postgresql':
+            self.skipTest("Estimativa do planner exige PostgreSQL")
+        cache.clear()
+        config = {'STRATEGY': 'cached', 'EXACT_THRESHOLD': 0, 'CACHE_TTL': 60}
+        with override_settings(PAGINATION_COUNT=config):
+            first = self._list("role=PARTICIPANT")
+            User.objects.create_user(username="conta_nova", password="x", role="PARTICIPANT")
+            second = self._list("role=PARTICIPANT")
+        self.assertEqual(first["count"], 5)
+        self.assertEqual(second["count"], 5)
+        self.assertTrue(second["count_is_estimate"])
+
+    def test_sparse_fields_map_aliased_columns(self):
+        response = self.client.get(
+            f"/users/{self.admin.id}?fields=username,created_at",
+            headers={"Authorization": f"Bearer {self.admin_token}"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {"username", "created_at"})
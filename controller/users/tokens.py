@@ -0,0 +1,88 @@
+# tokens.py
+import os
+import time
+import uuid
+from datetime import datetime
+
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+
+# Configurações JWT
+SECRET_KEY = os.getenv("SECRET_KEY", "fallback-secret-key-123")
+ALGORITHM = "HS256"
+BLACKLIST_KEY = "jwt:blacklist:{jti}"
+
+
+class TokenError(Exception):
+    pass
+
+
+def access_lifetime():
+    return settings.NINJA_JWT['ACCESS_TOKEN_LIFETIME']
+
+
+def refresh_lifetime():
+    return settings.NINJA_JWT['REFRESH_TOKEN_LIFETIME']
+
+
+def _encode(user_id, token_type, lifetime):
+    return jwt.encode(
+        {
+            "sub": str(user_id),
+            "type": token_type,
+            "jti": uuid.uuid4().hex,
+            "exp": datetime.utcnow() + lifetime,
+        },
+        SECRET_KEY,
+        algorithm=ALGORITHM,
+    )
+
+
+def issue_tokens(user_id, refresh=None):
+    """Gera o par access/refresh; `refresh` reaproveita o atual (sem rotação)"""
+    return {
+        "token": _encode(user_id, "access", access_lifetime()),
+        "token_type": "bearer",
+        "refresh": refresh or _encode(user_id, "refresh", refresh_lifetime()),
+        "expires_in": int(access_lifetime().total_seconds()),
+    }
+
+
+def decode_refresh(token):
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError as e:
+        raise TokenError("Refresh token inválido") from e
+    if payload.get("type") != "refresh" or not payload.get("jti"):
+        raise TokenError("Refresh token inválido")
+    return payload
+
+
+def is_blacklisted(payload):
+    return cache.get(BLACKLIST_KEY.format(jti=payload["jti"])) is not None
+
+
+def blacklist(payload):
+    """
+    Revoga o refresh token até a sua expiração. Retorna False se ele já
+    estava revogado (reuso de um token rotacionado).
+    """
+    remaining = int(payload["exp"] - time.time()) + 1
+    return cache.add(BLACKLIST_KEY.format(jti=payload["jti"]), 1, timeout=max(remaining, 1))
+
+
+def rotate(token):
+    """Valida o refresh token e retorna novos tokens, sem consultar senha"""
+    payload = decode_refresh(token)
+    # Logout revoga o token em qualquer configuração de rotação
+    if is_blacklisted(payload):
+        raise TokenError("Refresh token revogado")
+    if not settings.NINJA_JWT.get('ROTATE_REFRESH_TOKENS'):
+        return payload, issue_tokens(payload["sub"], refresh=token)
+
+    if settings.NINJA_JWT.get('BLACKLIST_AFTER_ROTATION'):
+        # add atômico: de dois reenvios simultâneos só um rotaciona
+        if not blacklist(payload):
+            raise TokenError("Refresh token revogado")
+    return payload, issue_tokens(payload["sub"])